@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+"""Parse-time benchmark of the generated TTT DAG files.
+
+The Airflow scheduler parses every DAG file again and again. This benchmark compiles and executes
+generated DAG files the way the DagBag does, against stubbed Airflow modules, and compares the
+regular DAG files with the lean ones ("lean_dag": true) where the documentations and the SQL are
+not embedded.
+
+With --isolated N, N DAG files are parsed each in a new interpreter, like the scheduler's file
+processors do : the imports done by the DAG file are paid for every parse. The generated files,
+where the Google Cloud libraries are imported by the callables, are compared with the same files
+importing them at the top level as the previous generator did.
+
+Usage :
+
+    python benchmarks/bench_dag_parse.py [--sizes 10,100,1000] [--repeat 5]
+    python benchmarks/bench_dag_parse.py --isolated 200
+"""
+
+import os
+import sys
+import io
+import time
+import types
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+# Globals
+#
+# Top level imports of the DAG files generated before the client libraries were deferred
+#
+_eager_imports = """from jinja2 import Template
+from google.cloud import bigquery
+from google.cloud import firestore
+from google.cloud import storage
+from google.cloud import exceptions
+from google.oauth2 import service_account
+"""
+
+
+class StubOperator(object):
+
+    # Keeps the arguments and supports the dependency operators : a >> b, a >> [b, c], [a, b] >> c
+
+    def __init__(self, *args, **kwargs):
+        self.task_id = kwargs.get("task_id")
+        self.kwargs = kwargs
+        self.upstream = []
+
+    def __rshift__(self, other):
+        for item in (other if isinstance(other, list) else [other]):
+            item.upstream.append(self)
+        return other
+
+    def __lshift__(self, other):
+        for item in (other if isinstance(other, list) else [other]):
+            self.upstream.append(item)
+        return other
+
+    def __rrshift__(self, other):
+        self.__lshift__(other)
+        return self
+
+    def __rlshift__(self, other):
+        self.__rshift__(other)
+        return self
+
+
+class StubDAG(object):
+
+    def __init__(self, dag_id, **kwargs):
+        self.dag_id = dag_id
+        self.kwargs = kwargs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class StubVariable(object):
+
+    # No Airflow Variable : the Firestore reads of the lean DAGs fail, every attempt is counted
+
+    calls = 0
+
+    @staticmethod
+    def get(key):
+        StubVariable.calls += 1
+        raise KeyError(key)
+
+
+# Serialization done by the scheduler after each parse : reads "doc_md" from airflow.serialization
+#
+_serialization_source = """
+def serialize_dag(module):
+    items = [value for value in vars(module).values() if hasattr(value, "task_id") or hasattr(value, "dag_id")]
+    return [getattr(item, "doc_md", None) for item in items if getattr(item, "doc_md", None) is not None]
+"""
+
+
+def install_airflow_stubs():
+
+    # Minimal modules imported by the generated DAG files
+    #
+    modules = {}
+    for name in ["airflow",
+                 "airflow.operators",
+                 "airflow.operators.bash_operator",
+                 "airflow.operators.python_operator",
+                 "airflow.operators.dummy_operator",
+                 "airflow.models",
+                 "airflow.serialization",
+                 "airflow.serialization.serialized_objects",
+                 "dependencies"]:
+        modules[name] = types.ModuleType(name)
+
+    modules["airflow"].DAG = StubDAG
+    modules["airflow.operators.bash_operator"].BashOperator = StubOperator
+    modules["airflow.operators.python_operator"].PythonOperator = StubOperator
+    modules["airflow.operators.python_operator"].ShortCircuitOperator = StubOperator
+    modules["airflow.operators.python_operator"].BranchPythonOperator = StubOperator
+    modules["airflow.operators.dummy_operator"].DummyOperator = StubOperator
+    modules["airflow.operators"].FashiondDataPubSubPublisherOperator = StubOperator
+    modules["airflow.operators"].FashiondDataGoogleComputeInstanceOperator = StubOperator
+    modules["airflow.models"].Variable = StubVariable
+    exec(_serialization_source, modules["airflow.serialization.serialized_objects"].__dict__)
+    modules["dependencies"].fd_toolbox = types.ModuleType("dependencies.fd_toolbox")
+
+    sys.modules.update(modules)
+
+
+def generate_dag_file(size, shape, sql_columns, lean_dag):
+
+    # The generator loads the client libraries : not imported in the --parse-file processes
+    #
+    from jarvis_sdk import sql_dag_generator
+    import bench_sql_dag_generator
+
+    current_directory = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        configuration_file = bench_sql_dag_generator.build_configuration(directory, size, shape, sql_columns=sql_columns)
+
+        os.chdir(directory)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                context = sql_dag_generator.load_configuration(configuration_file)
+                context["lean_dag"] = lean_dag
+                return sql_dag_generator.build_python_script(context, run_locally=False)
+        finally:
+            os.chdir(current_directory)
+
+
+def parse_dag_file(source):
+
+    # What the DagBag does for every DAG file : compile and execute it as a new module
+    #
+    module = types.ModuleType("benchmark_dag")
+    exec(compile(source, "benchmark_dag.py", "exec"), module.__dict__)
+    return module
+
+
+def measure_parse(source, repeat):
+
+    timings = []
+    for _ in range(0, repeat):
+        start = time.perf_counter()
+        parse_dag_file(source)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    module = parse_dag_file(source)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(timings), peak_memory, module
+
+
+def parse_in_new_process(dag_file):
+
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--parse-file", dag_file], stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    return float(output.stdout.strip())
+
+
+def run_isolated(count, shape, sql_columns):
+
+    # count DAG files of 5 to 50 tasks, each parsed in a new interpreter
+    #
+    sizes = [5, 10, 20, 50]
+    totals = {"deferred": 0.0, "eager": 0.0}
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        sources = {}
+        for size in sizes:
+            sources[size] = generate_dag_file(size, shape, sql_columns, False)
+
+        for index in range(0, count):
+
+            source = sources[sizes[index % len(sizes)]]
+
+            for mode in ["deferred", "eager"]:
+
+                dag_file = os.path.join(directory, "dag_{}_{}.py".format(index, mode))
+                with open(dag_file, "w") as f:
+                    f.write(source if mode == "deferred" else _eager_imports + source)
+
+                totals[mode] += parse_in_new_process(dag_file)
+
+    print("{:>6}   {:<9}   {:>12}   {:>14}".format("DAGs", "Imports", "Total (s)", "Per DAG (ms)"))
+    print("{}   {}   {}   {}".format("-" * 6, "-" * 9, "-" * 12, "-" * 14))
+    for mode in ["eager", "deferred"]:
+        print("{:>6}   {:<9}   {:>12.2f}   {:>14.1f}".format(count, mode, totals[mode], 1000.0 * totals[mode] / count))
+
+    return 0
+
+
+def main(arguments):
+
+    parser = argparse.ArgumentParser(description="Parse-time benchmark of the generated TTT DAG files.")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma separated numbers of tasks.")
+    parser.add_argument("--shape", default="chain", help="Dependency shape : chain, fanout or diamond.")
+    parser.add_argument("--sql-columns", type=int, default=40, help="Computed columns per SQL query, to model real queries.")
+    parser.add_argument("--repeat", type=int, default=5, help="Parses per DAG file, the fastest one is kept.")
+    parser.add_argument("--isolated", type=int, default=None, metavar="N", help="Parse N DAG files, each in a new interpreter.")
+    parser.add_argument("--parse-file", default=None, help=argparse.SUPPRESS)
+    arguments = parser.parse_args(arguments)
+
+    install_airflow_stubs()
+
+    # Child process of --isolated : parse one file, print the elapsed time
+    #
+    if arguments.parse_file is not None:
+        with open(arguments.parse_file, "r") as f:
+            source = f.read()
+
+        start = time.perf_counter()
+        parse_dag_file(source)
+        print(time.perf_counter() - start)
+        return 0
+
+    if arguments.isolated is not None:
+        return run_isolated(arguments.isolated, arguments.shape, arguments.sql_columns)
+
+    print("{:>6}   {:<7}   {:>12}   {:>12}   {:>12}".format("Tasks", "Mode", "File (KB)", "Parse (ms)", "Peak (MB)"))
+    print("{}   {}   {}   {}   {}".format("-" * 6, "-" * 7, "-" * 12, "-" * 12, "-" * 12))
+
+    for size in [int(size) for size in arguments.sizes.split(",")]:
+        for lean_dag in [False, True]:
+
+            source = generate_dag_file(size, arguments.shape, arguments.sql_columns, lean_dag)
+            parse_time, peak_memory, module = measure_parse(source, arguments.repeat)
+
+            # The lean DAG must still expose its documentations, on demand. The serialization does not
+            # read Firestore, a failed read is not attempted again on the next access
+            #
+            if lean_dag is True:
+                calls = StubVariable.calls
+                documentations = sys.modules["airflow.serialization.serialized_objects"].serialize_dag(module)
+                assert len(documentations) > 0
+                assert all(documentation.startswith("Lean DAG") for documentation in documentations)
+                assert StubVariable.calls == calls
+
+                assert module.dag.doc_md.startswith("Documentation unavailable")
+                assert module.task_00000.doc_md.startswith("Documentation unavailable")
+                assert StubVariable.calls == calls + 1
+
+            print("{:>6}   {:<7}   {:>12.1f}   {:>12.2f}   {:>12.2f}".format(size,
+                                                                         "lean" if lean_dag is True else "regular",
+                                                                         len(source.encode("utf-8")) / 1024.0,
+                                                                         parse_time * 1000.0,
+                                                                         peak_memory / 1024.0 / 1024.0))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
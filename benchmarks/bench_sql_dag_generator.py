@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+"""Scaling benchmark of the TTT DAG generator.
+
+Synthetic table-to-table configurations are generated from 10 to 10,000 tasks, mixing every task type
+(SQL, copy_gbq_table, create_gbq_table, vm_launcher), with three dependency shapes :
+
+    chain   : t1 >> t2 >> ... >> tN
+    fanout  : t1 >> [t2, ..., tN]
+    diamond : t1 >> [t2, t3] >> t4 >> [t5, t6] >> t7 ...
+
+For each configuration, the benchmark measures the generation time (load + DAG + local script + API
+payload), the peak memory, the size of the generated DAG file and the size of the deploy payload.
+
+Usage :
+
+    python benchmarks/bench_sql_dag_generator.py                   compare with benchmarks/baseline.json
+    python benchmarks/bench_sql_dag_generator.py --save-baseline   store the results as the new baseline
+
+The exit code is 1 if a metric regressed beyond its tolerance.
+"""
+
+import os
+import sys
+import io
+import json
+import base64
+import pickle
+import time
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from jarvis_sdk import sql_dag_generator
+
+
+# Globals
+#
+_baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+_sizes = [10, 100, 1000, 10000]
+_shapes = ["chain", "fanout", "diamond"]
+
+# Relative tolerance per metric before a result is reported as a regression
+#
+_tolerances = {
+    "generation_s": 0.5,
+    "peak_memory_bytes": 0.2,
+    "dag_file_bytes": 0.05,
+    "deploy_payload_bytes": 0.05
+}
+
+# Timings of the small cases are noisy : a slower run is only a regression above this absolute delta
+#
+_minimum_time_delta_s = 0.05
+
+_ddl = {
+    "bq_table_description": "Benchmark table",
+    "bq_table_schema": [
+        {"name": "id", "type": "INT64", "mode": "REQUIRED", "description": "Identifier"},
+        {"name": "label", "type": "STRING"},
+        {"name": "attributes", "type": "RECORD", "fields": [{"name": "key", "type": "STRING"}, {"name": "value", "type": "STRING"}]}
+    ],
+    "bq_table_timepartitioning_field": "created_at"
+}
+
+
+def build_task(index, directory, sql_columns=0):
+
+    # One task out of ten is a "create_gbq_table", one a "copy_gbq_table", one out of fifty a "vm_launcher"
+    #
+    task_id = "task_{:05d}".format(index)
+
+    if index % 50 == 49:
+        return {"id": task_id, "task_type": "vm_launcher", "script_to_execute": ["echo " + task_id]}
+
+    if index % 10 == 1:
+        return {"id": task_id, "task_type": "create_gbq_table", "bq_table": "table_" + task_id, "ddl_file": "ddl.json"}
+
+    if index % 10 == 2:
+        return {"id": task_id,
+                "task_type": "copy_gbq_table",
+                "short_description": "Copy of " + task_id,
+                "source_gcp_project_id": "source-project",
+                "source_bq_dataset": "source_dataset",
+                "source_bq_table": "table_" + task_id,
+                "destination_bq_table": "table_" + task_id + "_copy",
+                "destination_bq_table_date_suffix": True,
+                "destination_bq_table_date_suffix_format": "%Y%m%d"}
+
+    # sql_columns : additional computed columns, to get larger queries
+    #
+    columns = "".join("  UPPER(label) AS label_{},\n".format(column) for column in range(0, sql_columns))
+
+    with open(os.path.join(directory, task_id + ".sql"), "w") as f:
+        f.write("SELECT\n  id,\n  label,\n" + columns + "  '{{ds}}' AS execution_date\nFROM `source-project.source_dataset.table_" + task_id + "`\nWHERE label != \"\"\n")
+
+    with open(os.path.join(directory, task_id + ".md"), "w") as f:
+        f.write("# " + task_id + "\n\nLoads `table_" + task_id + "` for the execution date.\n")
+
+    return {"id": task_id,
+            "short_description": "Load of " + task_id,
+            "doc_md": task_id + ".md",
+            "sql_file": task_id + ".sql",
+            "sql_query_template": "ds",
+            "table_name": "table_" + task_id}
+
+
+def build_dependencies(task_ids, shape):
+
+    if len(task_ids) < 2:
+        return []
+
+    if shape == "chain":
+        return ["{} >> {}".format(task_ids[position], task_ids[position + 1]) for position in range(0, len(task_ids) - 1)]
+
+    if shape == "fanout":
+        return ["{} >> [{}]".format(task_ids[0], ", ".join(task_ids[1:]))]
+
+    # Diamonds : head >> [left, right] >> tail, the tail being the head of the next diamond
+    #
+    dependencies = []
+    position = 0
+    while position + 3 < len(task_ids):
+        dependencies.append("{} >> [{}, {}] >> {}".format(task_ids[position], task_ids[position + 1], task_ids[position + 2], task_ids[position + 3]))
+        position += 3
+
+    for remaining in range(position + 1, len(task_ids)):
+        dependencies.append("{} >> {}".format(task_ids[position], task_ids[remaining]))
+
+    return dependencies
+
+
+def build_configuration(directory, size, shape, sql_columns=0):
+
+    with open(os.path.join(directory, "ddl.json"), "w") as f:
+        json.dump(_ddl, f)
+
+    with open(os.path.join(directory, "dag.md"), "w") as f:
+        f.write("# Benchmark\n\nSynthetic workflow of {} tasks, {} shape.\n".format(size, shape))
+
+    workflow = [build_task(index, directory, sql_columns=sql_columns) for index in range(0, size)]
+
+    configuration = {
+        "configuration_type": "table-to-table",
+        "configuration_id": "benchmark_{}_{}".format(shape, size),
+        "environment": "DEV",
+        "account": "000000",
+        "start_date": "2020, 1, 1",
+        "schedule_interval": "0 3 * * *",
+        "short_description": "Benchmark workflow",
+        "doc_md": "dag.md",
+        "default_gcp_project_id": "benchmark-project",
+        "default_bq_dataset": "benchmark_dataset",
+        "default_write_disposition": "WRITE_TRUNCATE",
+        "task_dependencies": build_dependencies([task["id"] for task in workflow], shape),
+        "workflow": workflow
+    }
+
+    configuration_file = os.path.join(directory, "configuration.json")
+    with open(configuration_file, "w") as f:
+        json.dump(configuration, f, indent=2)
+
+    return configuration_file
+
+
+def generate(configuration_file):
+
+    # The whole generation of a deployment, without the generation cache
+    #
+    with contextlib.redirect_stdout(io.StringIO()):
+        context = sql_dag_generator.load_configuration(configuration_file)
+        artifacts = sql_dag_generator.build_deploy_artifacts(context, jarvis_sdk_version="benchmark")
+
+    return artifacts
+
+
+def run_case(size, shape, repeat):
+
+    current_directory = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        configuration_file = build_configuration(directory, size, shape)
+
+        # Files are referenced relatively to the current directory
+        #
+        os.chdir(directory)
+        try:
+            timings = []
+            for _ in range(0, repeat):
+                start = time.perf_counter()
+                artifacts = generate(configuration_file)
+                timings.append(time.perf_counter() - start)
+
+            # Separate pass : tracemalloc slows down the generation
+            #
+            tracemalloc.start()
+            generate(configuration_file)
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        finally:
+            os.chdir(current_directory)
+
+    dag_file = pickle.loads(base64.b64decode(artifacts["dag_file"]))
+
+    return {
+        "generation_s": round(min(timings), 4),
+        "peak_memory_bytes": peak_memory,
+        "dag_file_bytes": len(dag_file.encode("utf-8")),
+        "deploy_payload_bytes": sum(len(value) for value in artifacts.values())
+    }
+
+
+def compare_results(results, baseline):
+
+    # Returns the list of regressions
+    #
+    regressions = []
+
+    for case, metrics in results.items():
+
+        if case not in baseline:
+            continue
+
+        for metric, value in metrics.items():
+
+            try:
+                reference = baseline[case][metric]
+            except KeyError:
+                continue
+
+            if (metric == "generation_s") and (value - reference < _minimum_time_delta_s):
+                continue
+
+            if (reference > 0) and (value > reference * (1 + _tolerances[metric])):
+                regressions.append("{} : {} {} > {} (+{:.0f}%)".format(case, metric, value, reference, 100.0 * (value - reference) / reference))
+
+    return regressions
+
+
+def print_results(results, baseline):
+
+    print("{:<16}   {:>12}   {:>12}   {:>14}   {:>14}".format("Case", "Time (s)", "Peak (MB)", "DAG file (KB)", "Payload (KB)"))
+    print("{}   {}   {}   {}   {}".format("-" * 16, "-" * 12, "-" * 12, "-" * 14, "-" * 14))
+
+    for case, metrics in results.items():
+
+        line = "{:<16}   {:>12.3f}   {:>12.1f}   {:>14.1f}   {:>14.1f}".format(case,
+                                                                             metrics["generation_s"],
+                                                                             metrics["peak_memory_bytes"] / 1024.0 / 1024.0,
+                                                                             metrics["dag_file_bytes"] / 1024.0,
+                                                                             metrics["deploy_payload_bytes"] / 1024.0)
+
+        if case in baseline:
+            line += "   (baseline {:.3f} s)".format(baseline[case]["generation_s"])
+
+        print(line)
+
+
+def main(arguments):
+
+    parser = argparse.ArgumentParser(description="Scaling benchmark of the TTT DAG generator.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in _sizes), help="Comma separated numbers of tasks.")
+    parser.add_argument("--shapes", default=",".join(_shapes), help="Comma separated dependency shapes : " + ", ".join(_shapes))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, the fastest one is kept.")
+    parser.add_argument("--baseline", default=_baseline_file, help="Baseline file.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    arguments = parser.parse_args(arguments)
+
+    results = {}
+    for shape in arguments.shapes.split(","):
+        for size in [int(size) for size in arguments.sizes.split(",")]:
+
+            case = "{}_{}".format(shape, size)
+            print("Running {} ...".format(case), file=sys.stderr)
+            results[case] = run_case(size, shape, arguments.repeat)
+
+    baseline = {}
+    if (arguments.save_baseline is False) and (os.path.isfile(arguments.baseline) is True):
+        with open(arguments.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+
+    print_results(results, baseline)
+
+    if arguments.save_baseline is True:
+        with open(arguments.baseline, "w") as f:
+            json.dump({"generator_version": sql_dag_generator._current_version, "python": sys.version.split()[0], "results": results}, f, indent=2, sort_keys=True)
+        print("\nBaseline saved : {}".format(arguments.baseline))
+        return 0
+
+    regressions = compare_results(results, baseline)
+    if len(regressions) > 0:
+        print("\nRegressions :")
+        for regression in regressions:
+            print("  " + regression)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import argparse
 import datetime
 import json
@@ -72,6 +73,8 @@ def main():
 
     args = parser.parse_args()
 
+    exit_code = 0
+
     # Evaluating COMMAND
     #
     if args.command == "config":
@@ -79,13 +82,17 @@ def main():
 
     elif args.command == "configuration":
 
-        # TTT local run case
+        # TTT local run and plan cases
         #
-        conf_usage = "Usage :\n\njarvis configuration run TTT-CONFIGURATION.json [task_1 task_2 ... task_N]\n\n"
+        conf_usage = "Usage :\n\njarvis configuration run TTT-CONFIGURATION.json [--parallel N] [--ds YYYY-MM-DD | --backfill START:END] [--max-bq-jobs N] [--incremental] [--resume] [--from TASK] [--to TASK] [--upstream-of TASK] [--downstream-of TASK] [task_1 task_2 ... task_N]\n"
+        conf_usage += "jarvis configuration plan TTT-CONFIGURATION.json [--parallel N] [--max-bytes BYTES] [--ds YYYY-MM-DD]\n\n"
 
         if len(args.arguments) >= 2:
             if args.arguments[0].strip() == "run":
-                sql_dag_generator.process(configuration_file=args.arguments[1], run_locally=True, arguments=args.arguments, jarvis_sdk_version=__version__)
+                return_code = sql_dag_generator.process(configuration_file=args.arguments[1], run_locally=True, arguments=args.arguments, jarvis_sdk_version=__version__)
+                exit_code = 1 if return_code is False else return_code
+            elif args.arguments[0].strip() == "plan":
+                exit_code = sql_dag_generator.process_plan(configuration_file=args.arguments[1], arguments=args.arguments)
             else:
                 print(conf_usage)
         else:
@@ -131,6 +138,10 @@ def main():
     #
     notify_update_jarvis_sdk()
 
+    # Propagate the exit code, i.e. : the result of a local run
+    #
+    sys.exit(exit_code)
+
 
 if __name__ == "__main__":
     main()
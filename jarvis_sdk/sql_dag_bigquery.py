@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+
+"""BigQuery helpers shared by the local runtime and the generated DAG files.
+
+The source of this module, after its imports, is rendered as is into the runtime functions of the
+DAG file and of the local script : it must only use the standard library modules imported below,
+the Google Cloud client libraries are imported inside the functions.
+"""
+
+import datetime
+import logging
+import threading
+import time
+
+
+# Metadata of the destination tables, kept by the process for _table_metadata_ttl seconds :
+# a backfill reads the schema of each table once
+#
+_table_metadata_ttl = 300
+_table_metadata_cache = {}
+_table_metadata_lock = threading.Lock()
+
+
+def get_table_id(table_ref):
+
+    return "{}.{}.{}".format(table_ref.project, table_ref.dataset_id, table_ref.table_id)
+
+
+def get_table_metadata(gbq_client, table_ref, refresh=False):
+
+    # Raises exceptions.NotFound, as gbq_client.get_table()
+    # refresh : read the table even if it is in the cache, i.e. when its schema is written back
+    #
+    table_id = get_table_id(table_ref)
+
+    with _table_metadata_lock:
+        entry = _table_metadata_cache.get(table_id)
+        if (refresh is False) and (entry is not None) and (time.time() - entry["created"] <= _table_metadata_ttl):
+            return entry["table"]
+
+    table = gbq_client.get_table(table_ref)
+
+    with _table_metadata_lock:
+        _table_metadata_cache[table_id] = {"created": time.time(), "table": table}
+
+    return table
+
+
+def forget_table_metadata(table_id):
+
+    with _table_metadata_lock:
+        _table_metadata_cache.pop(table_id, None)
+
+
+def build_atomic_truncate_query(table, sql_query):
+
+    # table : metadata of the destination table
+    # Replaces all the rows of the table with the result of the query, in a single statement :
+    # the table keeps its schema, descriptions, partitioning and clustering.
+    # The columns of the query are matched by name with the columns of the table.
+    #
+    table_id = get_table_id(table.reference)
+    columns = ", ".join("`{}`".format(field.name) for field in table.schema)
+
+    # A table requiring a partition filter rejects a DELETE without one : the filter on the
+    # partitioning column keeps every row
+    #
+    delete_condition = ""
+    if table.require_partition_filter is True:
+
+        partition_field = None
+        if table.time_partitioning is not None:
+            partition_field = table.time_partitioning.field
+        elif table.range_partitioning is not None:
+            partition_field = table.range_partitioning.field
+
+        if partition_field is None:
+            raise ValueError("atomic_truncate : the table {} is partitioned by ingestion time and requires a partition filter, it cannot be truncated with a MERGE statement.".format(table_id))
+
+        delete_condition = " AND (T.`{0}` IS NULL OR T.`{0}` IS NOT NULL)".format(partition_field)
+
+    return "MERGE `{}` T\nUSING (\n{}\n) S\nON FALSE\nWHEN NOT MATCHED BY SOURCE{} THEN DELETE\nWHEN NOT MATCHED THEN INSERT ({}) VALUES ({})".format(
+        table_id, sql_query.strip().rstrip(";"), delete_condition, columns, columns)
+
+
+# Partition decorator format per time partitioning type
+#
+_partition_decorator_formats = {"DAY": "%Y%m%d", "MONTH": "%Y%m", "YEAR": "%Y"}
+
+
+def get_partition_decorator(table, ds):
+
+    # table : metadata of the destination table, None if it does not exist yet (partitioned by day)
+    #
+    partitioning_type = "DAY"
+    if table is not None:
+
+        if table.time_partitioning is None:
+            raise ValueError("partition_write : the table {} is not partitioned, the partition of {} cannot be written.".format(get_table_id(table.reference), ds))
+
+        partitioning_type = table.time_partitioning.type_
+
+    if partitioning_type not in _partition_decorator_formats:
+        raise ValueError("partition_write : {} partitioning is not supported, only : {}".format(partitioning_type, ", ".join(_partition_decorator_formats)))
+
+    return datetime.datetime.strptime(ds, "%Y-%m-%d").strftime(_partition_decorator_formats[partitioning_type])
+
+
+def build_partition_merge_query(table, sql_query, merge_keys, ds):
+
+    # Replaces the execution date partition with the rows of the query, matched on merge_keys :
+    # the rows of the query outside of the partition of "ds" are ignored, the rows of the partition
+    # missing from the query are deleted. The other partitions are never read nor written.
+    #
+    if (table.time_partitioning is None) or (table.time_partitioning.field is None):
+        raise ValueError("partition_write : the table {} must be partitioned on a column to be merged.".format(get_table_id(table.reference)))
+
+    partition_field = table.time_partitioning.field
+    field_types = {field.name: field.field_type for field in table.schema}
+
+    if field_types.get(partition_field) == "DATE":
+        partition_filter = "{0}.`{1}` = DATE '{2}'"
+    else:
+        partition_filter = "DATE({0}.`{1}`) = DATE '{2}'"
+
+    target_filter = partition_filter.format("T", partition_field, ds)
+    source_filter = partition_filter.format("Q", partition_field, ds)
+
+    columns = [field.name for field in table.schema]
+    conditions = [target_filter] + ["T.`{0}` = S.`{0}`".format(key) for key in merge_keys]
+    updates = ", ".join("`{0}` = S.`{0}`".format(column) for column in columns if column not in merge_keys)
+    inserted_columns = ", ".join("`{}`".format(column) for column in columns)
+
+    sql_merge = "MERGE `{}` T\nUSING (\nSELECT * FROM (\n{}\n) Q\nWHERE {}\n) S\nON {}\n".format(
+        get_table_id(table.reference), sql_query.strip().rstrip(";"), source_filter, " AND ".join(conditions))
+    if updates != "":
+        sql_merge += "WHEN MATCHED THEN UPDATE SET {}\n".format(updates)
+    sql_merge += "WHEN NOT MATCHED THEN INSERT ({}) VALUES ({})\n".format(inserted_columns, inserted_columns)
+    sql_merge += "WHEN NOT MATCHED BY SOURCE AND {} THEN DELETE".format(target_filter)
+
+    return sql_merge
+
+
+def restore_table_schema(gbq_client, table_ref, schema):
+
+    # A WRITE_TRUNCATE query job replaces the schema of the table with the one of the query :
+    # the descriptions and modes of the columns are restored.
+    # The table written by the query is read again : the patch carries its etag and fails if the
+    # table is modified in between. A failure is logged, the rows are written anyway.
+    #
+    logging.info("Updating table schema ...")
+
+    try:
+        table = get_table_metadata(gbq_client, table_ref, refresh=True)
+        table.schema = schema
+        gbq_client.update_table(table, ["schema"])
+    except Exception as error:
+        logging.warning("Cannot restore the schema of %s : %s", get_table_id(table_ref), error)
+
+    forget_table_metadata(get_table_id(table_ref))
+
+
+def get_dml_written_rows(query_job):
+
+    # Rows inserted and updated, dml_stats is only available with the recent client libraries
+    #
+    dml_stats = getattr(query_job, "dml_stats", None)
+    if dml_stats is not None:
+        return dml_stats.inserted_row_count + dml_stats.updated_row_count
+
+    return query_job.num_dml_affected_rows
+
+
+def get_query_statistics(query_job, results):
+
+    # Read from the job statistics : no result row is downloaded
+    #
+    if query_job.num_dml_affected_rows is not None:
+        rows = get_dml_written_rows(query_job)
+    else:
+        rows = results.total_rows
+
+    return {
+        "rows": rows,
+        "bytes_processed": query_job.total_bytes_processed,
+        "bytes_billed": query_job.total_bytes_billed,
+        "slot_millis": query_job.slot_millis,
+        "cache_hit": query_job.cache_hit
+    }
+
+
+def build_table_copy_script(table_pairs, copy_mode, snapshot_expiration_days=None):
+
+    # table_pairs : list of (source table reference, destination table reference)
+    # All the clones or snapshots are created by a single script job.
+    #
+    statements = []
+    for source_table_ref, dest_table_ref in table_pairs:
+
+        if copy_mode == "clone":
+            statements.append("CREATE OR REPLACE TABLE `{}` CLONE `{}`".format(get_table_id(dest_table_ref), get_table_id(source_table_ref)))
+
+        else:
+            statement = "CREATE SNAPSHOT TABLE IF NOT EXISTS `{}` CLONE `{}`".format(get_table_id(dest_table_ref), get_table_id(source_table_ref))
+            if snapshot_expiration_days is not None:
+                statement += " OPTIONS(expiration_timestamp = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL {} DAY))".format(int(snapshot_expiration_days))
+            statements.append(statement)
+
+    return ";\n".join(statements) + ";"
+
+
+# Aliases of the BigQuery types : the API returns the legacy names
+#
+_field_type_aliases = {"INT64": "INTEGER", "FLOAT64": "FLOAT", "BOOL": "BOOLEAN", "STRUCT": "RECORD", "DECIMAL": "NUMERIC", "BIGDECIMAL": "BIGNUMERIC"}
+
+
+def normalize_field_type(field_type):
+
+    return _field_type_aliases.get(field_type.upper(), field_type.upper())
+
+
+def diff_table_schema(expected_schema, live_schema, path=""):
+
+    # Compares the schema of the DDL with the schema of the table, RECORD fields included.
+    # Returns (schema to apply in place, additive changes, breaking changes)
+    # The columns of the table keep their order and options, new columns are added at the end.
+    #
+    from google.cloud import bigquery
+
+    expected_fields = {field.name.lower(): field for field in expected_schema}
+    live_names = set(field.name.lower() for field in live_schema)
+
+    merged_schema = []
+    changes = []
+    breaking_changes = []
+
+    for live_field in live_schema:
+
+        name = path + live_field.name
+        expected_field = expected_fields.get(live_field.name.lower())
+
+        if expected_field is None:
+            breaking_changes.append("{} : removed".format(name))
+            merged_schema.append(live_field)
+            continue
+
+        if normalize_field_type(expected_field.field_type) != normalize_field_type(live_field.field_type):
+            breaking_changes.append("{} : type {} -> {}".format(name, live_field.field_type, expected_field.field_type))
+            merged_schema.append(live_field)
+            continue
+
+        api_repr = dict(live_field.to_api_repr())
+
+        live_mode = (live_field.mode or "NULLABLE").upper()
+        expected_mode = (expected_field.mode or "NULLABLE").upper()
+        if live_mode != expected_mode:
+            if (live_mode == "REQUIRED") and (expected_mode == "NULLABLE"):
+                changes.append("{} : mode relaxed to NULLABLE".format(name))
+                api_repr["mode"] = "NULLABLE"
+            else:
+                breaking_changes.append("{} : mode {} -> {}".format(name, live_mode, expected_mode))
+
+        if (expected_field.description or None) != (live_field.description or None):
+            changes.append("{} : description".format(name))
+            api_repr["description"] = expected_field.description
+
+        if normalize_field_type(live_field.field_type) == "RECORD":
+            sub_schema, sub_changes, sub_breaking_changes = diff_table_schema(expected_field.fields, live_field.fields, name + ".")
+            api_repr["fields"] = [field.to_api_repr() for field in sub_schema]
+            changes += sub_changes
+            breaking_changes += sub_breaking_changes
+
+        merged_schema.append(bigquery.SchemaField.from_api_repr(api_repr))
+
+    for expected_field in expected_schema:
+
+        if expected_field.name.lower() in live_names:
+            continue
+
+        if (expected_field.mode or "NULLABLE").upper() == "REQUIRED":
+            breaking_changes.append("{} : new REQUIRED column".format(path + expected_field.name))
+        else:
+            changes.append("{} : added".format(path + expected_field.name))
+            merged_schema.append(expected_field)
+
+    return merged_schema, changes, breaking_changes
+
+
+def evolve_table(gbq_client, table, schema, description, clustering_fields, timepartitioning_field, timepartitioning_expiration_ms, timepartitioning_require_partition_filter, rebuild=False):
+
+    # Brings an existing table to its DDL : additive changes are applied in place.
+    # A breaking change raises an exception, unless rebuild is True : the function then returns True
+    # and the table has to be dropped and recreated.
+    #
+    merged_schema, changes, breaking_changes = diff_table_schema(schema, table.schema)
+
+    # Partitioning, as set when the table is created
+    #
+    expected_partitioning = ((clustering_fields is not None) and (len(clustering_fields) > 0)) or \
+                            (timepartitioning_field is not None) or (timepartitioning_expiration_ms is not None) or (timepartitioning_require_partition_filter is not None)
+
+    if expected_partitioning != (table.time_partitioning is not None):
+        breaking_changes.append("time partitioning : {} -> {}".format(table.time_partitioning is not None, expected_partitioning))
+
+    elif (table.time_partitioning is not None) and (table.time_partitioning.field != timepartitioning_field):
+        breaking_changes.append("time partitioning field : {} -> {}".format(table.time_partitioning.field, timepartitioning_field))
+
+    for change in breaking_changes:
+        logging.warning("Breaking change : %s", change)
+
+    if len(breaking_changes) > 0:
+
+        if rebuild is False:
+            raise Exception("schema_evolution : the DDL of the table {} has breaking changes ({}). The table is left untouched, set \"schema_evolution\": \"rebuild\" to drop and recreate it.".format(
+                get_table_id(table.reference), ", ".join(breaking_changes)))
+
+        return True
+
+    fields = []
+
+    if len(changes) > 0:
+        table.schema = merged_schema
+        fields.append("schema")
+
+    if (description or "") != (table.description or ""):
+        changes.append("table description")
+        table.description = description
+        fields.append("description")
+
+    if (clustering_fields or None) != (table.clustering_fields or None):
+        changes.append("clustering fields : {} -> {}".format(table.clustering_fields, clustering_fields))
+        table.clustering_fields = clustering_fields or None
+        fields.append("clustering_fields")
+
+    if (table.time_partitioning is not None) and (table.time_partitioning.expiration_ms != timepartitioning_expiration_ms):
+        changes.append("partition expiration : {} -> {}".format(table.time_partitioning.expiration_ms, timepartitioning_expiration_ms))
+        time_partitioning = table.time_partitioning
+        time_partitioning.expiration_ms = timepartitioning_expiration_ms
+        table.time_partitioning = time_partitioning
+        fields.append("time_partitioning")
+
+    if (timepartitioning_require_partition_filter is not None) and (timepartitioning_require_partition_filter != table.require_partition_filter):
+        changes.append("require partition filter : {} -> {}".format(table.require_partition_filter, timepartitioning_require_partition_filter))
+        table.require_partition_filter = timepartitioning_require_partition_filter
+        fields.append("require_partition_filter")
+
+    for change in changes:
+        logging.info("Change applied in place : %s", change)
+
+    if len(fields) > 0:
+        gbq_client.update_table(table, fields)
+        forget_table_metadata(get_table_id(table.reference))
+
+    return False
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""On-disk cache of the artifacts generated for a TTT configuration, stored in JARVIS_HOME.
+
+The key is a hash of the workflow context : the JSON configuration and the content of every file
+it references (SQL, Markdown, DDL), plus the generator and SDK versions. Deploying a configuration
+that did not change is then a cache hit. The least recently used entries are evicted.
+"""
+
+import os
+import json
+import hashlib
+
+from jarvis_sdk import jarvis_config
+
+
+# Globals
+#
+_cache_directory = "ttt-cache"
+_max_entries = 256
+
+
+def get_cache_directory():
+
+    try:
+        jarvis_home = jarvis_config.get_jarvis_home()
+    except KeyError:
+        return None
+
+    if jarvis_home is None:
+        return None
+
+    return os.path.join(jarvis_home, _cache_directory)
+
+
+def compute_cache_key(context, generator_version, jarvis_sdk_version=None):
+
+    # The graph is derived from the configuration, everything else comes from the files
+    #
+    payload = {
+        "generator_version": generator_version,
+        "jarvis_sdk_version": jarvis_sdk_version,
+        "context": {key: value for key, value in context.items() if key != "graph"}
+    }
+
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def load_artifacts(cache_key):
+
+    # Returns the cached artifacts or None
+    #
+    cache_directory = get_cache_directory()
+    if cache_directory is None:
+        return None
+
+    cache_file = os.path.join(cache_directory, cache_key + ".json")
+
+    try:
+        with open(cache_file, "r") as f:
+            artifacts = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    # Mark the entry as recently used
+    #
+    try:
+        os.utime(cache_file, None)
+    except OSError:
+        pass
+
+    return artifacts
+
+
+def save_artifacts(cache_key, artifacts):
+
+    # artifacts : dict of strings
+    #
+    cache_directory = get_cache_directory()
+    if cache_directory is None:
+        return
+
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+
+        cache_file = os.path.join(cache_directory, cache_key + ".json")
+        temporary_file = cache_file + ".tmp"
+        with open(temporary_file, "w") as f:
+            json.dump(artifacts, f)
+        os.replace(temporary_file, cache_file)
+
+        evict_entries(cache_directory)
+
+    except (IOError, OSError) as error:
+        print("Cannot write the generation cache : {}".format(error))
+
+
+def evict_entries(cache_directory, max_entries=_max_entries):
+
+    # Remove the least recently used entries above max_entries
+    #
+    entries = []
+    for entry in os.scandir(cache_directory):
+        if entry.name.endswith(".json"):
+            entries.append((entry.stat().st_mtime, entry.path))
+
+    if len(entries) <= max_entries:
+        return
+
+    entries.sort()
+    for _, path in entries[:len(entries) - max_entries]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
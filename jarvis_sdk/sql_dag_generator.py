@@ -31,13 +31,16 @@ import requests
 import pickle
 import re
 import sys
-import tempfile
-import copy
-from subprocess import Popen, PIPE, STDOUT
+import logging
 
 from jarvis_sdk import jarvis_config
 from jarvis_sdk import jarvis_auth
 from jarvis_sdk import jarvis_misc
+from jarvis_sdk import sql_dag_cache
+from jarvis_sdk import sql_dag_graph
+from jarvis_sdk import sql_dag_scheduler
+from jarvis_sdk import sql_dag_state
+from jarvis_sdk import sql_dag_templates
 
 # Globals
 #
@@ -48,36 +51,21 @@ warnings.filterwarnings("ignore", "Your application has authenticated using end
 
 def check_task_dependencies_vs_workflow(task_dependencies, workflow):
 
-    # Process workflow
+    # Build the dependency graph and report all the problems found :
+    # unknown tasks, syntax errors, duplicated IDs, cycles
     #
-    task_list = []
-    for item in workflow:
-
-        task_list.append(item["id"].strip())
-
-    missing_tasks = []
-    for line in task_dependencies:
+    graph = sql_dag_graph.build_task_graph(task_dependencies, [item["id"].strip() for item in workflow])
 
-        line = re.sub(">>|<<|\[|\]|,", " ", line)
-
-        for item in line.split():
-
-            if item not in task_list:
-
-                missing_tasks.append(item.strip())
-
-    if len(missing_tasks) > 0:
+    if len(graph["errors"]) > 0:
 
         print("\n")
-        for missing_task in  missing_tasks:
-            print("ERROR : the task with ID \"{}\" is present in \"task_dependencies\" but not in \"workflow\". Please fix this.".format(missing_task))
+        for error in graph["errors"]:
+            print("ERROR : {} Please fix this.".format(error))
 
         print("\n")
-        return False
+        return None
 
-    else:
-
-        return True
+    return graph
 
 
 def check_task_id_naming(workflow):
@@ -99,1078 +87,177 @@ def check_task_id_naming(workflow):
     return final_result
 
 
-def build_header():
-
-    output_payload = """# -*- coding: utf-8 -*-
-
-import datetime
-import logging
-import sys
-import os
-import json
-import base64
-import uuid
-import time
-import warnings
-from jinja2 import Template
-
-from google.cloud import bigquery
-from google.cloud import firestore
-from google.cloud import storage
-from google.cloud import exceptions
-from google.oauth2 import service_account
-"""
-
-    return output_payload
-
-
-def build_header_full(dag_name, dag_start_date):
-
-    output_payload = """
-import airflow
-from airflow.operators.bash_operator import BashOperator
-from airflow.operators.python_operator import PythonOperator, ShortCircuitOperator, BranchPythonOperator
-from airflow.operators.dummy_operator import DummyOperator
-from airflow.models import Variable
-from airflow.operators import FashiondDataPubSubPublisherOperator
-from airflow.operators import FashiondDataGoogleComputeInstanceOperator
-
-# FD tools
-from dependencies import fd_toolbox
-
-default_args = {
-    'owner': 'JARVIS',
-    'depends_on_past': False,
-    'email': [''],
-    'email_on_failure': False,
-    'email_on_retry': False,
-    'retries': 1,
-    'retry_delay': datetime.timedelta(minutes=2),
-    'start_date': datetime.datetime(""" + dag_start_date + """),
-    'provide_context': True
-}
-
-"""
+def load_sql_task(payload, default_gcp_project_id, default_bq_dataset, default_write_disposition):
 
-    # DUmp dag name
+    # Check for overridden values : GCP Project ID, Dataset, ...
     #
-    output_payload += "# Globals \n#\n"
-    output_payload += "_dag_name = \"" + dag_name + "\"\n"
-    output_payload += "_dag_type = \"gbq-to-gbq\"\n"
-    output_payload += "_dag_generator_version = \"" + _current_version + "\"\n\r"
-
-    return output_payload
-
-
-def build_functions(dag_name, environment):
-
-    output_payload = """
+    task = {}
 
-def process_bigquery_record(payload, convert_type_to_string=False):
-
-    logging.info("Processing RECORD type ...")
-
-    # Check for field description
-    #
-    field_description = None
     try:
-        field_description = payload['description']
-    except Exception:
-        field_description = None
-
-    # Check for field MODE
-    #
-    mode = None
-    try:
-        mode = payload['mode']
-    except Exception:
-        mode = "NULLABLE"
+        task["gcp_project_id"] = payload["gcp_project_id"]
+    except KeyError:
+        task["gcp_project_id"] = default_gcp_project_id
 
-    # Check for field FIELDS
-    #
-    fields = ()
     try:
-        fields_list = payload['fields']
-        logging.info(payload['fields'])
-        list_tuples = []
-
-        for field in fields_list:
-
-            # Field, NAME
-            field_name = None
-            try:
-                field_name = field['name']
-            except KeyError:
-                # error
-                continue
-
-            # Field, TYPE
-            field_type = None
-            try:
-                field_type = field['type'].strip()
-            except KeyError:
-                # error
-                continue
-
-            logging.info("Field name : {} || Field type : {}".format(
-                field_name, field_type))
-
-            # Check if field type is RECORD
-            #
-            if field_type == "RECORD":
-                logging.info("Going to process sub Record.")
-                processed_record = process_bigquery_record(field)
-                logging.info(
-                    "Sub Record processed : \\n{}".format(processed_record))
-                list_tuples.append(processed_record)
-
-            else:
-
-                # Field, MODE
-                field_mode = None
-                try:
-                    field_mode = field['mode']
-                except KeyError:
-                    field_mode = "NULLABLE"
-
-                # Field, DESCRIPTION
-                field_desc = None
-                try:
-                    field_desc = field['description']
-                except KeyError:
-                    field_desc = None
-
-                # Convert FIELD TYPE to STRING
-                #
-                if convert_type_to_string is True:
-                    field_type = "STRING"
-
-                list_tuples.append(bigquery.SchemaField(name=field_name,
-                                                        field_type=field_type,
-                                                        mode=field_mode,
-                                                        description=field_desc))
-
-        fields = tuple(list_tuples)
-
-    except Exception:
-        fields = ()
-
-    # Must return a bigquery.SchemaField
-    #
-    logging.info("Creating SchemaField : name : {} || type : {} || desc. : {} || mode : {} || fields : {}".format(
-        payload['name'], payload['type'], field_description, mode, fields))
-    return bigquery.SchemaField(payload['name'], payload['type'], description=field_description, mode=mode, fields=fields)
-
-def get_firestore_data(collection, doc_id, item, credentials):
-
-    # Read the configuration is stored in Firestore
-    #
-    info            = json.loads(credentials)
-    credentials     = service_account.Credentials.from_service_account_info(info)
-    db              = firestore.Client(credentials=credentials)
-    collection      = collection
-
-    return (db.collection(collection).document(doc_id).get()).to_dict()[item]
-
-
-def set_firestore_data(collection, doc_id, item, value, credentials):
-
-    # Read the configuration is stored in Firestore
-    #
-    info            = json.loads(credentials)
-    credentials     = service_account.Credentials.from_service_account_info(info)
-    db              = firestore.Client(credentials=credentials)
-    collection      = collection
-
-    date_now = datetime.datetime.now().isoformat('T')
-    data = {item : value, "last_updated":date_now}
-
-    db.collection(collection).document(doc_id).set(data, merge=True)
-
-
-def initialize(**kwargs):
-
-    # Read the configuration is stored in Firestore
-    #
-    info            = json.loads(Variable.get("COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET"))
-    credentials     = service_account.Credentials.from_service_account_info(info)
-    db              = firestore.Client(credentials=credentials)
-    collection      = "gbq-to-gbq-conf"
-    doc_id          = \"""" + dag_name + """\"
+        task["bq_dataset"] = payload["bq_dataset"]
+    except KeyError:
+        task["bq_dataset"] = default_bq_dataset
 
-    # Delete the Task statuses if it exists
-    #
     try:
-        db.collection("gbq-to-gbq-tasks-status").document(kwargs["ti"].dag_id + "_" + kwargs["run_id"]).delete()
-    except Exception:
-        logging.info("No Tasks Statuses found.")
-
-    # Set this task as RUNNING
-    #
-    task_infos = {}
-    task_infos[kwargs["ti"].task_id] = "running"
-    db.collection("gbq-to-gbq-tasks-status").document(kwargs["ti"].dag_id + "_" + kwargs["run_id"]).set(task_infos, merge=True)
-
-
-    data_read = (db.collection(collection).document(doc_id).get()).to_dict()
-    data_read['sql'] = {}
-
-    # Push configuration context
-    #
-    guid = datetime.datetime.today().strftime("%Y%m%d") + "-" + str(uuid.uuid4())
-    set_firestore_data('airflow-com', guid, 'configuration_context', data_read, Variable.get("COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET"))
-    kwargs['ti'].xcom_push(key='configuration_context', value={})
-    kwargs['ti'].xcom_push(key='airflow-com-id', value=guid)
-    
-    # Push the environment
-    kwargs['ti'].xcom_push(key='environment', value=data_read['environment'])
-    
-
-    # Push the account
-    kwargs['ti'].xcom_push(key='account', value=data_read['account'])
+        task["write_disposition"] = payload["write_disposition"]
+    except KeyError:
+        task["write_disposition"] = default_write_disposition
 
-    # Do we need to run this DAG
-    # let's check the 'activated' flag
+    # Retrieve sql_query_template
     #
-    # 
-    dag_activated = True
     try:
-        dag_activated = json.loads(data_read["activated"])
+        task["sql_query_template"] = payload["sql_query_template"]
     except KeyError:
-        print("No activated attribute found in DAGs config. Setting to default : True")
+        task["sql_query_template"] = ""
 
-    # Set this task as SUCCESS
+    # Retrieve "atomic_truncate" flag : WRITE_TRUNCATE of an existing table through a MERGE statement
     #
-    task_infos = {}
-    task_infos[kwargs["ti"].task_id] = "success"
-    db.collection("gbq-to-gbq-tasks-status").document(kwargs["ti"].dag_id + "_" + kwargs["run_id"]).set(task_infos, merge=True)
-
-    if dag_activated is True:
-        return "send_dag_infos_to_pubsub_after_config"
-    else:
-        return "send_dag_infos_to_pubsub_deactivated"
-
-
-def log_to_gbq( short_dag_exec_date,
-                dag_execution_date,
-                dag_run_id,
-                dag_name,
-                environment,
-                source_sql,
-                dest_dataset,
-                dest_table,
-                num_rows_inserted ):
-
-    # Create Bigquery client
-    #
-    info = json.loads(Variable.get("COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET"))
-    credentials = service_account.Credentials.from_service_account_info(info)
-    gbq_client = bigquery.Client(credentials=credentials)
-
-    # Dataset
-    #
-    dataset_ref = gbq_client.dataset("jarvis_plateform_logs")
-
-    # Table
-    #
-    schema = [
-        bigquery.SchemaField('dag_execution_date', 'STRING', mode='NULLABLE'),
-        bigquery.SchemaField('dag_run_id', 'STRING', mode='NULLABLE'),
-        bigquery.SchemaField('dag_name', 'STRING', mode='NULLABLE'),
-        bigquery.SchemaField('environment', 'STRING', mode='NULLABLE'),
-        bigquery.SchemaField('source_sql', 'STRING', mode='NULLABLE'),
-        bigquery.SchemaField('dest_dataset', 'STRING', mode='NULLABLE'),
-        bigquery.SchemaField('dest_table', 'STRING', mode='NULLABLE'),
-        bigquery.SchemaField('num_rows_inserted', 'INT64', mode='NULLABLE')
-    ]
-
-    # Prepares a reference to the table
-    # Create the table if needed
-    #
-    table_ref = dataset_ref.table("sql_to_gbq_" + short_dag_exec_date)
-
     try:
-        # Check if the table already exists
-        #
-        gbq_client.get_table(table_ref)
-
-    except Exception as error:
-
-        # The table does not exits, let's create it !
-        #
-        logging.info("Exception : %s", error)
-        gbq_client.create_table(bigquery.Table(table_ref, schema=schema))
-
-
-    # Prepare the insert query
-    #
-    query = "INSERT jarvis_plateform_logs.sql_to_gbq_" + short_dag_exec_date + " (dag_execution_date, dag_run_id, dag_name, environment, source_sql, dest_dataset, dest_table, num_rows_inserted) VALUES ('{}','{}','{}','{}','{}','{}','{}',{})"
-    query = query.format(   dag_execution_date,
-                            dag_run_id,
-                            dag_name,
-                            environment,
-                            source_sql,
-                            dest_dataset,
-                            dest_table,
-                            int(num_rows_inserted) )
-
-    logging.info("QUERY : %s", query)
-
-    job_config = bigquery.QueryJobConfig()
-
-    query_job = gbq_client.query(
-        query,
-        job_config=job_config
-    )
-
-    # Waits for table load to complete.
-    #
-    query_job.result()
-
-    assert query_job.state == 'DONE'
-
-
-def execute_gbq(sql_id, env, dag_name, gcp_project_id, bq_dataset, table_name, write_disposition, sql_query_template, run_locally=False, local_sql_query=None, **kwargs):
-
-    # Strip the ENVIRONMENT out of the DAG's name
-    # i.e : my_dag_PROD -> my_dag
-    #
-    stripped_dag_name = dag_name.rpartition("_")[0]
-
-    # Read SQL file according to the configuration specified
-    # The configuration is stored in Firestore
-    #
-    if run_locally is False:
-        info            = json.loads(Variable.get("COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET"))
-        credentials     = service_account.Credentials.from_service_account_info(info)
-        db              = firestore.Client(credentials=credentials)
-        collection      = "gbq-to-gbq-conf"
-        doc_id          = \"""" + dag_name + """\"
-
-    # Set this task as RUNNING
-    #
-    if run_locally is False:
-        task_infos = {}
-        task_infos[kwargs["ti"].task_id] = "running"
-        db.collection("gbq-to-gbq-tasks-status").document(kwargs["ti"].dag_id + "_" + kwargs["run_id"]).set(task_infos, merge=True)
-
-        logging.info("Trying to retrieve SQL query from Firestore : %s > %s  : sql -> %s", collection, doc_id, sql_id)
-
-    if run_locally is False:
-        data_read = (db.collection(collection).document(doc_id).get()).to_dict()
-        data_decoded = base64.b64decode(data_read['sql'][sql_id])
-        sql_query = str(data_decoded, 'utf-8')
-
-    else:
-
-        # Local execution
-        #
-        sql_query = local_sql_query
-        logging.info("SQL Query : {}\\n".format(sql_query))
-
-    # Update the configuration context
-    #
-    # config_context = json.loads(kwargs['ti'].xcom_pull(key='configuration_context'))
-    # config_context['sql'][sql_id] = sql_query
-    # kwargs['ti'].xcom_push(key='configuration_context', value=json.dumps(config_context))
-    #
-    if run_locally is False:
-        doc_id = kwargs['ti'].xcom_pull(key='airflow-com-id')
-        config_context = get_firestore_data('airflow-com', doc_id, 'configuration_context', Variable.get("COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET"))
-        config_context['sql'][sql_id] = sql_query
-        set_firestore_data('airflow-com', doc_id, 'configuration_context', config_context, Variable.get("COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET"))
+        task["atomic_truncate"] = payload["atomic_truncate"]
+    except KeyError:
+        task["atomic_truncate"] = False
 
-    # Replace "sql_query_template" with DAG Execution DATE
+    # Retrieve "partition_write" : only the partition of the execution date is written
+    #   true                       : to the partition decorator, i.e. table$20200101
+    #   {"merge_keys": ["id", ..]} : with a MERGE on the key columns
     #
-    logging.info("sql_query_template : %s", sql_query_template)
-    if sql_query_template != "":
-
-        execution_date = kwargs.get('ds')
-        logging.info("execution_date : %s", execution_date)
-
-        sql_query = sql_query.replace("{{" + sql_query_template + "}}", execution_date)
-
-        # templated_sql = Template(sql_query)
-        # sql_query = templated_sql.render("{}".format(sql_query_template)=execution_date)
-
-    logging.info("SQL Query : \\n\\r%s", sql_query)
-
-    if run_locally is False:
-        info                = json.loads(Variable.get("COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET"))
-        credentials         = service_account.Credentials.from_service_account_info(info)
-        gbq_client          = bigquery.Client(project=gcp_project_id, credentials=credentials)
-
-    else:
-        gbq_client          = bigquery.Client(project=gcp_project_id)
-
-    dataset_id          = bq_dataset
-    dataset_ref         = gbq_client.dataset(dataset_id)
-    dataset             = bigquery.Dataset(dataset_ref)
-    dataset.location    = "EU"
-    # gbq_client.create_dataset(dataset)
-
-    job_config = bigquery.QueryJobConfig()
-    table_ref = gbq_client.dataset(dataset_id).table(table_name)
-
-    # Try to retrieve schema
-    # This will be used later on in a case of query with WRITE_TRUNCATE
-    try:
-        retrieved_schema = list(gbq_client.get_table(table_ref).schema)
-        logging.info(retrieved_schema)
-    except exceptions.NotFound:
-        logging.info("Table {} does not exist, cannot retrieve schema.".format(table_name))
-        retrieved_schema = None
-
-    job_config.destination = table_ref
-    job_config.write_disposition = write_disposition
-
-    query_job = gbq_client.query(
-        sql_query,
-        location="EU",
-        job_config=job_config
-    )
-
-    results = None
     try:
-        results = query_job.result()  # Waits for query to complete.
-
-    except exceptions.GoogleCloudError as error:
-        logging.error("ERROR while executing query : %s", error)
-        raise error
-
-    try:
-
-        # Update schema
-        #
-        if (write_disposition == "WRITE_TRUNCATE") and (retrieved_schema is not None):
-            logging.info("Updating table schema ...")
-            table_ref = gbq_client.dataset(dataset_id).table(table_name)
-            table_to_modify = gbq_client.get_table(table_ref)
-            table_to_modify.schema = retrieved_schema
-            table_to_modify = gbq_client.update_table(table_to_modify, ["schema"])
-            assert table_to_modify.schema == retrieved_schema
-
-        next(iter(results))
-        logging.info("Output of result : %s", results)
-        logging.info("Rows             : %s", results.total_rows)
-
-        if run_locally is False:
-            log_to_gbq( kwargs["ds_nodash"],
-                        kwargs["ds"],
-                        kwargs["run_id"],
-                        _dag_name,
-                        \"""" + environment + """\",
-                        sql_id,
-                        bq_dataset,
-                        table_name,
-                        results.total_rows )
-    except:
-        logging.info("Query returned no result...")
-
-    # Set this task as SUCCESS
-    #
-    if run_locally is False:
-        task_infos = {}
-        task_infos[kwargs["ti"].task_id] = "success"
-        db.collection("gbq-to-gbq-tasks-status").document(kwargs["ti"].dag_id + "_" + kwargs["run_id"]).set(task_infos, merge=True)
-
-
-
-def execute_bq_copy_table(  source_gcp_project_id, 
-                            source_bq_dataset, 
-                            source_bq_table, 
-                            destination_gcp_project_id, 
-                            destination_bq_dataset, 
-                            destination_bq_table,
-                            destination_bq_table_date_suffix,
-                            destination_bq_table_date_suffix_format,
-                            run_locally=False,
-                            **kwargs):
-
-
-    logging.info("source_gcp_project_id : %s", source_gcp_project_id)
-    logging.info("source_bq_dataset : %s", source_bq_dataset)
-    logging.info("source_bq_table : %s", source_bq_table)
-    logging.info("destination_gcp_project_id : %s", destination_gcp_project_id)
-    logging.info("destination_bq_dataset : %s", destination_bq_dataset)
-    logging.info("destination_bq_table : %s", destination_bq_table)
-    logging.info("destination_bq_table_date_suffix : %s", str(destination_bq_table_date_suffix))
-    logging.info("destination_bq_table_date_suffix_format : %s", destination_bq_table_date_suffix_format)
-
-    # Create Bigquery client
-    #
-    if run_locally is False:
-        info = json.loads(Variable.get("COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET"))
-        credentials = service_account.Credentials.from_service_account_info(info)
-        gbq_client = bigquery.Client(project="fd-jarvis-datalake", credentials=credentials)
-        db = firestore.Client(credentials=credentials)
-
-    else:
-
-        gbq_client = bigquery.Client(project="fd-jarvis-datalake")
-
-    # Set this task as RUNNING
-    #
-    if run_locally is False:
-        task_infos = {}
-        task_infos[kwargs["ti"].task_id] = "running"
-        db.collection("gbq-to-gbq-tasks-status").document(kwargs["ti"].dag_id + "_" + kwargs["run_id"]).set(task_infos, merge=True)
-
-    # Source data
-    #
-    source_dataset = gbq_client.dataset(source_bq_dataset, project=source_gcp_project_id)
-    source_table_ref = source_dataset.table(source_bq_table)
-
-    # Destination
-    #
-    if destination_bq_table_date_suffix is True:
-        today = datetime.datetime.now().strftime(destination_bq_table_date_suffix_format)
-        logging.info("Today : %s", today)
-        destination_bq_table += "_" + today
-        logging.info("Destination table : %s", destination_bq_table)
- 
-    dest_table_ref = gbq_client.dataset(destination_bq_dataset, project=destination_gcp_project_id).table(destination_bq_table)
-
-    job_config = bigquery.CopyJobConfig()
-    job_config.write_disposition = "WRITE_TRUNCATE"
-
-    job = gbq_client.copy_table(
-        source_table_ref,
-        dest_table_ref,
-        location="EU",
-        job_config = job_config
-    )
-
-    job.result()  # Waits for job to complete.
-    assert job.state == "DONE"
-
-    # Set this task as SUCCESS
-    #
-    if run_locally is False:
-        task_infos = {}
-        task_infos[kwargs["ti"].task_id] = "success"
-        db.collection("gbq-to-gbq-tasks-status").document(kwargs["ti"].dag_id + "_" + kwargs["run_id"]).set(task_infos, merge=True)
-
-
-
-def execute_bq_create_table(gcp_project_id,
-                            force_delete,
-                            bq_dataset, 
-                            bq_table,
-                            bq_table_description,
-                            bq_table_schema,
-                            bq_table_clustering_fields,
-                            bq_table_timepartitioning_field,
-                            bq_table_timepartitioning_expiration_ms,
-                            bq_table_timepartitioning_require_partition_filter,
-                            run_locally=False,
-                            **kwargs):
-
-
-    logging.info("gcp_project_id : %s", gcp_project_id)
-    logging.info("bq_dataset : %s", bq_dataset)
-    logging.info("bq_table : %s", bq_table)
-    
-    # Create Bigquery client
-    #
-    if run_locally is False:
-        info = json.loads(Variable.get("COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET"))
-        credentials = service_account.Credentials.from_service_account_info(info)
-        gbq_client = bigquery.Client(project=gcp_project_id, credentials=credentials)
-        db = firestore.Client(credentials=credentials)
+        partition_write = payload["partition_write"]
+    except KeyError:
+        partition_write = None
+
+    if (partition_write is None) or (partition_write is False):
+        task["partition_write"] = None
+    elif partition_write is True:
+        task["partition_write"] = {"mode": "decorator"}
+    elif isinstance(partition_write, dict) and isinstance(partition_write.get("merge_keys"), list) and (len(partition_write["merge_keys"]) > 0):
+        task["partition_write"] = {"mode": "merge", "merge_keys": partition_write["merge_keys"]}
     else:
-        gbq_client = bigquery.Client(project=gcp_project_id)
-
-    # Set this task as RUNNING
-    #
-    if run_locally is False:
-        logging.info("Setting task status : running")
-        task_infos = {}
-        task_infos[kwargs["ti"].task_id] = "running"
-        time.sleep(1)
-        db.collection("gbq-to-gbq-tasks-status").document(kwargs["ti"].dag_id + "_" + kwargs["run_id"]).set(task_infos, merge=True)
+        print("\nError while parsing \"partition_write\" for task : {}".format(payload["id"]))
+        print("Expected true or {\"merge_keys\": [\"column\", ...]}")
+        return False
 
-    # Instantiate a table object
-    #
-    dataset_ref = gbq_client.dataset(bq_dataset, project=gcp_project_id)
-    table_ref = dataset_ref.table(bq_table)
-    table = bigquery.Table(table_ref)
+    task["table_name"] = payload["table_name"]
 
-    # Check wether the table already exist or not
+    # Read the SQL file, once
     #
     try:
-        table_tmp = gbq_client.get_table(table_ref)
-        logging.info("Table {} exists.".format(gcp_project_id + "." + bq_dataset + "." + bq_table))
-
-        if force_delete is True:
-            logging.info("Table {} is flagged to be deleted.".format(gcp_project_id + "." + bq_dataset + "." + bq_table))
-            gbq_client.delete_table(gcp_project_id + "." + bq_dataset + "." + bq_table)
-
-        else:
-
-            # Is the table partitioned
-            #
-            time_partitioning = table_tmp.partitioning_type
-
-            # Let's delete the current date partition
-            #
-            if time_partitioning is not None:
-                table_name_with_partition = gcp_project_id + "." + bq_dataset + "." + bq_table + "$" + (kwargs.get('ds')).replace("-", "")
-                logging.info("Delete partition : %s", table_name_with_partition)
-                gbq_client.delete_table(table_name_with_partition)
-
-            # Set this task as SUCCESS
-            #
-            logging.info("Setting task status : success")
-            task_infos = {}
-            task_infos[kwargs["ti"].task_id] = "success"
-            time.sleep(1)
-            db.collection("gbq-to-gbq-tasks-status").document(kwargs["ti"].dag_id + "_" + kwargs["run_id"]).set(task_infos, merge=True)
-            
-            return
-
-    except exceptions.NotFound:
-        logging.info("Table {} does not exist. Let's create it.".format(gcp_project_id + ":" + bq_dataset + "." + bq_table))
-
-    except ValueError as error:
-        logging.info(error)
-        logging.info("Table {} exists and is not time partitioned.".format(gcp_project_id + ":" + bq_dataset + "." + bq_table))
-
-        # Set this task as SUCCESS
-        #
-        if run_locally is False:
-            logging.info("Setting task status : success")
-            task_infos = {}
-            task_infos[kwargs["ti"].task_id] = "success"
-            time.sleep(1)
-            db.collection("gbq-to-gbq-tasks-status").document(kwargs["ti"].dag_id + "_" + kwargs["run_id"]).set(task_infos, merge=True)
-
-        return
-
-
-    # Get a new REF
-    #
-    table = bigquery.Table(table_ref)
-
-    # Set table description
-    #
-    table.description = bq_table_description
-
-    # Processing the table schema
-    #
-    table_schema_in = bq_table_schema
-    table_schema_out = []
-
-    logging.info("Table Schema :")
-
-    for item in table_schema_in:
-
-        # Field, NAME
-        field_name = None
-        try:
-            field_name = item['name'].strip()
-        except KeyError:
-            # error
-            logging.info("ERROR : field does note have NAME")
-            continue
-        
-        # Field, TYPE
-        field_type = None
-        try:
-            field_type = item['type'].strip()
-        except KeyError:
-            # error
-            logging.info("ERROR : field does note have TYPE")
-            continue
-
-        logging.info("Field name : {} || Field type : {}".format(field_name, field_type))
-
-        # Check for field description
-        field_description = None
-        try:
-            field_description = item['description']
-        except Exception:
-            field_description = None
-
-        # Check for field MODE
-        mode = None
-        try:
-            mode = item['mode']
-        except Exception:
-            mode = "NULLABLE"
-
-        # Process RECORD type
-        #
-        if field_type == "RECORD":
-            if run_locally is False:
-                schemafield_to_add = fd_toolbox.process_bigquery_record(item)
-            else:
-                schemafield_to_add = process_bigquery_record(item)
-
-            logging.info("Record processed : \\n{}".format(schemafield_to_add))
-
-        else:
-            schemafield_to_add = bigquery.SchemaField(field_name, field_type, description=field_description, mode=mode)
-
-        table_schema_out.append(schemafield_to_add)        
-        logging.info("SchemaField added : {}".format(schemafield_to_add))
-
-    # Some infos
-    #
-    logging.info(table_schema_out)
-    
-
-    # Processing clustering fields
-    #
-    if (bq_table_clustering_fields is not None) and (len(bq_table_clustering_fields) > 0):
-
-        table.clustering_fields = bq_table_clustering_fields
-        logging.info("Clustering fields : %s", str(bq_table_clustering_fields))
-
-        # Clustering fields option needs time_partition enabled
-        #
-        table.time_partitioning = bigquery.table.TimePartitioning()
-
-    else:
-        logging.info("No clustering fields option to process.")
-
-    # Processing time partitioning options
-    #
-    if (bq_table_timepartitioning_field is not None) or (bq_table_timepartitioning_expiration_ms is not None) or (bq_table_timepartitioning_require_partition_filter is not None):
-
-        logging.info("Time Partitioning FIELD                    : %s", bq_table_timepartitioning_field)
-        logging.info("Time Partitioning EXPIRATION MS            : %s", bq_table_timepartitioning_expiration_ms)
-        logging.info("Time Partitioning REQUIRE PARTITION FILTER : %s", bq_table_timepartitioning_require_partition_filter)
-        table.time_partitioning = bigquery.table.TimePartitioning(field=bq_table_timepartitioning_field, expiration_ms=bq_table_timepartitioning_expiration_ms)
-        table.require_partition_filter = bq_table_timepartitioning_require_partition_filter
-
-    # Schema
-    #
-    table.schema = table_schema_out
-
-    for item in table.schema:
-        logging.info(item)
-
-    # Create table
-    #
-    job = gbq_client.create_table(table)
-
-    # Set this task as SUCCESS
-    #
-    if run_locally is False:
-        logging.info("Setting task status : success")
-        task_infos = {}
-        task_infos[kwargs["ti"].task_id] = "success"
-        time.sleep(1)
-        db.collection("gbq-to-gbq-tasks-status").document(kwargs["ti"].dag_id + "_" + kwargs["run_id"]).set(task_infos, merge=True)
-
-"""
-
-    return output_payload
-
-
-def build_complementary_code():
-
-    output_payload = """
-
-    # Initial logging
-    #
-    send_dag_infos_to_pubsub_start = FashiondDataPubSubPublisherOperator(
-        task_id="send_dag_infos_to_pubsub_start",
-        dag=dag,
-        google_credentials="{{ var.value.COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET }}",
-        payload={"dag_id": _dag_name,
-                 "dag_execution_date": "{{ execution_date }}",
-                 "dag_run_id": "{{ run_id }}",
-                 "dag_type": _dag_type,
-                 "dag_generator_version": _dag_generator_version,
-                 "job_id": _dag_type + "|" + _dag_name,
-                 "status": "RUNNING"
-                 }
-    )
-
-    # First step
-    #
-    initialize = BranchPythonOperator(
-        task_id="initialize",
-        dag=dag,
-        python_callable = initialize
-    )
-
-    # Some logging after reading the configuration
-    #
-    send_dag_infos_to_pubsub_after_config = FashiondDataPubSubPublisherOperator(
-        task_id = "send_dag_infos_to_pubsub_after_config",
-        dag = dag,
-        google_credentials = "{{ var.value.COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET }}",
-        payload = { "dag_id" : _dag_name ,
-                    "dag_execution_date" : "{{ execution_date }}",
-                    "dag_run_id" : "{{ run_id }}",
-                    "dag_type": _dag_type,
-                    "dag_generator_version": _dag_generator_version,
-                    "configuration_context": {"collection" : "airflow-com", "doc_id" : "{{ task_instance.xcom_pull(key='airflow-com-id') }}", "item" : "configuration_context"},
-                    "account": "{{task_instance.xcom_pull(key='account')}}",
-                    "environment": "{{task_instance.xcom_pull(key='environment')}}",
-                    "job_id": _dag_type + "|" + _dag_name,
-                    "status": "RUNNING"
-                }
-    )
-
-    # In case of failure
-    #
-    send_dag_infos_to_pubsub_failed = FashiondDataPubSubPublisherOperator(
-        task_id = "send_dag_infos_to_pubsub_failed",
-        dag = dag,
-        trigger_rule='one_failed',
-        google_credentials = "{{ var.value.COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET }}",
-        payload = { "dag_id" : _dag_name ,
-                    "dag_execution_date" : "{{ execution_date }}",
-                    "dag_run_id" : "{{ run_id }}",
-                    "dag_type": _dag_type,
-                    "dag_generator_version": _dag_generator_version,
-                    "job_id": _dag_type + "|" + _dag_name,
-                    "status": "FAILED"
-                }
-    )
-
-    # Final step
-    #
-    send_dag_infos_to_pubsub = FashiondDataPubSubPublisherOperator(
-        task_id = "send_dag_infos_to_pubsub",
-        dag = dag,
-        google_credentials = "{{ var.value.COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET }}",
-        payload = { "dag_id" : _dag_name ,
-                    "dag_execution_date" : "{{ execution_date }}",
-                    "dag_run_id" : "{{ run_id }}",
-                    "dag_type": _dag_type,
-                    "dag_generator_version": _dag_generator_version,
-                    "configuration_context": {"collection" : "airflow-com", "doc_id" : "{{ task_instance.xcom_pull(key='airflow-com-id') }}", "item" : "configuration_context"},
-                    "account": "{{task_instance.xcom_pull(key='account')}}",
-                    "environment": "{{task_instance.xcom_pull(key='environment')}}",
-                    "job_id": _dag_type + "|" + _dag_name,
-                    "status": "SUCCESS"
-                }
-    )
-
-    # Send status via PubSub in case the "activated" configuration flag is set to FALSE
-    #
-    send_dag_infos_to_pubsub_deactivated = FashiondDataPubSubPublisherOperator(
-        task_id = "send_dag_infos_to_pubsub_deactivated",
-        dag = dag,
-        google_credentials = "{{ var.value.COMPOSER_SERVICE_ACCOUNT_CREDENTIALS_SECRET }}",
-        payload = { "dag_id" : _dag_name ,
-                    "dag_execution_date" : "{{ execution_date }}",
-                    "dag_run_id" : "{{ run_id }}",
-                    "dag_type": _dag_type,
-                    "dag_generator_version": _dag_generator_version,
-                    "configuration_context": {"collection" : "airflow-com", "doc_id" : "{{ task_instance.xcom_pull(key='airflow-com-id') }}", "item" : "configuration_context"},
-                    "account": "{{task_instance.xcom_pull(key='account')}}",
-                    "environment": "{{task_instance.xcom_pull(key='environment')}}",
-                    "job_id": _dag_type + "|" + _dag_name,
-                    "status": "SUCCESS"
-                }
-    )
-
-"""
+        with open("./" + payload["sql_file"], 'r') as file:
+            task["sql"] = file.read()
+    except Exception as ex:
+        print("\nError while reading SQL file for task : {}".format(payload["id"]))
+        print(ex)
+        return False
 
-    return output_payload
+    return task
 
 
-def build_sql_task(payload, env, default_gcp_project_id, default_bq_dataset, default_write_disposition, global_path, run_locally=False, task_id=None):
+def load_copy_bq_table_task(payload, default_gcp_project_id, default_bq_dataset):
 
     # Check for overridden values : GCP Project ID, Dataset, ...
     #
-    gcp_project_id = None
-    bq_dataset = None
-    write_disposition = None
+    task = {}
 
     try:
-        gcp_project_id = payload["gcp_project_id"]
-
+        task["destination_gcp_project_id"] = payload["gcp_project_id"]
     except KeyError:
-        gcp_project_id = default_gcp_project_id
+        task["destination_gcp_project_id"] = default_gcp_project_id
 
     try:
-        bq_dataset = payload["bq_dataset"]
-
+        task["destination_bq_dataset"] = payload["bq_dataset"]
     except KeyError:
-        bq_dataset = default_bq_dataset
+        task["destination_bq_dataset"] = default_bq_dataset
 
+    task["destination_bq_table_date_suffix"] = False
+    task["destination_bq_table_date_suffix_format"] = ""
     try:
-        write_disposition = payload["write_disposition"]
-
+        task["destination_bq_table_date_suffix"] = payload["destination_bq_table_date_suffix"]
+        task["destination_bq_table_date_suffix_format"] = payload["destination_bq_table_date_suffix_format"].strip()
     except KeyError:
-        write_disposition = default_write_disposition
+        print()
 
-    # Retrieve sql_query_template
-    #
-    temporary_tablesql_query_template = ""
-    try:
-        sql_query_template = payload["sql_query_template"]
-    except KeyError:
-        sql_query_template = ""
+    task["source_gcp_project_id"] = payload["source_gcp_project_id"].strip()
+    task["source_bq_dataset"] = payload["source_bq_dataset"].strip()
+    task["destination_gcp_project_id"] = task["destination_gcp_project_id"].strip()
+    task["destination_bq_dataset"] = task["destination_bq_dataset"].strip()
 
-    # Retrieve documentation
+    # Retrieve "copy_mode" : "copy" (copy job), "clone" or "snapshot" (zero-copy tables)
     #
-    dag_doc = ""
     try:
-        with open("./" + payload["doc_md"], 'r') as file:
-            dag_doc = file.read()
-    except:
-        print("No documentation provided for task : ", payload["id"])
-
-    # Retrieve SQL file to inject into Documentation
-    #
-    sql_doc = ""
-    with open("./" + payload["sql_file"], 'r') as file:
-        sql_doc += file.read().replace("\n", "\n\n")
-
-    if run_locally is True:
-
-        output_payload = """def """ + task_id + """():
-
-    logging.info("\\n\\nExecuting task with id : {}\\n".format(\"""" + task_id + """\"))
-
-    execute_gbq(sql_id = \"""" + payload["id"] + """\",
-        env = \"""" + env + """\",
-        dag_name = "TEST",
-        gcp_project_id = \"""" + gcp_project_id + """\",
-        bq_dataset = \"""" + bq_dataset + """\",
-        table_name = \"""" + payload["table_name"] + """\",
-        write_disposition = \"""" + write_disposition + """\",
-        sql_query_template = \"""" + sql_query_template + """\",
-        run_locally = True,
-        local_sql_query = \"\"\"""" + sql_doc + """\"\"\"
-        )
-
-"""
-
-    else:
-
-        sql_doc = sql_doc.replace("`", "'")
-
-        output_payload = ""
-        output_payload += "    " + payload["id"] + " = "
-        output_payload += """PythonOperator(
-                task_id = \"""" + payload["id"] + """\",
-                dag = dag,
-                python_callable = execute_gbq,
-                op_kwargs={ "sql_id" : \"""" + payload["id"] + """\",
-                            "env" : \"""" + env + """\",
-                            "dag_name" : _dag_name,
-                            "gcp_project_id" : \"""" + gcp_project_id + """\",
-                            "bq_dataset" : \"""" + bq_dataset + """\",
-                            "table_name" : \"""" + payload["table_name"] + """\",
-                            "write_disposition" : \"""" + write_disposition + """\",
-                            "sql_query_template" : \"""" + sql_query_template + """\"
-                            }
-                )
-
-    """ + payload["id"] + """.doc_md = \"\"\"""" + dag_doc + """
-
-    # **SQL Query**
-
-    """ + sql_doc + """
-    \"\"\"
-
-    """
-
-    return output_payload
-
+        task["copy_mode"] = payload["copy_mode"].strip()
+    except KeyError:
+        task["copy_mode"] = "copy"
 
-def build_copy_bq_table_task(payload, default_gcp_project_id, default_bq_dataset, run_locally=False, task_id=None):
+    if task["copy_mode"] not in ["copy", "clone", "snapshot"]:
+        print("\nError while parsing \"copy_mode\" for task : {}".format(payload["id"]))
+        print("Expected : copy, clone or snapshot")
+        return False
 
-    # Check for overridden values : GCP Project ID, Dataset, ...
+    # A snapshot is never replaced : without a date suffix, every run after the first one would keep the first snapshot
     #
-    gcp_project_id = None
-    bq_dataset = None
-
-    try:
-        gcp_project_id = payload["gcp_project_id"]
-
-    except KeyError:
-        gcp_project_id = default_gcp_project_id
+    if (task["copy_mode"] == "snapshot") and (task["destination_bq_table_date_suffix"] is not True):
+        print("\nError while parsing \"copy_mode\" for task : {}".format(payload["id"]))
+        print("The \"snapshot\" mode needs \"destination_bq_table_date_suffix\" : true, a snapshot table is never replaced")
+        return False
 
     try:
-        bq_dataset = payload["bq_dataset"]
-
+        task["snapshot_expiration_days"] = payload["snapshot_expiration_days"]
     except KeyError:
-        bq_dataset = default_bq_dataset
+        task["snapshot_expiration_days"] = None
 
-    destination_bq_table_date_suffix = "False"
-    destination_bq_table_date_suffix_format = ""
+    # Tables to copy : "source_bq_table" and "destination_bq_table", or a "tables" list copied by the same task.
+    # The source project and dataset of the task apply to every table unless overridden.
+    #
     try:
-        destination_bq_table_date_suffix = str(payload["destination_bq_table_date_suffix"])
-        destination_bq_table_date_suffix_format = payload["destination_bq_table_date_suffix_format"].strip()
+        tables = payload["tables"]
     except KeyError:
-        print()
+        tables = [{"source_bq_table": payload["source_bq_table"], "destination_bq_table": payload["destination_bq_table"]}]
 
-    # Prepare output value
-    output_payload = ""
+    task["copies"] = []
+    for table in tables:
 
-    if run_locally is True:
-
-        output_payload += """def """ + task_id + """():
-
-    logging.info("\\n\\nExecuting task with id : {}\\n".format(\"""" + task_id + """\"))
-
-    execute_bq_copy_table(source_gcp_project_id = \"""" + payload["source_gcp_project_id"].strip() + """\",
-        source_bq_dataset = \"""" + payload["source_bq_dataset"].strip() + """\",
-        source_bq_table = \"""" + payload["source_bq_table"].strip() + """\",
-        destination_gcp_project_id = \"""" + gcp_project_id.strip() + """\",
-        destination_bq_dataset = \"""" + bq_dataset.strip() + """\",
-        destination_bq_table = \"""" + payload["destination_bq_table"].strip() + """\",
-        destination_bq_table_date_suffix = """ + destination_bq_table_date_suffix + """,
-        destination_bq_table_date_suffix_format = \"""" + destination_bq_table_date_suffix_format + """\",
-        run_locally = True
-        )
-
-"""
-
-    else:
+        try:
+            task["copies"].append({
+                "source_gcp_project_id": table.get("source_gcp_project_id", task["source_gcp_project_id"]).strip(),
+                "source_bq_dataset": table.get("source_bq_dataset", task["source_bq_dataset"]).strip(),
+                "source_bq_table": table["source_bq_table"].strip(),
+                "destination_bq_table": table["destination_bq_table"].strip()
+            })
+        except (KeyError, AttributeError):
+            print("\nError while parsing \"tables\" for task : {}".format(payload["id"]))
+            print("Every table needs a \"source_bq_table\" and a \"destination_bq_table\"")
+            return False
 
-        output_payload += "    " + payload["id"] + " = "
-        output_payload += """PythonOperator(
-            task_id=\"""" + payload["id"] + """\",
-            dag=dag,
-            python_callable=execute_bq_copy_table,
-            op_kwargs={
-                "source_gcp_project_id" : \"""" + payload["source_gcp_project_id"].strip() + """\",
-                "source_bq_dataset" : \"""" + payload["source_bq_dataset"].strip() + """\",
-                "source_bq_table" : \"""" + payload["source_bq_table"].strip() + """\",
-                "destination_gcp_project_id" : \"""" + gcp_project_id.strip() + """\",
-                "destination_bq_dataset" : \"""" + bq_dataset.strip() + """\",
-                "destination_bq_table" : \"""" + payload["destination_bq_table"].strip() + """\",
-                "destination_bq_table_date_suffix" : """ + destination_bq_table_date_suffix + """,
-                "destination_bq_table_date_suffix_format" : \"""" + destination_bq_table_date_suffix_format + """\"
-            }
-        )
-"""
+    if len(task["copies"]) == 0:
+        print("\nError while parsing \"tables\" for task : {}. The list is empty.".format(payload["id"]))
+        return False
 
-    return output_payload
+    task["source_bq_table"] = task["copies"][0]["source_bq_table"]
+    task["destination_bq_table"] = task["copies"][0]["destination_bq_table"]
 
+    return task
 
-def build_create_bq_table_task(payload, default_gcp_project_id, default_bq_dataset, global_path, run_locally=False, task_id=None):
 
-    # Prepare output value
-    output_payload = ""
+def load_create_bq_table_task(payload, default_gcp_project_id, default_bq_dataset):
 
     # Check for overridden values : GCP Project ID, Dataset, ...
     #
-    gcp_project_id = None
-    bq_dataset = None
+    task = {}
 
     try:
-        gcp_project_id = payload["gcp_project_id"]
-
+        task["gcp_project_id"] = payload["gcp_project_id"]
     except KeyError:
-        gcp_project_id = default_gcp_project_id
+        task["gcp_project_id"] = default_gcp_project_id
 
     try:
-        bq_dataset = payload["bq_dataset"]
-
+        task["bq_dataset"] = payload["bq_dataset"]
     except KeyError:
-        bq_dataset = default_bq_dataset
+        task["bq_dataset"] = default_bq_dataset
 
     # Open DDL file
     #
@@ -1204,201 +291,101 @@ def build_create_bq_table_task(payload, default_gcp_project_id, default_bq_datas
         except KeyError:
             print("Optional \"bq_table_timepartitioning_expiration_ms\" parameter not provided.")
 
-        try:
-            payload["bq_table_timepartitioning_require_partition_filter"] = payload_ddl["bq_table_timepartitioning_require_partition_filter"]
-        except KeyError:
-            print("Optional \"bq_table_timepartitioning_require_partition_filter\" parameter not provided.")
-
-    # Table description
-    #
-    table_description = ""
-    try:
-        table_description = payload["bq_table_description"].strip()
-    except KeyError:
-        table_description = ""
-
-    # Table Schema
-    #
-    table_schema = []
-    try:
-        table_schema = payload["bq_table_schema"]
-    except KeyError:
-        table_schema = []
-
-    # Retrieve clustering fields options
-    # Optional
-    #
-    bq_table_clustering_fields = None
-    try:
-        bq_table_clustering_fields = payload['bq_table_clustering_fields']
-    except KeyError:
-        bq_table_clustering_fields = None
-
-    # Retrieve "force_delete" flag
-    #
-    force_delete = False
-    try:
-        force_delete = payload['force_delete']
-    except KeyError:
-        force_delete = False
-
-    # Retrieve BQ Table Time Partitioning options
-    # These are optional
-    #
-    bq_table_timepartitioning_field = None
-    bq_table_timepartitioning_expiration_ms = None
-    bq_table_timepartitioning_require_partition_filter = None
-    try:
-        bq_table_timepartitioning_field = payload['bq_table_timepartitioning_field']
-    except KeyError:
-        bq_table_timepartitioning_field = None
-    try:
-        bq_table_timepartitioning_expiration_ms = payload['bq_table_timepartitioning_expiration_ms']
-    except KeyError:
-        bq_table_timepartitioning_expiration_ms = None
-    try:
-        bq_table_timepartitioning_require_partition_filter = payload[
-            'bq_table_timepartitioning_require_partition_filter']
-    except KeyError:
-        bq_table_timepartitioning_require_partition_filter = None
-
-
-    if run_locally is True:
-
-        output_payload += """def """ + task_id + """():
-
-    logging.info("\\n\\nExecuting task with id : {}\\n".format(\"""" + task_id + """\"))
-
-    execute_bq_create_table(gcp_project_id = \"""" + gcp_project_id + """\",
-        force_delete = """ + str(force_delete) + """,
-        bq_dataset = \"""" + bq_dataset + """\",
-        bq_table = \"""" + payload["bq_table"].strip() + """\",
-        bq_table_description = \"""" + table_description + """\",
-        bq_table_schema = """ + str(table_schema) + """,
-        bq_table_clustering_fields = """ + str(bq_table_clustering_fields) + """,
-        bq_table_timepartitioning_field = """ + (str(bq_table_timepartitioning_field) if (bq_table_timepartitioning_field is None) else ("\"" + bq_table_timepartitioning_field + "\"")) + """,
-        bq_table_timepartitioning_expiration_ms = """ + (str(bq_table_timepartitioning_expiration_ms) if (bq_table_timepartitioning_expiration_ms is None) else ("\"" + bq_table_timepartitioning_expiration_ms + "\"")) + """,
-        bq_table_timepartitioning_require_partition_filter = """ + (str(bq_table_timepartitioning_require_partition_filter) if (bq_table_timepartitioning_require_partition_filter is None) else ("\"" + bq_table_timepartitioning_require_partition_filter + "\"")) + """,
-        run_locally = True
-        )
-"""
-
-        return output_payload
-
-    else:
-
-        output_payload += "    " + payload["id"] + " = "
-        output_payload += """PythonOperator(
-        task_id=\"""" + payload["id"] + """\",
-        dag=dag,
-        python_callable=execute_bq_create_table,
-        op_kwargs={
-            "gcp_project_id" : \"""" + gcp_project_id + """\",
-            "force_delete" : """ + str(force_delete) + """,
-            "bq_dataset" : \"""" + bq_dataset + """\",
-            "bq_table" : \"""" + payload["bq_table"].strip() + """\",
-            "bq_table_description" : \"""" + table_description + """\",
-            "bq_table_schema" : """ + str(table_schema) + """,
-            "bq_table_clustering_fields" : """ + str(bq_table_clustering_fields) + """,
-            "bq_table_timepartitioning_field" : """ + (str(bq_table_timepartitioning_field) if (bq_table_timepartitioning_field is None) else ("\"" + bq_table_timepartitioning_field + "\"")) + """,
-            "bq_table_timepartitioning_expiration_ms" :""" + (str(bq_table_timepartitioning_expiration_ms) if (bq_table_timepartitioning_expiration_ms is None) else ("\"" + bq_table_timepartitioning_expiration_ms + "\"")) + """,
-            "bq_table_timepartitioning_require_partition_filter" :""" + (str(bq_table_timepartitioning_require_partition_filter) if (bq_table_timepartitioning_require_partition_filter is None) else ("\"" + bq_table_timepartitioning_require_partition_filter + "\"")) + """
-        }
-    )
-"""
-
-    return output_payload
-
-
-def build_vm_launcher_task(payload, gcp_project_id, run_locally=False, task_id=None):
-
-    # Infos
-    #
-    print("Generating VM LAUNCHER task ...")
+        try:
+            payload["bq_table_timepartitioning_require_partition_filter"] = payload_ddl["bq_table_timepartitioning_require_partition_filter"]
+        except KeyError:
+            print("Optional \"bq_table_timepartitioning_require_partition_filter\" parameter not provided.")
 
-    if run_locally is True:
-        return ""
+    task["bq_table"] = payload["bq_table"].strip()
 
-    # Retrieve parameters
+    # Table description
     #
     try:
-        vm_delete = payload["vm_delete"]
+        task["bq_table_description"] = payload["bq_table_description"].strip()
     except KeyError:
-        vm_delete = False
+        task["bq_table_description"] = ""
 
+    # Table Schema
+    #
     try:
-        vm_working_directory = payload["vm_working_directory"]
+        task["bq_table_schema"] = payload["bq_table_schema"]
     except KeyError:
-        vm_working_directory = "/tmp"
+        task["bq_table_schema"] = []
 
+    # Retrieve "force_delete" flag
+    #
     try:
-        vm_compute_zone = payload["vm_compute_zone"]
+        task["force_delete"] = payload['force_delete']
     except KeyError:
-        vm_compute_zone = "europe-west1-b"
+        task["force_delete"] = False
 
+    # Retrieve "schema_evolution" flag : an existing table is brought to its DDL in place.
+    # A breaking change fails the task, unless "rebuild" allows to drop and recreate the table.
+    #
     try:
-        vm_core_number = payload["vm_core_number"]
+        task["schema_evolution"] = payload['schema_evolution']
     except KeyError:
-        vm_core_number = "1"
+        task["schema_evolution"] = False
 
-    try:
-        vm_memory_amount = payload["vm_memory_amount"]
-    except KeyError:
-        vm_memory_amount = "4"
+    if task["schema_evolution"] not in [True, False, "rebuild"]:
+        print("\nError while parsing \"schema_evolution\" for task : {}".format(payload["id"]))
+        print("Expected : true, false or \"rebuild\"")
+        return False
 
-    try:
-        vm_disk_size = payload["vm_disk_size"]
-    except KeyError:
-        vm_disk_size = "10"
-
-    # Prepare output value
-    #
-    output_payload = ""
-    output_payload += "    " + payload["id"] + " = "
-    output_payload += """FashiondDataGoogleComputeInstanceOperator(
-        task_id=\"""" + payload["id"] + """\",
-        dag=dag,
-        gcp_project_id = \"""" + gcp_project_id + """\",
-        script_to_execute =  """ + "{}".format(payload["script_to_execute"])  + """,
-        vm_delete = """ + "{}".format(vm_delete)  + """,
-        vm_working_directory = """ + "\"{}\"".format(vm_working_directory)  + """,
-        vm_compute_zone = """ + "\"{}\"".format(vm_compute_zone)  + """,
-        vm_core_number = """ + "\"{}\"".format(vm_core_number)  + """,
-        vm_memory_amount = """ + "\"{}\"".format(vm_memory_amount)  + """,
-        vm_disk_size = """ + "\"{}\"".format(vm_disk_size)  + """,
-        private_key_id = \"COMPOSER_RSA_PRIVATE_KEY_SECRET\"    
-    )
-"""
+    # Retrieve clustering fields and BQ Table Time Partitioning options
+    # These are optional
+    #
+    for option in ["bq_table_clustering_fields",
+                   "bq_table_timepartitioning_field",
+                   "bq_table_timepartitioning_expiration_ms",
+                   "bq_table_timepartitioning_require_partition_filter"]:
+        try:
+            task[option] = payload[option]
+        except KeyError:
+            task[option] = None
 
-    return output_payload
+    return task
 
 
-def build_python_script(configuration_file, arguments=None, run_locally=False):
+def load_vm_launcher_task(payload, default_gcp_project_id):
 
-    # Do we run locally ?
-    # We need to check the arguments
+    # Retrieve parameters
     #
-    local_tasks = []
-    if (run_locally is True) and (arguments is not None):
+    task = {}
+    task["gcp_project_id"] = default_gcp_project_id
+    task["script_to_execute"] = payload["script_to_execute"]
 
-        index = 2
-        while index < len(arguments):
-            local_tasks.append(arguments[index].strip())
-            index += 1
+    defaults = {
+        "vm_delete": False,
+        "vm_working_directory": "/tmp",
+        "vm_compute_zone": "europe-west1-b",
+        "vm_core_number": "1",
+        "vm_memory_amount": "4",
+        "vm_disk_size": "10"
+    }
+
+    for key, default_value in defaults.items():
+        try:
+            task[key] = payload[key]
+        except KeyError:
+            task[key] = default_value
+
+    return task
 
-    # Infos
-    #
-    print("Generating and deploying DAG ...")
 
+def load_configuration(configuration_file):
+
+    # Parse the JSON configuration and load every file it references (SQL, Markdown, DDL) exactly once.
+    # The returned "workflow context" is used to render the DAG, the local script and the API payload.
+    #
     print("File to process      : {}".format(configuration_file))
     environment = "PROD"
 
     # Open JSON configuration file
     #
     try:
-        json_file = open(configuration_file, "r")
-        json_payload = json.load(json_file)
-        json_file.close()
+        with open(configuration_file, "r") as json_file:
+            json_payload = json.load(json_file)
     except Exception as ex:
         print("Error while parsing JSON file : {}".format(configuration_file))
         print(ex)
@@ -1413,66 +400,72 @@ def build_python_script(configuration_file, arguments=None, run_locally=False):
     # The value set in the JSON file will always be the greatest priority
     #
     try:
-        
         environment = json_payload["environment"].strip()
-
-    except KeyError as ex:
-
+    except KeyError:
         environment = environment.strip()
-    
+
     print("Environment          : {}".format(environment))
 
+    context = {}
+    context["configuration"] = json_payload
+    context["global_path"] = global_path
+    context["environment"] = environment
+
     # Extract dag name and add the ENV
     #
-    dag_name = json_payload["configuration_id"] + "_" + environment
+    context["dag_name"] = json_payload["configuration_id"] + "_" + environment
 
     # Extract "start_date" and "schedule_interval"
     #
-    dag_start_date = json_payload["start_date"]
+    context["dag_start_date"] = json_payload["start_date"]
+    context["schedule_interval"] = json_payload["schedule_interval"]
 
     # Extract DAG's description
     #
-    dag_description = ""
     try:
-        dag_description = json_payload["short_description"]
+        context["dag_description"] = json_payload["short_description"]
     except KeyError:
         print("No description provided for the DAG.")
         raise Exception("No description provided for the DAG.")
 
     # Extract DAG's documentation
     #
-    dag_doc = ""
+    context["dag_doc"] = ""
     try:
         dag_documentation = global_path + json_payload["doc_md"]
         with open(dag_documentation, 'r') as file:
-            dag_doc = file.read()
+            context["dag_doc"] = file.read()
     except KeyError:
         print("No Markdown documentation provided for the DAG.")
 
     # Extract max_active_runs
     #
-    max_active_runs = None
     try:
-        max_active_runs = json_payload["max_active_runs"]
+        context["max_active_runs"] = json_payload["max_active_runs"]
     except KeyError:
-        max_active_runs = 1
+        context["max_active_runs"] = 1
 
     # Extract task_concurrency
     #
-    task_concurrency = None
     try:
-        task_concurrency = json_payload["task_concurrency"]
+        context["task_concurrency"] = json_payload["task_concurrency"]
     except KeyError:
-        task_concurrency = 5
+        context["task_concurrency"] = 5
 
     # Extract catchup
     #
-    catchup = False
+    context["catchup"] = False
     try:
-        catchup = json_payload["catchup"]
+        context["catchup"] = json_payload["catchup"]
     except KeyError:
         print("Global parameter \"catchup\" not found. Setting to default : False")
 
+    # Extract lean_dag : documentations and SQL are not embedded in the DAG file
+    #
+    try:
+        context["lean_dag"] = json_payload["lean_dag"]
+    except KeyError:
+        context["lean_dag"] = False
 
     # Extract various default values
     #
@@ -1482,11 +475,12 @@ def build_python_script(configuration_file, arguments=None, run_locally=False):
 
     # Extract task dependencies, this should use the Airflow syntax : t1>>t2>>[t31,t32]>>t4
     #
-    dag_task_dependencies = json_payload["task_dependencies"]
+    context["task_dependencies"] = json_payload["task_dependencies"]
 
     # Check that all task declared in "task_dependencies" are properly described in "workflow".
     #
-    if check_task_dependencies_vs_workflow(task_dependencies=dag_task_dependencies, workflow=json_payload["workflow"]) is False:
+    context["graph"] = check_task_dependencies_vs_workflow(task_dependencies=context["task_dependencies"], workflow=json_payload["workflow"])
+    if context["graph"] is None:
         return False
 
     # Check that all task IDs are formed properly
@@ -1494,279 +488,308 @@ def build_python_script(configuration_file, arguments=None, run_locally=False):
     if check_task_id_naming(workflow=json_payload["workflow"]) is False:
         return False
 
-    # Start building the payload
-    # build the header
+    # Load all the tasks
     #
-    output_payload = build_header()
-    if run_locally is False:
-        output_payload += build_header_full(dag_name, dag_start_date)
+    context["tasks"] = []
 
-    # Add the different functions needed
-    #
-    # if run_locally is False:
-    output_payload += build_functions(dag_name, environment)
+    for item in json_payload["workflow"]:
 
-    # Main code
-    #
+        # Retrieve the task type
+        #
+        task_type = None
+        try:
+            task_type = item['task_type'].strip()
+        except Exception:
+            print("Could not retrieve task type for task id : " +
+                  item['id'] + ". This task will be considered as SQL query task.")
 
-    # Check for Schedule Interval
-    #
-    if json_payload["schedule_interval"] == "None":
-        dag_schedule_interval = "None"
-    else:
-        dag_schedule_interval = "\"" + json_payload["schedule_interval"] + "\""
+        if task_type == "copy_gbq_table":
+            task = load_copy_bq_table_task(item, default_gcp_project_id, default_bq_dataset)
+
+        elif task_type == "create_gbq_table":
+            task = load_create_bq_table_task(item, default_gcp_project_id, default_bq_dataset)
+
+        elif task_type == "vm_launcher":
+            task = load_vm_launcher_task(item, default_gcp_project_id)
+
+        else:
+            task_type = "sql"
+            task = load_sql_task(item, default_gcp_project_id, default_bq_dataset, default_write_disposition)
+
+        if task is False:
+            return False
+
+        task["id"] = item["id"]
+        task["task_type"] = task_type
+
+        # Retrieve short description
+        #
+        try:
+            task["short_description"] = item['short_description'].strip()
+        except KeyError:
+            task["short_description"] = None
+
+        # Retrieve Markdown documentation
+        #
+        task["doc_md"] = None
+        try:
+            with open("./" + item["doc_md"], 'r') as file:
+                task["doc_md"] = file.read()
+        except KeyError:
+            print("No Markdown documentation provided for task : {}".format(item["id"]))
+        except Exception as error:
+            print("Error while attempting to read Markdown doc : {}. Check your MD file. Continue.".format(error))
 
-    if run_locally is False:
-        output_payload += """
-with airflow.DAG(
-    _dag_name,
-    default_args=default_args,
-    concurrency=""" + str(task_concurrency) + """,
-    max_active_runs=""" + str(max_active_runs) + """,
-    schedule_interval = """ + dag_schedule_interval + """,
-    catchup = """ + str(catchup) + """,
-    description = \"""" + dag_description + """\") as dag:"""
+        context["tasks"].append(task)
 
-        output_payload += """
-    dag.doc_md = \"\"\"""" + dag_doc + """\"\"\"
+    return context
 
-    # Create all the task that will execute SQL queries
+
+def parse_execution_date(value):
+
+    # Execution date, Airflow "ds" format : YYYY-MM-DD
     #
-"""
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError("\"{}\" is not a valid date, expected format : YYYY-MM-DD".format(value))
 
-    # In the case we run locally and the user asked for specific tasks,
-    # we need to filter out which task to process
+
+def parse_positive_integer(value):
+
+    # Numbers of tasks or jobs : 0 would never run anything
     #
-    # First, we make a copy of the original tasks
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("\"{}\" is not an integer".format(value))
+
+    if number < 1:
+        raise argparse.ArgumentTypeError("\"{}\" must be 1 or more".format(value))
+
+    return number
+
+
+def parse_date_range(value):
+
+    # START:END, both included : returns the list of execution dates
     #
-    tasks_to_process = copy.deepcopy(json_payload["workflow"])
+    try:
+        start, end = value.split(":")
+    except ValueError:
+        raise argparse.ArgumentTypeError("\"{}\" is not a valid date range, expected format : YYYY-MM-DD:YYYY-MM-DD".format(value))
 
-    if (run_locally is True) and (len(local_tasks) > 0):
+    start = datetime.datetime.strptime(parse_execution_date(start), "%Y-%m-%d").date()
+    end = datetime.datetime.strptime(parse_execution_date(end), "%Y-%m-%d").date()
 
-        tmp_tasks_to_process = []
+    if end < start:
+        raise argparse.ArgumentTypeError("the end of the date range \"{}\" is before its start".format(value))
 
-        for task_requested in local_tasks:
-            
-            print("Looking for task : {}".format(task_requested))
+    return [(start + datetime.timedelta(days=day)).isoformat() for day in range(0, (end - start).days + 1)]
 
-            found = False
 
-            for item in tasks_to_process:
+def parse_local_run_arguments(arguments):
 
-                if item["id"].strip() == task_requested:
+    # arguments : run CONFIGURATION.json [options] [task_1 ... task_N]
+    #
+    parser = argparse.ArgumentParser(prog="jarvis configuration run", description="Run a TTT configuration locally.")
+    parser.add_argument("configuration_file", help="TTT configuration file.")
+    parser.add_argument("tasks", nargs="*", help="Tasks to run, glob patterns are accepted, i.e. \"load_*\". All the tasks of the workflow by default.")
+    parser.add_argument("--from", dest="from_tasks", action="append", default=[], metavar="TASK", help="Run TASK and all its downstream tasks. Combined with --to, only the tasks in between.")
+    parser.add_argument("--to", dest="to_tasks", action="append", default=[], metavar="TASK", help="Run TASK and all its upstream tasks. Combined with --from, only the tasks in between.")
+    parser.add_argument("--upstream-of", dest="upstream_of", action="append", default=[], metavar="TASK", help="Run all the upstream tasks of TASK, without TASK.")
+    parser.add_argument("--downstream-of", dest="downstream_of", action="append", default=[], metavar="TASK", help="Run all the downstream tasks of TASK, without TASK.")
+    parser.add_argument("--parallel", type=parse_positive_integer, default=1, help="Number of tasks executed at the same time, 1 by default.")
+    parser.add_argument("--max-bq-jobs", type=parse_positive_integer, default=None, help="Maximum number of BigQuery jobs running at the same time, no limit other than --parallel by default.")
 
-                    tmp_tasks_to_process.append(copy.deepcopy(item))
-                    found = True
-                    break
+    dates = parser.add_mutually_exclusive_group()
+    dates.add_argument("--ds", type=parse_execution_date, default=None, help="Execution date YYYY-MM-DD, today by default.")
+    dates.add_argument("--backfill", type=parse_date_range, default=None, metavar="START:END", help="Run the workflow for every execution date from START to END included, i.e. 2020-01-01:2020-01-31. The dates are run concurrently within the --parallel limit.")
+    parser.add_argument("--incremental", action="store_true", help="Only run the tasks whose SQL, parameters or upstream tasks changed since their last successful run for this execution date.")
+    parser.add_argument("--resume", action="store_true", help="Resume the last run from its failure point, with its tasks and execution date. Tasks already completed are skipped.")
 
-            # No match found
-            #
-            if found is False:
-                print("\nThe task \"{}\" that you've requested does not exist in the configuration workflow. Please check and retry.\n".format(task_requested))
-                return
+    try:
+        return parser.parse_intermixed_args(arguments[1:])
+    except SystemExit:
+        return None
 
-        # Finally overwrite the tasks to process
-        #
-        tasks_to_process = copy.deepcopy(tmp_tasks_to_process)
 
-    # Process all the tasks
+def parse_plan_arguments(arguments):
+
+    # arguments : plan CONFIGURATION.json [options]
     #
-    for item in json_payload["workflow"]:
+    # The planner loads the BigQuery client library : it is only imported by the commands using it
     #
-    #for item in tasks_to_process:
+    from jarvis_sdk import sql_dag_planner
 
-        generated_code = ""
+    parser = argparse.ArgumentParser(prog="jarvis configuration plan", description="Estimate the cost of a TTT configuration with BigQuery dry-runs.")
+    parser.add_argument("configuration_file", help="TTT configuration file.")
+    parser.add_argument("--parallel", type=parse_positive_integer, default=8, help="Number of dry-runs submitted at the same time, 8 by default.")
+    parser.add_argument("--max-bytes", type=sql_dag_planner.parse_bytes, default=None, help="Budget of bytes processed by the whole workflow, i.e. : 500GB. The plan fails if it is exceeded.")
+    parser.add_argument("--ds", type=parse_execution_date, default=None, help="Execution date YYYY-MM-DD, today by default.")
 
-        # Retrieve the task type
-        #
-        task_type = None
-        try:
-            task_type = item['task_type'].strip()
-        except Exception:
-            print("Could not retrieve task type for task id : " +
-                  item['id'] + ". This task will be considered as SQL query task.")
+    try:
+        plan_arguments = parser.parse_args(arguments[1:])
+    except SystemExit:
+        return None
 
-        if task_type == "copy_gbq_table":
-            generated_code = build_copy_bq_table_task(
-                item, default_gcp_project_id, default_bq_dataset, run_locally=run_locally, task_id=item['id'])
+    # The default execution date is the day the plan is computed
+    #
+    if plan_arguments.ds is None:
+        plan_arguments.ds = datetime.date.today().isoformat()
 
-        elif task_type == "create_gbq_table":
-            generated_code = build_create_bq_table_task(
-                item, default_gcp_project_id, default_bq_dataset, global_path, run_locally=run_locally, task_id=item['id'])
+    return plan_arguments
 
-            if generated_code is False:
-                return False
 
-        elif task_type == "vm_launcher":
-            generated_code = build_vm_launcher_task(item, default_gcp_project_id, run_locally=run_locally, task_id=item['id'])
+def resolve_task_patterns(context, patterns):
 
-        else:
-            generated_code = build_sql_task(
-                item, environment, default_gcp_project_id, default_bq_dataset, default_write_disposition, global_path, run_locally=run_locally, task_id=item['id'])
+    # Returns the list of task IDs matching the patterns, None if a pattern does not match anything
+    #
+    task_ids = []
+    for pattern in patterns:
+
+        pattern = pattern.strip()
+        matching_tasks = sql_dag_graph.match_tasks(context["graph"], pattern)
 
-        # # Add the result to the main payload
-        # #
-        # if run_locally is True:
-            
-        #     output_payload += """    logging.info("\\n\\nExecuting task with id : {}\\n".format(\"""" + item["id"] + """\"))\n\n"""
+        if len(matching_tasks) == 0:
+            print("\nThe task \"{}\" that you've requested does not exist in the configuration workflow. Please check and retry.\n".format(pattern))
+            return None
 
-        output_payload += generated_code + "\n"
+        task_ids.extend(matching_tasks)
 
+    return task_ids
 
-    # Add "main" for local execution
+
+def select_local_tasks(context, tasks_requested=None, from_tasks=None, to_tasks=None, upstream_of=None, downstream_of=None):
+
+    # The user can ask for specific tasks : jarvis configuration run CONF.json task_1 ... task_N
+    # or for parts of the graph : --from, --to, --upstream-of, --downstream-of
+    # The selected tasks are the union of all the selectors
     #
-    if run_locally is True:
+    graph = context["graph"]
+    selectors = [tasks_requested, from_tasks, to_tasks, upstream_of, downstream_of]
+    selectors = [[] if selector is None else selector for selector in selectors]
 
-        output_payload += """if __name__ == \"__main__\":
+    if sum(len(selector) for selector in selectors) == 0:
+        return list(graph["order"])
 
-    root = logging.getLogger()
-    root.setLevel(logging.INFO)
+    resolved = []
+    for selector in selectors:
+        task_ids = resolve_task_patterns(context, selector)
+        if task_ids is None:
+            return None
+        resolved.append(task_ids)
 
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    root.addHandler(handler)
+    tasks_requested, from_tasks, to_tasks, upstream_of, downstream_of = resolved
 
-    warnings.filterwarnings("ignore", "Your application has authenticated using end user credentials")
-    
-"""
+    local_tasks = set(tasks_requested)
 
-    # Local execution
-    # Add "tasks to process" only to the "main"
+    # --from A --to B : tasks between A and B
     #
-    if run_locally is True:
+    if (len(from_tasks) > 0) and (len(to_tasks) > 0):
+        local_tasks |= sql_dag_graph.walk_graph(graph, from_tasks, "downstream") & sql_dag_graph.walk_graph(graph, to_tasks, "upstream")
+    elif len(from_tasks) > 0:
+        local_tasks |= sql_dag_graph.walk_graph(graph, from_tasks, "downstream")
+    elif len(to_tasks) > 0:
+        local_tasks |= sql_dag_graph.walk_graph(graph, to_tasks, "upstream")
 
-        for task in tasks_to_process:
+    if len(upstream_of) > 0:
+        local_tasks |= sql_dag_graph.walk_graph(graph, upstream_of, "upstream", include_start=False)
 
-            output_payload += """    """ + task["id"] + """()\n"""
+    if len(downstream_of) > 0:
+        local_tasks |= sql_dag_graph.walk_graph(graph, downstream_of, "downstream", include_start=False)
 
-
-    # Add "initialize" function
-    # Add PubSub logging
+    # Tasks are executed in dependency order
     #
-    if run_locally is False:
-        output_payload += build_complementary_code()
+    local_tasks = sql_dag_graph.sort_tasks(graph, local_tasks)
+
+    print("Selected tasks : {}".format(", ".join(local_tasks) if len(local_tasks) > 0 else "none"))
 
-    # Add task dependencies
+    return local_tasks
+
+
+def build_python_script(context, local_tasks=None, run_locally=False):
+
+    # Infos
     #
-    if run_locally is False:
-        output_payload += """
-    # Task dependencies
+    print("Generating and deploying DAG ...")
+
+    # Check for Schedule Interval
     #
-    send_dag_infos_to_pubsub_start >> initialize >> send_dag_infos_to_pubsub_after_config
-    initialize >> send_dag_infos_to_pubsub_deactivated
-"""
-    if run_locally is False:
-        if len(dag_task_dependencies) > 0:
-            for index in range(0, len(dag_task_dependencies)):
-                output_payload += "    " + dag_task_dependencies[index] + "\n"
+    if context["schedule_interval"] == "None":
+        dag_schedule_interval = None
+    else:
+        dag_schedule_interval = context["schedule_interval"]
 
-    # Add the task "send_dag_infos_to_pubsub" as the last task
+    # Local execution
+    # By default, all the tasks are processed in dependency order
     #
-    if run_locally is False:
-        for item in json_payload["workflow"]:
-            output_payload += """    """ + \
-                item["id"] + """ << send_dag_infos_to_pubsub_after_config\n\r"""
-            output_payload += """    """ + \
-                item["id"] + """ >> send_dag_infos_to_pubsub\n\r"""
-            output_payload += """    """ + \
-                item["id"] + """ >> send_dag_infos_to_pubsub_failed\n\r"""
+    if local_tasks is None:
+        local_tasks = list(context["graph"]["order"])
 
-    return output_payload, json_payload, dag_name, environment
+    template_name = "local_script.py.j2" if run_locally is True else "dag.py.j2"
 
+    return sql_dag_templates.render(
+        template_name,
+        dag_name=context["dag_name"],
+        environment=context["environment"],
+        generator_version=_current_version,
+        dag_start_date=context["dag_start_date"],
+        dag_description=context["dag_description"],
+        dag_doc=context["dag_doc"],
+        task_concurrency=context["task_concurrency"],
+        max_active_runs=context["max_active_runs"],
+        schedule_interval=dag_schedule_interval,
+        catchup=context["catchup"],
+        dependency_edges=sql_dag_graph.build_dependency_edges(context["graph"]),
+        dag_tasks=context["graph"]["order"],
+        task_upstream=sql_dag_graph.get_upstream_map(context["graph"]),
+        tasks_list=context["tasks"],
+        local_tasks=local_tasks,
+        lean_dag=context["lean_dag"])
 
-def process(configuration_file, run_locally=False, arguments=None, jarvis_sdk_version=None):
 
-    # Force local generation
-    #
-    output_payload_forced, json_payload, dag_name, environment = build_python_script(configuration_file, arguments=None, run_locally=True)
+def build_deploy_data(context, jarvis_sdk_version=None):
 
-    # Generate python script
+    # Build the data sent to the API from the already loaded workflow context
+    # The source configuration is copied so that the context is left untouched
     #
-    output_payload, json_payload, dag_name, environment = build_python_script(configuration_file, arguments=arguments, run_locally=run_locally)
-
-    # collection = "gbq-to-gbq-conf"
-    # doc_id = dag_name
+    configuration = dict(context["configuration"])
+    configuration["workflow"] = [dict(item) for item in configuration["workflow"]]
 
     data = {}
     sql_data = {}
     short_description_data = {}
     doc_md_data = {}
 
-    index = 0
-    for item in json_payload["workflow"]:
+    for index, task in enumerate(context["tasks"]):
 
         # Info
-        print("Processing task : " + item["id"])
-
-        # Retrieve the task type
-        #
-        task_type = None
-        try:
-            task_type = item['task_type'].strip()
-        except Exception:
-            print("Could not retrieve task type for task id : " +
-                    item['id'] + ". This task will be considered as SQL query task.")
+        print("Processing task : " + task["id"])
 
-        # retrieve short description
+        # Short description
         #
-        short_description = ""
-        try:
-            short_description = item['short_description'].strip()
-            short_description_data[item["id"]] = short_description
-        except KeyError:
-            print("No short description found. Continue ...")
+        if task["short_description"] is not None:
+            short_description_data[task["id"]] = task["short_description"]
 
-        # retrieve Markdown documentation
+        # Markdown documentation
+        # Overwrite in the source configuration
         #
-        try:
-            with open("./" + item["doc_md"], 'r') as file:
-                doc_md = file.read()
-                doc_md_data[item["id"]] = doc_md
-
-                # Overwrite in the source configuration
-                # )
-                json_payload["workflow"][index]['doc_md'] = doc_md
-
-        except KeyError:
-            print("No Markdown documentation to process. Continue.")
-        except Exception as error:
-            print(
-                "Error while attempting to read Markdown doc : {}. Check your MD file. Continue.".format(error))
+        if task["doc_md"] is not None:
+            doc_md_data[task["id"]] = task["doc_md"]
+            configuration["workflow"][index]['doc_md'] = task["doc_md"]
 
-        # Specific processing depending of the task type
+        # Specific processing for SQL query
         #
-        if task_type == "copy_gbq_table":
-            print("")
-        elif task_type == "create_gbq_table":
-            print("")
-        elif task_type == "vm_launcher":
-            print("")
-        else:
+        if task["task_type"] == "sql":
 
-            # SQL query
-            #
-            with open("./" + item["sql_file"], 'r') as file:
-                temp = file.read()
-                sql_data[item["id"]] = base64.b64encode(
-                    bytes(temp, 'utf-8'))
+            sql_data[task["id"]] = base64.b64encode(bytes(task["sql"], 'utf-8'))
 
             # Retrieve temporary_table flag
+            # If not set, we set the flag to False and save it back to the main payload
             #
-            try:
-                temporary_table = item["temporary_table"]
-                # Everything is fine
-
-            except KeyError:
-
-                # We set the flag to False and save it back to the main payload
-                #
-                json_payload["workflow"][index]['temporary_table'] = False
-
-
-        index += 1
-    # END FOR
+            if "temporary_table" not in configuration["workflow"][index]:
+                configuration["workflow"][index]['temporary_table'] = False
 
     # Add SQL data
     data["sql"] = sql_data
@@ -1778,57 +801,270 @@ def process(configuration_file, run_locally=False, arguments=None, jarvis_sdk_ve
     data['docs_md'] = doc_md_data
 
     # Add account
-    data['account'] = json_payload['account']
+    data['account'] = configuration['account']
 
     # Add environment
-    data['environment'] = environment
+    data['environment'] = context["environment"]
+
+    # Lean DAG : the DAG documentation is read from the stored configuration
+    if context["lean_dag"] is True:
+        data['dag_doc_md'] = context["dag_doc"]
 
     # Let's add the whole configuration file as well
     #
-    data["configuration"] = json_payload
+    data["configuration"] = configuration
 
     # Add info for regular processing by the API
     #
     data["configuration_type"] = "gbq-to-gbq"
-    data["configuration_id"] = dag_name
+    data["configuration_id"] = context["dag_name"]
     data["client_type"] = "jarvis-sdk"
     data["client_version"] = jarvis_sdk_version
 
+    return data
+
+
+def encode_payload(payload):
+
+    pickled_payload = pickle.dumps(payload)
+    return str(base64.b64encode(pickled_payload), "utf-8")
+
+
+def build_deploy_artifacts(context, jarvis_sdk_version=None):
+
+    # Generate python script : the DAG and the full local script
+    # Process data, payload and LOCAL payload for the API
+    #
+    output_payload = build_python_script(context, run_locally=False)
+    output_payload_forced = build_python_script(context, run_locally=True)
+
+    data = build_deploy_data(context, jarvis_sdk_version=jarvis_sdk_version)
+
+    return {
+        "resource": encode_payload(data),
+        "dag_file": encode_payload(output_payload),
+        "python_script": encode_payload(output_payload_forced)
+    }
+
+
+def get_deploy_artifacts(context, jarvis_sdk_version=None):
+
+    # Unchanged configurations are served from the generation cache
+    #
+    cache_key = sql_dag_cache.compute_cache_key(context, _current_version, jarvis_sdk_version=jarvis_sdk_version)
+
+    artifacts = sql_dag_cache.load_artifacts(cache_key)
+    if artifacts is not None:
+        print("Configuration unchanged, using the generated DAG from the cache.")
+        return artifacts
+
+    artifacts = build_deploy_artifacts(context, jarvis_sdk_version=jarvis_sdk_version)
+    sql_dag_cache.save_artifacts(cache_key, artifacts)
+
+    return artifacts
+
+
+def run_local_workflow(context, local_tasks, parallel=1, dates=None, incremental=False, resume=False):
+
+    # Run the tasks in this process, directly from the workflow context, for every execution date
+    # Every log line is prefixed with the ID of the task that produced it
+    #
+    from jarvis_sdk import sql_dag_runtime
+
+    tasks = {task["id"]: task for task in context["tasks"]}
+    graph = context["graph"]
+
+    # Every successful task is recorded in the run state, whatever the mode
+    #
+    store = sql_dag_state.load_run_state(context["dag_name"])
+
+    if resume is True:
+
+        try:
+            checkpoint = store["data"]["checkpoint"]
+        except KeyError:
+            print("There is no previous run to resume.\n")
+            return 1
+
+        if checkpoint["status"] == "success":
+            print("The last run succeeded, there is nothing to resume.\n")
+            return 0
+
+        dates = sorted(checkpoint["dates"].keys())
+        fingerprints = {ds: sql_dag_state.compute_fingerprints(context, ds) for ds in dates}
+        tasks_per_date = sql_dag_state.get_resumable_tasks(context, store, fingerprints)
+
+        total = sum(len(item["tasks"]) for item in checkpoint["dates"].values())
+        remaining = sum(len(task_ids) for task_ids in tasks_per_date.values())
+        print("Resuming the run started at {} : {} task(s) completed, {} task(s) to run.\n".format(checkpoint["start"], total - remaining, remaining))
+
+    else:
+        fingerprints = {ds: sql_dag_state.compute_fingerprints(context, ds) for ds in dates}
+        tasks_per_date = {ds: list(local_tasks) for ds in dates}
+
+    if incremental is True:
+
+        up_to_date = 0
+        for ds in dates:
+            outdated = sql_dag_state.get_outdated_tasks(context, store, ds, fingerprints[ds])
+            up_to_date += len([task_id for task_id in tasks_per_date[ds] if task_id not in outdated])
+            tasks_per_date[ds] = [task_id for task_id in tasks_per_date[ds] if task_id in outdated]
+
+        print("Incremental run : {} task(s) up to date, {} task(s) to run.\n".format(up_to_date, sum(len(task_ids) for task_ids in tasks_per_date.values())))
+
+    if resume is True:
+        sql_dag_state.resume_checkpoint(store)
+    else:
+        sql_dag_state.start_checkpoint(store, tasks_per_date)
+
+    # One node (ds, task_id) per task and execution date, the dependencies apply within each date
+    #
+    nodes = [(ds, task_id) for ds in dates for task_id in graph["order"]]
+    selected = set((ds, task_id) for ds in dates for task_id in tasks_per_date[ds])
+
+    if len(selected) == 0:
+        sql_dag_state.finish_checkpoint(store, "success")
+        return 0
+
+    upstream_map = sql_dag_graph.get_upstream_map(graph)
+    upstream = {(ds, task_id): [(ds, upstream_task) for upstream_task in upstream_map[task_id]] for ds, task_id in nodes}
+
+    # The tables of a backfill are created, rebuilt or dropped once, by the first execution date :
+    # the other dates wait for it and only delete their own partition
+    #
+    for ds in dates[1:]:
+        for task_id in graph["order"]:
+            if tasks[task_id]["task_type"] == "create_gbq_table":
+                upstream[(ds, task_id)].append((dates[0], task_id))
+
+    if len(dates) == 1:
+        label = lambda node: node[1]
+    else:
+        label = lambda node: "{}@{}".format(node[1], node[0])
+
+    def execute_task(node):
+
+        ds, task_id = node
+        status = sql_dag_runtime.execute_task(tasks[task_id], ds=ds, create_table=(ds == dates[0]))
+        sql_dag_state.record_task_run(store, ds, task_id, fingerprints[ds][task_id], status)
+        return status
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(asctime)s [%(threadName)s] %(levelname)s - %(message)s'))
+    root.addHandler(handler)
+
+    try:
+        success, results = sql_dag_scheduler.run_tasks(nodes,
+                                                       upstream,
+                                                       execute_task,
+                                                       parallel=parallel,
+                                                       selected=selected,
+                                                       label=label)
+    finally:
+        root.removeHandler(handler)
+
+    sql_dag_scheduler.print_timing_table(nodes, results, label=label)
+
+    sql_dag_state.finish_checkpoint(store, "success" if success is True else "failed")
+
+    if success is False:
+        print("The local run failed. Run it again with --resume to continue from the failure point.\n")
+        return 1
+
+    return 0
+
+
+def process_plan(configuration_file, arguments=None):
+
+    # jarvis configuration plan CONFIGURATION.json [--parallel N] [--max-bytes B] [--ds YYYY-MM-DD]
+    #
+    plan_arguments = parse_plan_arguments(arguments)
+    if plan_arguments is None:
+        return 1
+
+    context = load_configuration(configuration_file)
+    if context is False:
+        return 1
+
+    from jarvis_sdk import sql_dag_planner
+
+    print("\nSubmitting dry-run queries ...")
+    plan = sql_dag_planner.plan_workflow(context, plan_arguments.ds, parallel=plan_arguments.parallel)
+    sql_dag_planner.print_plan(plan, max_bytes=plan_arguments.max_bytes)
+
+    if plan["errors"] > 0:
+        return 1
+
+    if (plan_arguments.max_bytes is not None) and (plan["total_bytes"] > plan_arguments.max_bytes):
+        return 1
+
+    return 0
+
+
+def process(configuration_file, run_locally=False, arguments=None, jarvis_sdk_version=None):
+
+    # Local run options
+    #
+    if run_locally is True:
+        run_arguments = parse_local_run_arguments(arguments)
+        if run_arguments is None:
+            return False
+
+    # Parse the configuration and load all the referenced files, once
+    #
+    context = load_configuration(configuration_file)
+    if context is False:
+        return False
+
+    dag_name = context["dag_name"]
+
     # Process the "run locally" option
     #
     if run_locally is True:
 
-        # Run locally
+        # When resuming, the tasks and the execution date come from the checkpoint
         #
-        with tempfile.TemporaryDirectory() as tmpdirname:
-
-            print(tmpdirname)
+        selectors = [run_arguments.tasks, run_arguments.from_tasks, run_arguments.to_tasks, run_arguments.upstream_of, run_arguments.downstream_of]
 
-            tmp_file_path = tmpdirname + dag_name + ".py"
+        if (run_arguments.resume is True) and ((sum(len(selector) for selector in selectors) > 0) or (run_arguments.ds is not None) or (run_arguments.backfill is not None)):
+            print("\nTasks, --ds and --backfill cannot be given with --resume : the ones of the last run are used.\n")
+            return False
 
-            with open(tmp_file_path, "w") as outfile:
-            
-                outfile.write(output_payload_forced)
+        local_tasks = select_local_tasks(context,
+                                         tasks_requested=run_arguments.tasks,
+                                         from_tasks=run_arguments.from_tasks,
+                                         to_tasks=run_arguments.to_tasks,
+                                         upstream_of=run_arguments.upstream_of,
+                                         downstream_of=run_arguments.downstream_of)
+        if local_tasks is None:
+            return False
 
-                print("\n\nThe TTT configuration will now run locally...\n\n")
+        if run_arguments.backfill is not None:
+            dates = run_arguments.backfill
+        elif run_arguments.ds is not None:
+            dates = [run_arguments.ds]
+        else:
+            dates = [datetime.date.today().isoformat()]
 
-                # Python executable used here
-                #
-                python_executable = sys.executable
-                print("Python executable used : {}\n".format(python_executable))
+        from jarvis_sdk import sql_dag_runtime
 
-                # Execute the file
-                #
-                command = python_executable + " " + tmp_file_path
-                p = Popen(command, shell=True, stdin=PIPE, stdout=PIPE, stderr=STDOUT, close_fds=True, text=True)
+        sql_dag_runtime.set_max_concurrent_jobs(run_arguments.max_bq_jobs)
 
-                # Get the logs
-                #
-                for line in p.stdout.readlines():
-                    print(line, end="")
+        print("\n\nThe TTT configuration will now run locally...\n\n")
 
+        return run_local_workflow(context,
+                                  local_tasks,
+                                  parallel=run_arguments.parallel,
+                                  dates=dates,
+                                  incremental=run_arguments.incremental,
+                                  resume=run_arguments.resume)
 
-        return
+    # The DAG, the full local script and the data for the API
+    #
+    artifacts = get_deploy_artifacts(context, jarvis_sdk_version=jarvis_sdk_version)
 
     #######################
     # Prepare call to API #
@@ -1905,24 +1141,6 @@ def process(configuration_file, run_locally=False, arguments=None, jarvis_sdk_ve
         return False
 
 
-    # Process data
-    #
-    pickled_data = pickle.dumps(data)
-    encoded = base64.b64encode(pickled_data) 
-    encoded = str(encoded, "utf-8")
-
-    # Process payload
-    #
-    pickled_payload = pickle.dumps(output_payload)
-    encoded_payload = base64.b64encode(pickled_payload)
-    encoded_payload = str(encoded_payload, "utf-8")
-
-    # Process LOCAL payload
-    #
-    pickled_payload = pickle.dumps(output_payload_forced)
-    encoded_payload_forced = base64.b64encode(pickled_payload)
-    encoded_payload_forced = str(encoded_payload_forced, "utf-8")
-
     # Call API
     #
     try:
@@ -1932,14 +1150,14 @@ def process(configuration_file, run_locally=False, arguments=None, jarvis_sdk_ve
         url = jarvis_configuration["jarvis_api_endpoint"] + "dag-generator-v2"
         payload = {
             "payload": {
-                "resource": encoded,
+                "resource": artifacts["resource"],
                 "dag_file" : {
                     "name" : dag_name + ".py",
-                    "data" : encoded_payload
+                    "data" : artifacts["dag_file"]
                 },
                 "python_script" : {
                     "name" : dag_name + ".py",
-                    "data" : encoded_payload_forced
+                    "data" : artifacts["python_script"]
                 },
                 "project_profile": project_profile,
                 "uid": firebase_user["userId"],
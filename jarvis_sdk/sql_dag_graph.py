@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+
+"""Dependency graph of a TTT workflow.
+
+"task_dependencies" use the Airflow syntax : t1 >> t2 >> [t31, t32] >> t4, t4 << t3
+They are parsed into adjacency lists indexed by the position of the task in the "workflow".
+Validation, cycle detection, topological order and parallel waves are computed in O(V+E),
+each wave being kept in workflow order.
+"""
+
+import re
+import fnmatch
+
+
+# Globals
+#
+_token_pattern = re.compile(r"\s*(?:(>>|<<)|(\[)|(\])|(,)|([A-Za-z0-9_]+)|(\S))")
+
+
+def tokenize_dependency(line):
+
+    # Returns a list of tuples (kind, value)
+    # kind : "op", "[", "]", ",", "id" or "invalid"
+    #
+    tokens = []
+
+    for match in _token_pattern.finditer(line):
+
+        operator, open_bracket, close_bracket, comma, identifier, invalid = match.groups()
+
+        if operator is not None:
+            tokens.append(("op", operator))
+        elif open_bracket is not None:
+            tokens.append(("[", open_bracket))
+        elif close_bracket is not None:
+            tokens.append(("]", close_bracket))
+        elif comma is not None:
+            tokens.append((",", comma))
+        elif identifier is not None:
+            tokens.append(("id", identifier))
+        elif invalid is not None:
+            tokens.append(("invalid", invalid))
+
+    return tokens
+
+
+def parse_dependency(line):
+
+    # Parse one Airflow dependency expression.
+    # Returns (operands, operators, error) where each operand is a list of task IDs.
+    #
+    tokens = tokenize_dependency(line)
+    operands = []
+    operators = []
+    position = 0
+
+    def parse_operand(position):
+
+        if position >= len(tokens):
+            return None, position, "a task ID or a list is expected at the end of the expression"
+
+        kind, value = tokens[position]
+
+        if kind == "id":
+            return [value], position + 1, None
+
+        if kind != "[":
+            return None, position, "unexpected \"{}\"".format(value)
+
+        # List of tasks : [t1, t2, ...]
+        #
+        operand = []
+        position += 1
+        while True:
+
+            if position >= len(tokens):
+                return None, position, "missing \"]\""
+
+            kind, value = tokens[position]
+
+            if kind == "]" and len(operand) > 0:
+                return operand, position + 1, None
+            elif kind != "id":
+                return None, position, "unexpected \"{}\" in list".format(value)
+
+            operand.append(value)
+            position += 1
+
+            if position < len(tokens) and tokens[position][0] == ",":
+                position += 1
+
+    if len(tokens) == 0:
+        return [], [], "empty expression"
+
+    while True:
+
+        operand, position, error = parse_operand(position)
+        if error is not None:
+            return operands, operators, error
+
+        operands.append(operand)
+
+        if position >= len(tokens):
+            break
+
+        kind, value = tokens[position]
+        if kind != "op":
+            return operands, operators, "\">>\" or \"<<\" expected, got \"{}\"".format(value)
+
+        operators.append(value)
+        position += 1
+
+    return operands, operators, None
+
+
+def build_task_graph(task_dependencies, task_ids):
+
+    # Build the graph and report every problem found in a single pass
+    #
+    graph = {
+        "tasks": list(task_ids),
+        "index": {},
+        "upstream": [[] for _ in task_ids],
+        "downstream": [[] for _ in task_ids],
+        "waves": [],
+        "order": [],
+        "errors": []
+    }
+
+    index = graph["index"]
+    errors = graph["errors"]
+
+    for position, task_id in enumerate(task_ids):
+        if task_id in index:
+            errors.append("the task ID \"{}\" is declared more than once in \"workflow\".".format(task_id))
+        else:
+            index[task_id] = position
+
+    edges = {}
+    unknown_tasks = set()
+
+    for line in task_dependencies:
+
+        operands, operators, error = parse_dependency(line)
+        if error is not None:
+            errors.append("cannot parse \"{}\" in \"task_dependencies\" : {}.".format(line, error))
+            continue
+
+        # Check that every task is declared in the workflow
+        #
+        valid = True
+        for operand in operands:
+            for task_id in operand:
+                if task_id not in index:
+                    valid = False
+                    if task_id not in unknown_tasks:
+                        unknown_tasks.add(task_id)
+                        errors.append("the task with ID \"{}\" is present in \"task_dependencies\" but not in \"workflow\".".format(task_id))
+
+        if valid is False:
+            continue
+
+        # Create the edges
+        #
+        for position, operator in enumerate(operators):
+
+            left = operands[position]
+            right = operands[position + 1]
+
+            if len(left) > 1 and len(right) > 1:
+                errors.append("cannot parse \"{}\" in \"task_dependencies\" : Airflow does not support dependencies between two lists.".format(line))
+                break
+
+            if operator == "<<":
+                left, right = right, left
+
+            for upstream in left:
+                for downstream in right:
+                    edges[(index[upstream], index[downstream])] = None
+
+    for upstream, downstream in edges:
+        graph["downstream"][upstream].append(downstream)
+        graph["upstream"][downstream].append(upstream)
+
+    # Compute the parallel waves (Kahn's algorithm, layer by layer)
+    #
+    in_degree = [len(upstream) for upstream in graph["upstream"]]
+    wave = [position for position in range(0, len(task_ids)) if in_degree[position] == 0]
+
+    while len(wave) > 0:
+
+        graph["waves"].append([graph["tasks"][position] for position in wave])
+        graph["order"].extend(graph["waves"][-1])
+
+        next_wave = []
+        for position in wave:
+            for downstream in graph["downstream"][position]:
+                in_degree[downstream] -= 1
+                if in_degree[downstream] == 0:
+                    next_wave.append(downstream)
+
+        wave = sorted(next_wave)
+
+    # Tasks left with upstream tasks are part of a cycle or depend on one
+    #
+    if len(graph["order"]) < len(task_ids):
+        blocked = [graph["tasks"][position] for position in range(0, len(task_ids)) if in_degree[position] > 0]
+        errors.append("dependency cycle detected in \"task_dependencies\", these tasks can never run : {}.".format(", ".join(blocked)))
+
+    return graph
+
+
+def get_upstream_tasks(graph, task_id):
+
+    return [graph["tasks"][position] for position in graph["upstream"][graph["index"][task_id]]]
+
+
+def get_downstream_tasks(graph, task_id):
+
+    return [graph["tasks"][position] for position in graph["downstream"][graph["index"][task_id]]]
+
+
+def get_upstream_map(graph):
+
+    # dict : task ID -> list of upstream task IDs
+    #
+    return {task_id: get_upstream_tasks(graph, task_id) for task_id in graph["order"]}
+
+
+def match_tasks(graph, pattern):
+
+    # Task IDs matching a glob pattern, i.e. "load_*", in workflow order
+    #
+    if pattern in graph["index"]:
+        return [pattern]
+
+    return [task_id for task_id in graph["tasks"] if fnmatch.fnmatchcase(task_id, pattern)]
+
+
+def walk_graph(graph, task_ids, direction, include_start=True):
+
+    # All the tasks reachable from task_ids, following "upstream" or "downstream" edges
+    # Every task and edge is visited at most once
+    #
+    edges = graph[direction]
+    visited = [False] * len(graph["tasks"])
+
+    # Without include_start, a start task is only kept if it is reachable from another one
+    #
+    stack = [graph["index"][task_id] for task_id in task_ids]
+    if include_start is True:
+        for position in stack:
+            visited[position] = True
+
+    reached = set(task_ids) if include_start is True else set()
+
+    while len(stack) > 0:
+        for neighbour in edges[stack.pop()]:
+            if visited[neighbour] is False:
+                visited[neighbour] = True
+                reached.add(graph["tasks"][neighbour])
+                stack.append(neighbour)
+
+    return reached
+
+
+def sort_tasks(graph, task_ids):
+
+    # Return the given tasks in topological order
+    #
+    selected = set(task_ids)
+    return [task_id for task_id in graph["order"] if task_id in selected]
+
+
+def build_dependency_edges(graph):
+
+    # One Airflow expression per task having downstream tasks : t1 >> [t2, t3]
+    #
+    output = []
+    for position, downstream in enumerate(graph["downstream"]):
+
+        if len(downstream) == 0:
+            continue
+
+        names = [graph["tasks"][item] for item in downstream]
+        if len(names) == 1:
+            output.append(graph["tasks"][position] + " >> " + names[0])
+        else:
+            output.append(graph["tasks"][position] + " >> [" + ", ".join(names) + "]")
+
+    return output
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""Cost and critical path planner for TTT configurations.
+
+Every SQL task is submitted to BigQuery as a dry-run query : nothing is executed nor billed.
+The statement dry-run is the one the task executes, the MERGE statements of "atomic_truncate" and
+"partition_write" included. The bytes processed are then aggregated per task and per parallel wave,
+and the critical path of the workflow is estimated with the bytes processed as the weight of each task.
+"""
+
+import argparse
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from google.cloud import bigquery
+from google.cloud import exceptions
+
+from jarvis_sdk import sql_dag_bigquery
+from jarvis_sdk import sql_dag_graph
+from jarvis_sdk import sql_dag_runtime
+
+
+# Globals
+#
+_byte_units = {"": 1, "B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4, "PB": 1024 ** 5}
+
+
+def parse_bytes(value):
+
+    # "1000", "500MB", "1.5 TB", ...
+    #
+    match = re.match(r"^\s*([0-9]+(?:\.[0-9]+)?)\s*([A-Za-z]*)\s*$", value)
+    if (match is None) or (match.group(2).upper() not in _byte_units):
+        raise argparse.ArgumentTypeError("\"{}\" is not a valid amount of bytes, i.e. : 500000, 200MB, 1.5TB".format(value))
+
+    return int(float(match.group(1)) * _byte_units[match.group(2).upper()])
+
+
+def format_bytes(value):
+
+    if value is None:
+        return "-"
+
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if value < 1024:
+            return "{:.1f} {}".format(value, unit) if unit != "B" else "{} B".format(value)
+        value /= 1024.0
+
+    return "{:.1f} PB".format(value)
+
+
+def dry_run_query(gbq_client, sql_query):
+
+    # Returns the number of bytes the query would process
+    #
+    job_config = bigquery.QueryJobConfig()
+    job_config.dry_run = True
+    job_config.use_query_cache = False
+
+    query_job = gbq_client.query(sql_query, location="EU", job_config=job_config)
+
+    return query_job.total_bytes_processed
+
+
+def build_task_statement(gbq_client, task, ds):
+
+    # Returns (statement executed by the SQL task, approximate)
+    # The MERGE statements also scan the destination table : they are built from its metadata as the
+    # runtime does. If the table does not exist yet, i.e. created by an upstream task, the query alone
+    # is dry-run and its estimate is approximate.
+    #
+    sql_query = sql_dag_runtime.render_sql_query(task["sql"], task["sql_query_template"], ds)
+
+    partition_write = task["partition_write"]
+    merge = (partition_write is not None) and (partition_write["mode"] == "merge")
+    atomic = (partition_write is None) and (task["atomic_truncate"] is True) and (task["write_disposition"] == "WRITE_TRUNCATE")
+
+    if (merge is False) and (atomic is False):
+        return sql_query, False
+
+    table_ref = gbq_client.dataset(task["bq_dataset"]).table(task["table_name"])
+    try:
+        table = sql_dag_bigquery.get_table_metadata(gbq_client, table_ref)
+    except exceptions.NotFound:
+        return sql_query, merge
+
+    if merge is True:
+        return sql_dag_bigquery.build_partition_merge_query(table, sql_query, partition_write["merge_keys"], ds), False
+
+    return sql_dag_bigquery.build_atomic_truncate_query(table, sql_query), False
+
+
+def plan_workflow(context, ds, parallel=4, get_client=None):
+
+    # get_client : callable(gcp_project_id) returning a BigQuery client, i.e. a fake one for testing
+    #
+    if get_client is None:
+        get_client = sql_dag_runtime.get_bigquery_client
+
+    graph = context["graph"]
+    tasks = {task["id"]: task for task in context["tasks"]}
+
+    plan = {
+        "ds": ds,
+        "tasks": {},
+        "waves": [],
+        "critical_path": [],
+        "critical_path_bytes": 0,
+        "total_bytes": 0,
+        "errors": 0
+    }
+
+    # Submit all the dry-runs in parallel
+    #
+    def dry_run(task):
+
+        gbq_client = get_client(task["gcp_project_id"])
+        sql_query, approximate = build_task_statement(gbq_client, task, ds)
+        return dry_run_query(gbq_client, sql_query), approximate
+
+    sql_tasks = [task_id for task_id in graph["order"] if tasks[task_id]["task_type"] == "sql"]
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+
+        futures = {task_id: executor.submit(dry_run, tasks[task_id]) for task_id in sql_tasks}
+
+        for task_id in graph["order"]:
+
+            entry = {"task_type": tasks[task_id]["task_type"], "bytes": 0, "approximate": False, "error": None}
+
+            if task_id in futures:
+                try:
+                    bytes_processed, entry["approximate"] = futures[task_id].result()
+                    entry["bytes"] = int(bytes_processed or 0)
+                except Exception as ex:
+                    entry["bytes"] = None
+                    entry["error"] = str(ex).splitlines()[0]
+                    plan["errors"] += 1
+
+            plan["tasks"][task_id] = entry
+
+    # Bytes per wave
+    #
+    for wave in graph["waves"]:
+        wave_bytes = sum(plan["tasks"][task_id]["bytes"] or 0 for task_id in wave)
+        plan["waves"].append({"tasks": list(wave), "bytes": wave_bytes})
+        plan["total_bytes"] += wave_bytes
+
+    # Critical path : heaviest chain of tasks, in topological order
+    #
+    path_bytes = {}
+    previous = {}
+    for task_id in graph["order"]:
+
+        heaviest_upstream = None
+        for upstream_task in sql_dag_graph.get_upstream_tasks(graph, task_id):
+            if (heaviest_upstream is None) or (path_bytes[upstream_task] > path_bytes[heaviest_upstream]):
+                heaviest_upstream = upstream_task
+
+        previous[task_id] = heaviest_upstream
+        path_bytes[task_id] = (plan["tasks"][task_id]["bytes"] or 0) + (path_bytes[heaviest_upstream] if heaviest_upstream is not None else 0)
+
+    if len(graph["order"]) > 0:
+
+        task_id = max(graph["order"], key=lambda item: path_bytes[item])
+        plan["critical_path_bytes"] = path_bytes[task_id]
+
+        while task_id is not None:
+            plan["critical_path"].insert(0, task_id)
+            task_id = previous[task_id]
+
+    return plan
+
+
+def print_plan(plan, max_bytes=None):
+
+    print("\nExecution date : {}\n".format(plan["ds"]))
+
+    width = max([len("Task")] + [len(task_id) for task_id in plan["tasks"]])
+
+    print("{}   {:>4}   {:<16}   {:>12}".format("Task".ljust(width), "Wave", "Type", "Bytes"))
+    print("{}   {}   {}   {}".format("-" * width, "-" * 4, "-" * 16, "-" * 12))
+
+    for index, wave in enumerate(plan["waves"]):
+        for task_id in wave["tasks"]:
+            entry = plan["tasks"][task_id]
+            print("{}   {:>4}   {:<16}   {:>12}{}".format(task_id.ljust(width), index + 1, entry["task_type"], format_bytes(entry["bytes"]), " ~" if entry["approximate"] is True else ""))
+
+    if any(entry["approximate"] is True for entry in plan["tasks"].values()):
+        print("\n~ : the destination table does not exist yet, the bytes of the MERGE statement on it are not counted.")
+
+    print("\nBytes processed per wave :")
+    for index, wave in enumerate(plan["waves"]):
+        print("  wave {:>3} : {:>12}   ({} tasks)".format(index + 1, format_bytes(wave["bytes"]), len(wave["tasks"])))
+
+    print("\nTotal bytes processed : {}".format(format_bytes(plan["total_bytes"])))
+    print("Estimated critical path ({}) : {}".format(format_bytes(plan["critical_path_bytes"]), " >> ".join(plan["critical_path"])))
+
+    for task_id, entry in plan["tasks"].items():
+        if entry["error"] is not None:
+            print("\nERROR : dry-run failed for task \"{}\" : {}".format(task_id, entry["error"]))
+
+    if (max_bytes is not None) and (plan["total_bytes"] > max_bytes):
+        print("\nERROR : the workflow would process {}, over the budget of {}.".format(format_bytes(plan["total_bytes"]), format_bytes(max_bytes)))
+
+    print("")
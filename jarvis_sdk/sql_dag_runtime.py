@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+
+"""In-process execution of TTT tasks for local runs.
+
+These are the local counterparts of the callables generated into the DAG file. They use the
+application default credentials and share one set of GCP clients across all the tasks of a run.
+"""
+
+import datetime
+import logging
+import threading
+
+from google.cloud import bigquery
+from google.cloud import exceptions
+
+from jarvis_sdk import sql_dag_bigquery
+
+
+# Globals
+#
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Limits the number of BigQuery jobs running at the same time in the process, None for no limit
+#
+_jobs_semaphore = None
+
+
+def get_bigquery_client(gcp_project_id):
+
+    # One client per project for the whole process
+    #
+    with _clients_lock:
+        if gcp_project_id not in _clients:
+            _clients[gcp_project_id] = bigquery.Client(project=gcp_project_id)
+
+        return _clients[gcp_project_id]
+
+
+def set_max_concurrent_jobs(max_jobs):
+
+    global _jobs_semaphore
+
+    _jobs_semaphore = threading.BoundedSemaphore(max_jobs) if max_jobs is not None else None
+
+
+def acquire_job_slot():
+
+    if _jobs_semaphore is not None:
+        _jobs_semaphore.acquire()
+
+
+def release_job_slot():
+
+    if _jobs_semaphore is not None:
+        _jobs_semaphore.release()
+
+
+def process_bigquery_record(payload, convert_type_to_string=False):
+
+    logging.info("Processing RECORD type ...")
+
+    # Check for field description and MODE
+    #
+    field_description = payload.get('description')
+    mode = payload.get('mode', "NULLABLE")
+
+    # Check for field FIELDS
+    #
+    list_tuples = []
+    for field in payload.get('fields', []):
+
+        # Field, NAME and TYPE
+        #
+        try:
+            field_name = field['name']
+            field_type = field['type'].strip()
+        except KeyError:
+            continue
+
+        logging.info("Field name : {} || Field type : {}".format(field_name, field_type))
+
+        # Check if field type is RECORD
+        #
+        if field_type == "RECORD":
+            logging.info("Going to process sub Record.")
+            processed_record = process_bigquery_record(field)
+            logging.info("Sub Record processed : \n{}".format(processed_record))
+            list_tuples.append(processed_record)
+
+        else:
+
+            # Convert FIELD TYPE to STRING
+            #
+            if convert_type_to_string is True:
+                field_type = "STRING"
+
+            list_tuples.append(bigquery.SchemaField(name=field_name,
+                                                    field_type=field_type,
+                                                    mode=field.get('mode', "NULLABLE"),
+                                                    description=field.get('description')))
+
+    # Must return a bigquery.SchemaField
+    #
+    return bigquery.SchemaField(payload['name'], payload['type'], description=field_description, mode=mode, fields=tuple(list_tuples))
+
+
+def render_sql_query(sql_query, sql_query_template, ds):
+
+    # Replace "sql_query_template" with the execution DATE
+    #
+    if sql_query_template != "":
+        return sql_query.replace("{{" + sql_query_template + "}}", ds)
+
+    return sql_query
+
+
+def execute_gbq(sql_id, gcp_project_id, bq_dataset, table_name, write_disposition, sql_query_template, sql_query, atomic_truncate=False, partition_write=None, ds=None):
+
+    logging.info("sql_query_template : %s", sql_query_template)
+    logging.info("execution_date : %s", ds)
+    sql_query = render_sql_query(sql_query, sql_query_template, ds)
+
+    logging.info("SQL Query : \n%s", sql_query)
+
+    gbq_client = get_bigquery_client(gcp_project_id)
+
+    job_config = bigquery.QueryJobConfig()
+    table_ref = gbq_client.dataset(bq_dataset).table(table_name)
+
+    # Try to retrieve schema
+    # This will be used later on in a case of query with WRITE_TRUNCATE : the schema to restore is
+    # read from the table, not from the cache
+    #
+    restore_schema = (partition_write is None) and (atomic_truncate is False) and (write_disposition == "WRITE_TRUNCATE")
+    try:
+        existing_table = sql_dag_bigquery.get_table_metadata(gbq_client, table_ref, refresh=restore_schema)
+        retrieved_schema = list(existing_table.schema)
+    except exceptions.NotFound:
+        logging.info("Table {} does not exist, cannot retrieve schema.".format(table_name))
+        existing_table = None
+        retrieved_schema = None
+
+    # Atomic WRITE_TRUNCATE of an existing table : a MERGE statement replaces the rows
+    #
+    atomic = (partition_write is None) and (atomic_truncate is True) and (write_disposition == "WRITE_TRUNCATE") and (retrieved_schema is not None)
+
+    # Partition of the execution date only : MERGE on key columns or write to the partition decorator
+    #
+    if (partition_write is not None) and (partition_write["mode"] == "merge"):
+
+        if existing_table is None:
+            raise ValueError("partition_write : the table {} must exist to be merged.".format(sql_dag_bigquery.get_table_id(table_ref)))
+
+        sql_query = sql_dag_bigquery.build_partition_merge_query(existing_table, sql_query, partition_write["merge_keys"], ds)
+        logging.info("Partition MERGE : \n%s", sql_query)
+
+    elif partition_write is not None:
+
+        job_config.destination = gbq_client.dataset(bq_dataset).table(table_name + "$" + sql_dag_bigquery.get_partition_decorator(existing_table, ds))
+        job_config.write_disposition = write_disposition
+        if existing_table is None:
+            job_config.time_partitioning = bigquery.TimePartitioning()
+        logging.info("Partition : %s", job_config.destination.table_id)
+
+    elif atomic is True:
+        sql_query = sql_dag_bigquery.build_atomic_truncate_query(existing_table, sql_query)
+        logging.info("Atomic WRITE_TRUNCATE : \n%s", sql_query)
+
+    else:
+        job_config.destination = table_ref
+        job_config.write_disposition = write_disposition
+
+    acquire_job_slot()
+    try:
+        query_job = gbq_client.query(sql_query, location="EU", job_config=job_config)
+        results = query_job.result()  # Waits for query to complete.
+
+    except exceptions.GoogleCloudError as error:
+        logging.error("ERROR while executing query : %s", error)
+        raise error
+
+    finally:
+        release_job_slot()
+
+    # Update schema
+    #
+    if (restore_schema is True) and (retrieved_schema is not None):
+        sql_dag_bigquery.restore_table_schema(gbq_client, table_ref, retrieved_schema)
+
+    statistics = sql_dag_bigquery.get_query_statistics(query_job, results)
+    logging.info("Rows             : %s", statistics["rows"])
+    logging.info("Bytes processed  : %s", statistics["bytes_processed"])
+    logging.info("Slot time (ms)   : %s", statistics["slot_millis"])
+
+
+def execute_bq_copy_table(source_gcp_project_id,
+                          source_bq_dataset,
+                          source_bq_table,
+                          destination_gcp_project_id,
+                          destination_bq_dataset,
+                          destination_bq_table,
+                          destination_bq_table_date_suffix,
+                          destination_bq_table_date_suffix_format,
+                          copy_mode="copy",
+                          snapshot_expiration_days=None,
+                          copies=None,
+                          ds=None):
+
+    gbq_client = get_bigquery_client("fd-jarvis-datalake")
+
+    # Tables to copy : the source and destination tables of the task, or its "tables" list
+    #
+    if copies is None:
+        copies = [{"source_gcp_project_id": source_gcp_project_id,
+                   "source_bq_dataset": source_bq_dataset,
+                   "source_bq_table": source_bq_table,
+                   "destination_bq_table": destination_bq_table}]
+
+    # The date suffix is the execution date
+    #
+    if destination_bq_table_date_suffix is True:
+        date_suffix = datetime.datetime.strptime(ds, "%Y-%m-%d").strftime(destination_bq_table_date_suffix_format)
+
+    table_pairs = []
+    for table_copy in copies:
+
+        source_table_ref = gbq_client.dataset(table_copy["source_bq_dataset"], project=table_copy["source_gcp_project_id"]).table(table_copy["source_bq_table"])
+
+        dest_table = table_copy["destination_bq_table"]
+        if destination_bq_table_date_suffix is True:
+            dest_table += "_" + date_suffix
+
+        dest_table_ref = gbq_client.dataset(destination_bq_dataset, project=destination_gcp_project_id).table(dest_table)
+        logging.info("%s : %s -> %s", copy_mode, sql_dag_bigquery.get_table_id(source_table_ref), sql_dag_bigquery.get_table_id(dest_table_ref))
+
+        table_pairs.append((source_table_ref, dest_table_ref))
+
+    # Clones and snapshots : one DDL script for all the tables
+    #
+    if copy_mode in ["clone", "snapshot"]:
+        acquire_job_slot()
+        try:
+            job = gbq_client.query(sql_dag_bigquery.build_table_copy_script(table_pairs, copy_mode, snapshot_expiration_days), location="EU")
+            job.result()  # Waits for job to complete.
+        finally:
+            release_job_slot()
+
+        assert job.state == "DONE"
+
+    # Copy jobs, one after the other : each one takes a job slot
+    #
+    else:
+        job_config = bigquery.CopyJobConfig()
+        job_config.write_disposition = "WRITE_TRUNCATE"
+
+        for source_table_ref, dest_table_ref in table_pairs:
+            acquire_job_slot()
+            try:
+                job = gbq_client.copy_table(source_table_ref, dest_table_ref, location="EU", job_config=job_config)
+                job.result()  # Waits for job to complete.
+            finally:
+                release_job_slot()
+
+            assert job.state == "DONE"
+
+    for _, dest_table_ref in table_pairs:
+        sql_dag_bigquery.forget_table_metadata(sql_dag_bigquery.get_table_id(dest_table_ref))
+
+
+def build_table_schema(bq_table_schema):
+
+    table_schema_out = []
+    for item in bq_table_schema:
+
+        try:
+            field_name = item['name'].strip()
+            field_type = item['type'].strip()
+        except KeyError:
+            logging.info("ERROR : field does not have NAME or TYPE")
+            continue
+
+        if field_type == "RECORD":
+            table_schema_out.append(process_bigquery_record(item))
+        else:
+            table_schema_out.append(bigquery.SchemaField(field_name, field_type, description=item.get('description'), mode=item.get('mode', "NULLABLE")))
+
+    return table_schema_out
+
+
+def execute_bq_create_table(gcp_project_id,
+                            force_delete,
+                            bq_dataset,
+                            bq_table,
+                            bq_table_description,
+                            bq_table_schema,
+                            bq_table_clustering_fields,
+                            bq_table_timepartitioning_field,
+                            bq_table_timepartitioning_expiration_ms,
+                            bq_table_timepartitioning_require_partition_filter,
+                            schema_evolution=False,
+                            create_table=True,
+                            ds=None):
+
+    # create_table : False for the later dates of a backfill, the first date already created,
+    # rebuilt or dropped the table : only the partition of the execution date is deleted
+    #
+    full_table_name = gcp_project_id + "." + bq_dataset + "." + bq_table
+    logging.info("Table : %s", full_table_name)
+
+    gbq_client = get_bigquery_client(gcp_project_id)
+    table_ref = gbq_client.dataset(bq_dataset, project=gcp_project_id).table(bq_table)
+
+    # Check wether the table already exist or not
+    #
+    try:
+        existing_table = gbq_client.get_table(table_ref)
+        logging.info("Table {} exists.".format(full_table_name))
+
+        if (force_delete is True) and (create_table is True):
+            logging.info("Table {} is flagged to be deleted.".format(full_table_name))
+            gbq_client.delete_table(full_table_name)
+            sql_dag_bigquery.forget_table_metadata(full_table_name)
+
+        else:
+
+            # Schema evolution : the additive changes of the DDL are applied in place,
+            # a breaking change rebuilds the table only with "rebuild", it fails the task otherwise
+            #
+            rebuild = False
+            if (schema_evolution in [True, "rebuild"]) and (create_table is True):
+                rebuild = sql_dag_bigquery.evolve_table(gbq_client,
+                                                        existing_table,
+                                                        build_table_schema(bq_table_schema),
+                                                        bq_table_description,
+                                                        bq_table_clustering_fields,
+                                                        bq_table_timepartitioning_field,
+                                                        bq_table_timepartitioning_expiration_ms,
+                                                        bq_table_timepartitioning_require_partition_filter,
+                                                        rebuild=(schema_evolution == "rebuild"))
+
+            if rebuild is True:
+                logging.info("Table {} is rebuilt.".format(full_table_name))
+                gbq_client.delete_table(full_table_name)
+                sql_dag_bigquery.forget_table_metadata(full_table_name)
+
+            else:
+
+                # Let's delete the current date partition
+                #
+                if existing_table.partitioning_type is not None:
+                    table_name_with_partition = full_table_name + "$" + ds.replace("-", "")
+                    logging.info("Delete partition : %s", table_name_with_partition)
+                    gbq_client.delete_table(table_name_with_partition)
+
+                return
+
+    except exceptions.NotFound:
+        logging.info("Table {} does not exist. Let's create it.".format(full_table_name))
+
+    except ValueError as error:
+        logging.info(error)
+        logging.info("Table {} exists and is not time partitioned.".format(full_table_name))
+        return
+
+    table = bigquery.Table(table_ref)
+    table.description = bq_table_description
+
+    # Processing the table schema
+    #
+    table_schema_out = build_table_schema(bq_table_schema)
+
+    # Processing clustering fields
+    # Clustering fields option needs time_partition enabled
+    #
+    if (bq_table_clustering_fields is not None) and (len(bq_table_clustering_fields) > 0):
+        table.clustering_fields = bq_table_clustering_fields
+        table.time_partitioning = bigquery.table.TimePartitioning()
+
+    # Processing time partitioning options
+    #
+    if (bq_table_timepartitioning_field is not None) or (bq_table_timepartitioning_expiration_ms is not None) or (bq_table_timepartitioning_require_partition_filter is not None):
+        table.time_partitioning = bigquery.table.TimePartitioning(field=bq_table_timepartitioning_field, expiration_ms=bq_table_timepartitioning_expiration_ms)
+        table.require_partition_filter = bq_table_timepartitioning_require_partition_filter
+
+    table.schema = table_schema_out
+
+    # Create table
+    # A later date of a backfill tolerates the table created in the meantime
+    #
+    gbq_client.create_table(table, exists_ok=(create_table is False))
+    sql_dag_bigquery.forget_table_metadata(full_table_name)
+
+
+def execute_task(task, ds=None, create_table=True):
+
+    # Run one task of the workflow context
+    # create_table : False for the create_gbq_table tasks of the later dates of a backfill
+    # Returns "skipped" if the task cannot be executed locally
+    #
+    if task["task_type"] == "sql":
+        execute_gbq(sql_id=task["id"],
+                    gcp_project_id=task["gcp_project_id"],
+                    bq_dataset=task["bq_dataset"],
+                    table_name=task["table_name"],
+                    write_disposition=task["write_disposition"],
+                    sql_query_template=task["sql_query_template"],
+                    sql_query=task["sql"],
+                    atomic_truncate=task["atomic_truncate"],
+                    partition_write=task["partition_write"],
+                    ds=ds)
+
+    elif task["task_type"] == "copy_gbq_table":
+        execute_bq_copy_table(source_gcp_project_id=task["source_gcp_project_id"],
+                              source_bq_dataset=task["source_bq_dataset"],
+                              source_bq_table=task["source_bq_table"],
+                              destination_gcp_project_id=task["destination_gcp_project_id"],
+                              destination_bq_dataset=task["destination_bq_dataset"],
+                              destination_bq_table=task["destination_bq_table"],
+                              destination_bq_table_date_suffix=task["destination_bq_table_date_suffix"],
+                              destination_bq_table_date_suffix_format=task["destination_bq_table_date_suffix_format"],
+                              copy_mode=task["copy_mode"],
+                              snapshot_expiration_days=task["snapshot_expiration_days"],
+                              copies=task["copies"],
+                              ds=ds)
+
+    elif task["task_type"] == "create_gbq_table":
+        execute_bq_create_table(gcp_project_id=task["gcp_project_id"],
+                                force_delete=task["force_delete"],
+                                bq_dataset=task["bq_dataset"],
+                                bq_table=task["bq_table"],
+                                bq_table_description=task["bq_table_description"],
+                                bq_table_schema=task["bq_table_schema"],
+                                bq_table_clustering_fields=task["bq_table_clustering_fields"],
+                                bq_table_timepartitioning_field=task["bq_table_timepartitioning_field"],
+                                bq_table_timepartitioning_expiration_ms=task["bq_table_timepartitioning_expiration_ms"],
+                                bq_table_timepartitioning_require_partition_filter=task["bq_table_timepartitioning_require_partition_filter"],
+                                schema_evolution=task["schema_evolution"],
+                                create_table=create_table,
+                                ds=ds)
+
+    else:
+        logging.info("The task \"%s\" cannot be run locally. Skipping.", task["id"])
+        return "skipped"
+
+    return "success"
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""Dependency aware scheduler for TTT local runs.
+
+A task is launched as soon as all its upstream tasks have succeeded, with at most "parallel" tasks
+running at the same time. On the first failure no new task is launched, the running ones are awaited.
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def run_tasks(nodes, upstream, execute_task, parallel=1, selected=None, label=str):
+
+    # nodes        : all the nodes of the graph, in topological order
+    # upstream     : dict, node -> list of upstream nodes
+    # execute_task : callable(node), may return a status ("success" by default)
+    # selected     : nodes to execute, the others are considered as done
+    # label        : callable(node), name of the node in the logs
+    #
+    # Returns (success, results) where results is a dict : node -> {status, start, end, error}
+    #
+    if selected is None:
+        selected = set(nodes)
+
+    downstream = {node: [] for node in nodes}
+    remaining_upstream = {}
+    for node in nodes:
+        remaining_upstream[node] = len(upstream.get(node, []))
+        for upstream_node in upstream.get(node, []):
+            downstream[upstream_node].append(node)
+
+    results = {}
+    ready = deque([node for node in nodes if remaining_upstream[node] == 0])
+    running = {}
+    failed = False
+    start_time = time.time()
+
+    def complete(node):
+
+        # Release the downstream nodes
+        #
+        for downstream_node in downstream[node]:
+            remaining_upstream[downstream_node] -= 1
+            if remaining_upstream[downstream_node] == 0:
+                ready.append(downstream_node)
+
+    def timed_execution(node):
+
+        # The worker thread is named after the task so that every log line can be prefixed with it
+        #
+        worker = threading.current_thread()
+        worker_name = worker.name
+        worker.name = label(node)
+
+        results[node]["start"] = time.time() - start_time
+        try:
+            status = execute_task(node)
+        finally:
+            results[node]["end"] = time.time() - start_time
+            worker.name = worker_name
+
+        return status if status is not None else "success"
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+
+        while (len(ready) > 0) or (len(running) > 0):
+
+            # Launch everything that is ready
+            #
+            while (len(ready) > 0) and (failed is False) and (len(running) < max(1, parallel)):
+
+                node = ready.popleft()
+
+                if node not in selected:
+                    complete(node)
+                    continue
+
+                results[node] = {"status": "running", "start": None, "end": None, "error": None}
+                running[executor.submit(timed_execution, node)] = node
+
+            if len(running) == 0:
+                break
+
+            # Wait for at least one task to finish
+            #
+            done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+
+            for future in done:
+
+                node = running.pop(future)
+
+                try:
+                    results[node]["status"] = future.result()
+                    complete(node)
+
+                except Exception as ex:
+                    results[node]["status"] = "failed"
+                    results[node]["error"] = ex
+                    failed = True
+
+    # Tasks that could not be launched
+    #
+    for node in nodes:
+        if (node in selected) and (node not in results):
+            results[node] = {"status": "not run", "start": None, "end": None, "error": None}
+
+    return (failed is False), results
+
+
+def print_timing_table(nodes, results, label=str):
+
+    # Per-task timing table, in the order of execution
+    #
+    executed = [node for node in nodes if node in results]
+    executed.sort(key=lambda node: results[node]["start"] if results[node]["start"] is not None else float("inf"))
+
+    width = max([len("Task")] + [len(label(node)) for node in executed])
+
+    print("")
+    print("{}   {:<10}   {:>10}   {:>12}".format("Task".ljust(width), "Status", "Start (s)", "Duration (s)"))
+    print("{}   {}   {}   {}".format("-" * width, "-" * 10, "-" * 10, "-" * 12))
+
+    for node in executed:
+
+        result = results[node]
+
+        start = "" if result["start"] is None else "{:.1f}".format(result["start"])
+        duration = ""
+        if (result["start"] is not None) and (result["end"] is not None):
+            duration = "{:.1f}".format(result["end"] - result["start"])
+
+        print("{}   {:<10}   {:>10}   {:>12}".format(label(node).ljust(width), result["status"], start, duration))
+
+    for node in executed:
+        if results[node]["error"] is not None:
+            print("\nERROR in task \"{}\" : {}".format(label(node), results[node]["error"]))
+
+    print("")
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+"""Run state of TTT local runs, stored in JARVIS_HOME.
+
+For every execution date, the store keeps the fingerprint of the last successful run of each task.
+A fingerprint covers the SQL and the resolved parameters of the task, the execution date and the
+fingerprints of its upstream tasks : a change anywhere upstream changes the fingerprint of all the
+downstream tasks.
+
+It also keeps a checkpoint of the last run : for each of its execution dates, its tasks and the ones
+it completed, so that a failed run can be resumed.
+"""
+
+import os
+import json
+import hashlib
+import datetime
+import threading
+
+from jarvis_sdk import jarvis_config
+from jarvis_sdk import sql_dag_graph
+
+
+# Globals
+#
+_state_directory = "ttt-runs"
+
+# Keys of a task that have no effect on the data produced
+#
+_ignored_task_keys = ["short_description", "doc_md"]
+
+
+def get_state_file(dag_name):
+
+    try:
+        jarvis_home = jarvis_config.get_jarvis_home()
+    except KeyError:
+        print("JARVIS_HOME is not set, the run state cannot be stored.")
+        return None
+
+    if jarvis_home is None:
+        return None
+
+    return os.path.join(jarvis_home, _state_directory, dag_name + ".json")
+
+
+def load_run_state(dag_name):
+
+    # Returns the store : {file, lock, data}
+    # data : {"runs": {ds: {task_id: {fingerprint, status, end}}},
+    #         "checkpoint": {"dates": {ds: {tasks, completed}}, status, start}}
+    #
+    store = {"file": get_state_file(dag_name), "lock": threading.Lock(), "data": {"runs": {}}}
+
+    if (store["file"] is None) or (os.path.isfile(store["file"]) is False):
+        return store
+
+    try:
+        with open(store["file"], "r") as f:
+            store["data"] = json.load(f)
+        store["data"].setdefault("runs", {})
+
+    except Exception as error:
+        print("Cannot read the run state {} : {}. Starting from an empty state.".format(store["file"], error))
+
+    return store
+
+
+def save_run_state(store):
+
+    # Called from the worker threads : the file is replaced atomically
+    #
+    if store["file"] is None:
+        return
+
+    with store["lock"]:
+
+        os.makedirs(os.path.dirname(store["file"]), exist_ok=True)
+
+        temporary_file = store["file"] + ".tmp"
+        with open(temporary_file, "w") as f:
+            json.dump(store["data"], f, indent=1, sort_keys=True)
+
+        os.replace(temporary_file, store["file"])
+
+
+def get_task_parameters_hash(task):
+
+    parameters = {key: value for key, value in task.items() if key not in _ignored_task_keys}
+
+    return hashlib.sha256(json.dumps(parameters, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def compute_fingerprints(context, ds):
+
+    # Upstream tasks are always fingerprinted first thanks to the topological order
+    #
+    graph = context["graph"]
+    tasks = {task["id"]: task for task in context["tasks"]}
+
+    fingerprints = {}
+    for task_id in graph["order"]:
+
+        payload = {
+            "ds": ds,
+            "parameters": get_task_parameters_hash(tasks[task_id]),
+            "upstream": sorted(fingerprints[upstream_task] for upstream_task in sql_dag_graph.get_upstream_tasks(graph, task_id))
+        }
+
+        fingerprints[task_id] = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    return fingerprints
+
+
+def get_outdated_tasks(context, store, ds, fingerprints):
+
+    # A task is outdated if it never succeeded for this "ds", if its fingerprint changed
+    # or if one of its upstream tasks is outdated
+    #
+    graph = context["graph"]
+    previous_run = store["data"]["runs"].get(ds, {})
+
+    outdated = set()
+    for task_id in graph["order"]:
+
+        try:
+            up_to_date = previous_run[task_id]["fingerprint"] == fingerprints[task_id]
+        except KeyError:
+            up_to_date = False
+
+        if (up_to_date is False) or any(upstream_task in outdated for upstream_task in sql_dag_graph.get_upstream_tasks(graph, task_id)):
+            outdated.add(task_id)
+
+    return outdated
+
+
+def get_resumable_tasks(context, store, fingerprints):
+
+    # fingerprints : {ds: {task_id: fingerprint}}, for the dates of the checkpoint
+    # Returns {ds: tasks of the last run that did not complete, in dependency order}
+    # A completed task is run again if its fingerprint changed since, i.e. its SQL was fixed.
+    #
+    remaining_tasks = {}
+    missing_tasks = set()
+
+    for ds, checkpoint in store["data"]["checkpoint"]["dates"].items():
+
+        previous_run = store["data"]["runs"].get(ds, {})
+        completed = set(checkpoint["completed"])
+
+        remaining = []
+        for task_id in checkpoint["tasks"]:
+
+            if task_id not in fingerprints[ds]:
+                missing_tasks.add(task_id)
+                continue
+
+            try:
+                if (task_id in completed) and (previous_run[task_id]["fingerprint"] == fingerprints[ds][task_id]):
+                    continue
+            except KeyError:
+                pass
+
+            remaining.append(task_id)
+
+        remaining_tasks[ds] = sql_dag_graph.sort_tasks(context["graph"], remaining)
+
+    for task_id in sorted(missing_tasks):
+        print("The task \"{}\" is no longer in the workflow. Skipping.".format(task_id))
+
+    return remaining_tasks
+
+
+def start_checkpoint(store, tasks):
+
+    # tasks : {ds: list of task IDs}
+    #
+    with store["lock"]:
+        store["data"]["checkpoint"] = {
+            "dates": {ds: {"tasks": list(task_ids), "completed": []} for ds, task_ids in tasks.items()},
+            "status": "running",
+            "start": datetime.datetime.now().isoformat()
+        }
+
+    save_run_state(store)
+
+
+def resume_checkpoint(store):
+
+    with store["lock"]:
+        store["data"]["checkpoint"]["status"] = "running"
+
+    save_run_state(store)
+
+
+def finish_checkpoint(store, status):
+
+    with store["lock"]:
+        store["data"]["checkpoint"]["status"] = status
+
+    save_run_state(store)
+
+
+def record_task_run(store, ds, task_id, fingerprint, status):
+
+    with store["lock"]:
+        store["data"]["runs"].setdefault(ds, {})[task_id] = {
+            "fingerprint": fingerprint,
+            "status": status,
+            "end": datetime.datetime.now().isoformat()
+        }
+
+        try:
+            checkpoint = store["data"]["checkpoint"]["dates"][ds]
+            if task_id not in checkpoint["completed"]:
+                checkpoint["completed"].append(task_id)
+        except KeyError:
+            pass
+
+    save_run_state(store)
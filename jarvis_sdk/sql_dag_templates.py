@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""Jinja2 templates used to generate the TTT DAG file and the local script.
+
+The templates live in the "templates" directory of the package. They are compiled once per process
+and kept in the environment cache, the compiled bytecode is also cached on disk between runs.
+The BigQuery helpers of the runtime functions are rendered from the source of sql_dag_bigquery,
+the scheduler of the local script from the source of sql_dag_scheduler : the generated files do not
+import jarvis_sdk.
+"""
+
+import ast
+import inspect
+
+import jinja2
+
+from jarvis_sdk import sql_dag_bigquery
+from jarvis_sdk import sql_dag_scheduler
+
+
+# Globals
+#
+_templates_environment = None
+
+
+def to_python_literal(value):
+
+    # Render any value (str, int, bool, None, list, dict) as a valid Python literal
+    #
+    return repr(value)
+
+
+def to_python_docstring(value):
+
+    # Render a multi-line text as a triple-quoted Python string.
+    # Backslashes and triple quotes are escaped so the text can never close the string.
+    #
+    if value is None:
+        value = ""
+
+    value = value.replace("\\", "\\\\").replace("\"\"\"", "\\\"\\\"\\\"")
+    if value.endswith("\""):
+        value = value[:-1] + "\\\""
+
+    return "\"\"\"" + value + "\"\"\""
+
+
+def get_module_source(module):
+
+    # Source of a module without its docstring and imports, to be rendered as is into a template
+    #
+    source = inspect.getsource(module)
+    last_import = max(node.lineno for node in ast.parse(source).body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+    return "\n".join(source.split("\n")[last_import:]).strip("\n") + "\n"
+
+
+def get_templates_environment():
+
+    global _templates_environment
+
+    if _templates_environment is None:
+
+        environment = jinja2.Environment(
+            loader=jinja2.PackageLoader("jarvis_sdk", "templates"),
+            bytecode_cache=jinja2.FileSystemBytecodeCache(),
+            undefined=jinja2.StrictUndefined,
+            autoescape=False,
+            auto_reload=False,
+            keep_trailing_newline=True,
+            trim_blocks=True,
+            lstrip_blocks=True)
+
+        environment.filters["pyrepr"] = to_python_literal
+        environment.filters["pydoc"] = to_python_docstring
+        environment.globals["bigquery_helpers_source"] = get_module_source(sql_dag_bigquery)
+        environment.globals["scheduler_source"] = get_module_source(sql_dag_scheduler)
+
+        _templates_environment = environment
+
+    return _templates_environment
+
+
+def get_template(name):
+
+    # Templates are compiled on first use and then served from the environment cache
+    #
+    return get_templates_environment().get_template(name)
+
+
+def render(name, **kwargs):
+
+    return get_template(name).render(**kwargs)
@@ -11,6 +11,7 @@ setup(
     name="jarvis-sdk",
     version="1.1.5",
     packages=['jarvis_sdk'],
+    package_data={'jarvis_sdk': ['templates/*.j2']},
     description='JARVIS SDK Python Package',
     long_description=long_description,
     long_description_content_type="text/markdown",
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the BigQuery helpers shared by the local runtime and the generated DAG files."""
+
+import types
+
+import pytest
+from google.cloud import bigquery
+
+from jarvis_sdk import sql_dag_bigquery
+
+
+Field = bigquery.SchemaField
+
+
+def test_build_atomic_truncate_query():
+
+    table = bigquery.Table("project.dataset.table", schema=[Field("id", "INTEGER"), Field("label", "STRING")])
+
+    assert sql_dag_bigquery.build_atomic_truncate_query(table, "SELECT 1 AS id, 'a' AS label;\n") == ("MERGE `project.dataset.table` T\n"
+                                                                                                      "USING (\n"
+                                                                                                      "SELECT 1 AS id, 'a' AS label\n"
+                                                                                                      ") S\n"
+                                                                                                      "ON FALSE\n"
+                                                                                                      "WHEN NOT MATCHED BY SOURCE THEN DELETE\n"
+                                                                                                      "WHEN NOT MATCHED THEN INSERT (`id`, `label`) VALUES (`id`, `label`)")
+
+
+def test_build_atomic_truncate_query_require_partition_filter():
+
+    table = bigquery.Table("project.dataset.table", schema=[Field("id", "INTEGER"), Field("day", "DATE")])
+    table.time_partitioning = bigquery.TimePartitioning(field="day")
+    table.require_partition_filter = True
+
+    assert "WHEN NOT MATCHED BY SOURCE AND (T.`day` IS NULL OR T.`day` IS NOT NULL) THEN DELETE" in sql_dag_bigquery.build_atomic_truncate_query(table, "SELECT 1")
+
+    # Partitioned by ingestion time : there is no column to filter on
+    #
+    table.time_partitioning = bigquery.TimePartitioning()
+
+    with pytest.raises(ValueError, match="partitioned by ingestion time"):
+        sql_dag_bigquery.build_atomic_truncate_query(table, "SELECT 1")
+
+
+def test_normalize_field_type():
+
+    assert sql_dag_bigquery.normalize_field_type("int64") == "INTEGER"
+    assert sql_dag_bigquery.normalize_field_type("STRUCT") == "RECORD"
+    assert sql_dag_bigquery.normalize_field_type("DECIMAL") == "NUMERIC"
+    assert sql_dag_bigquery.normalize_field_type("BIGDECIMAL") == "BIGNUMERIC"
+    assert sql_dag_bigquery.normalize_field_type("string") == "STRING"
+
+
+def test_diff_table_schema_unchanged():
+
+    live_schema = [Field("id", "INTEGER", mode="REQUIRED"), Field("amount", "NUMERIC", description="Amount")]
+    expected_schema = [Field("ID", "INT64", mode="REQUIRED"), Field("amount", "DECIMAL", description="Amount")]
+
+    merged_schema, changes, breaking_changes = sql_dag_bigquery.diff_table_schema(expected_schema, live_schema)
+
+    assert changes == []
+    assert breaking_changes == []
+    assert [field.name for field in merged_schema] == ["id", "amount"]
+
+
+def test_diff_table_schema_additive_changes():
+
+    live_schema = [Field("id", "INTEGER", mode="REQUIRED"),
+                   Field("label", "STRING", description="old"),
+                   Field("attributes", "RECORD", fields=(Field("key", "STRING"),))]
+    expected_schema = [Field("extra", "DATE"),
+                       Field("id", "INTEGER"),
+                       Field("label", "STRING", description="new"),
+                       Field("attributes", "RECORD", fields=(Field("key", "STRING"), Field("value", "STRING")))]
+
+    merged_schema, changes, breaking_changes = sql_dag_bigquery.diff_table_schema(expected_schema, live_schema)
+
+    assert breaking_changes == []
+    assert changes == ["id : mode relaxed to NULLABLE", "label : description", "attributes.value : added", "extra : added"]
+
+    # The columns of the table keep their order, new columns are added at the end
+    #
+    assert [field.name for field in merged_schema] == ["id", "label", "attributes", "extra"]
+    assert merged_schema[0].mode == "NULLABLE"
+    assert merged_schema[1].description == "new"
+    assert [field.name for field in merged_schema[2].fields] == ["key", "value"]
+
+    # The live schema is left as is
+    #
+    assert live_schema[0].mode == "REQUIRED"
+    assert live_schema[1].description == "old"
+
+
+def test_diff_table_schema_breaking_changes():
+
+    live_schema = [Field("id", "INTEGER"),
+                   Field("label", "STRING"),
+                   Field("removed", "STRING"),
+                   Field("attributes", "RECORD", fields=(Field("key", "STRING"),))]
+    expected_schema = [Field("id", "INTEGER", mode="REQUIRED"),
+                       Field("label", "INTEGER"),
+                       Field("attributes", "RECORD", fields=(Field("key", "BOOL"),)),
+                       Field("mandatory", "STRING", mode="REQUIRED")]
+
+    _, changes, breaking_changes = sql_dag_bigquery.diff_table_schema(expected_schema, live_schema)
+
+    assert changes == []
+    assert breaking_changes == ["id : mode NULLABLE -> REQUIRED",
+                                "label : type STRING -> INTEGER",
+                                "removed : removed",
+                                "attributes.key : type STRING -> BOOL",
+                                "mandatory : new REQUIRED column"]
+
+
+def get_fake_client(updates):
+
+    return types.SimpleNamespace(update_table=lambda table, fields: updates.append(fields))
+
+
+def test_evolve_table_in_place():
+
+    table = bigquery.Table("project.dataset.table", schema=[Field("id", "INTEGER")])
+    updates = []
+
+    rebuild = sql_dag_bigquery.evolve_table(get_fake_client(updates), table, [Field("id", "INTEGER"), Field("label", "STRING")], "Description", None, None, None, None)
+
+    assert rebuild is False
+    assert updates == [["schema", "description"]]
+    assert [field.name for field in table.schema] == ["id", "label"]
+
+
+def test_evolve_table_breaking_change():
+
+    table = bigquery.Table("project.dataset.table", schema=[Field("id", "INTEGER")])
+    updates = []
+
+    with pytest.raises(Exception, match="breaking changes \\(id : type INTEGER -> STRING\\)"):
+        sql_dag_bigquery.evolve_table(get_fake_client(updates), table, [Field("id", "STRING")], None, None, None, None, None)
+
+    assert sql_dag_bigquery.evolve_table(get_fake_client(updates), table, [Field("id", "STRING")], None, None, None, None, None, rebuild=True) is True
+    assert updates == []
+
+
+def build_partitioned_table(partition_type):
+
+    table = bigquery.Table("project.dataset.table", schema=[Field("id", "INTEGER"), Field("day", partition_type), Field("value", "STRING")])
+    table.time_partitioning = bigquery.TimePartitioning(field="day")
+
+    return table
+
+
+def test_build_partition_merge_query():
+
+    sql_merge = sql_dag_bigquery.build_partition_merge_query(build_partitioned_table("DATE"), "SELECT * FROM source;", ["id"], "2020-01-02")
+
+    assert sql_merge == ("MERGE `project.dataset.table` T\n"
+                         "USING (\n"
+                         "SELECT * FROM (\n"
+                         "SELECT * FROM source\n"
+                         ") Q\n"
+                         "WHERE Q.`day` = DATE '2020-01-02'\n"
+                         ") S\n"
+                         "ON T.`day` = DATE '2020-01-02' AND T.`id` = S.`id`\n"
+                         "WHEN MATCHED THEN UPDATE SET `day` = S.`day`, `value` = S.`value`\n"
+                         "WHEN NOT MATCHED THEN INSERT (`id`, `day`, `value`) VALUES (`id`, `day`, `value`)\n"
+                         "WHEN NOT MATCHED BY SOURCE AND T.`day` = DATE '2020-01-02' THEN DELETE")
+
+
+def test_build_partition_merge_query_timestamp_partition():
+
+    sql_merge = sql_dag_bigquery.build_partition_merge_query(build_partitioned_table("TIMESTAMP"), "SELECT * FROM source", ["id"], "2020-01-02")
+
+    assert "WHERE DATE(Q.`day`) = DATE '2020-01-02'" in sql_merge
+    assert "WHEN NOT MATCHED BY SOURCE AND DATE(T.`day`) = DATE '2020-01-02' THEN DELETE" in sql_merge
+
+
+def test_build_partition_merge_query_not_partitioned():
+
+    with pytest.raises(ValueError):
+        sql_dag_bigquery.build_partition_merge_query(bigquery.Table("project.dataset.table"), "SELECT 1", ["id"], "2020-01-02")
+
+
+def test_get_partition_decorator():
+
+    table = build_partitioned_table("DATE")
+    assert sql_dag_bigquery.get_partition_decorator(table, "2020-01-02") == "20200102"
+
+    table.time_partitioning = bigquery.TimePartitioning(type_="MONTH", field="day")
+    assert sql_dag_bigquery.get_partition_decorator(table, "2020-01-02") == "202001"
+
+    # A table created by the query is partitioned by day
+    #
+    assert sql_dag_bigquery.get_partition_decorator(None, "2020-01-02") == "20200102"
+
+    with pytest.raises(ValueError, match="is not partitioned"):
+        sql_dag_bigquery.get_partition_decorator(bigquery.Table("project.dataset.table"), "2020-01-02")
+
+
+def get_table_pairs():
+
+    return [(bigquery.TableReference.from_string("source.dataset.orders"), bigquery.TableReference.from_string("archive.dataset.orders_20200102")),
+            (bigquery.TableReference.from_string("source.dataset.items"), bigquery.TableReference.from_string("archive.dataset.items_20200102"))]
+
+
+def test_build_table_copy_script_clone():
+
+    assert sql_dag_bigquery.build_table_copy_script(get_table_pairs(), "clone") == (
+        "CREATE OR REPLACE TABLE `archive.dataset.orders_20200102` CLONE `source.dataset.orders`;\n"
+        "CREATE OR REPLACE TABLE `archive.dataset.items_20200102` CLONE `source.dataset.items`;")
+
+
+def test_build_table_copy_script_snapshot():
+
+    assert sql_dag_bigquery.build_table_copy_script(get_table_pairs()[:1], "snapshot") == (
+        "CREATE SNAPSHOT TABLE IF NOT EXISTS `archive.dataset.orders_20200102` CLONE `source.dataset.orders`;")
+
+    assert sql_dag_bigquery.build_table_copy_script(get_table_pairs(), "snapshot", snapshot_expiration_days="30") == (
+        "CREATE SNAPSHOT TABLE IF NOT EXISTS `archive.dataset.orders_20200102` CLONE `source.dataset.orders`"
+        " OPTIONS(expiration_timestamp = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL 30 DAY));\n"
+        "CREATE SNAPSHOT TABLE IF NOT EXISTS `archive.dataset.items_20200102` CLONE `source.dataset.items`"
+        " OPTIONS(expiration_timestamp = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL 30 DAY));")
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the on-disk cache of the generated TTT deploy artifacts."""
+
+import os
+
+import pytest
+
+from jarvis_sdk import sql_dag_cache
+from jarvis_sdk import sql_dag_graph
+
+
+@pytest.fixture
+def cache_directory(tmp_path, monkeypatch):
+
+    monkeypatch.setenv("JARVIS_HOME", str(tmp_path))
+
+    return os.path.join(str(tmp_path), "ttt-cache")
+
+
+def build_context(sql="SELECT 1"):
+
+    return {
+        "dag_name": "my_dag",
+        "graph": sql_dag_graph.build_task_graph([], ["a"]),
+        "tasks": [{"id": "a", "task_type": "sql", "sql": sql}]
+    }
+
+
+def test_cache_key_is_stable():
+
+    cache_key = sql_dag_cache.compute_cache_key(build_context(), "1.0", jarvis_sdk_version="1.1.5")
+
+    assert cache_key == sql_dag_cache.compute_cache_key(build_context(), "1.0", jarvis_sdk_version="1.1.5")
+    assert len(cache_key) == 64
+
+
+def test_cache_key_ignores_the_graph():
+
+    context = build_context()
+    context["graph"] = sql_dag_graph.build_task_graph(["a >> b"], ["a", "b"])
+
+    assert sql_dag_cache.compute_cache_key(context, "1.0") == sql_dag_cache.compute_cache_key(build_context(), "1.0")
+
+
+def test_cache_key_changes():
+
+    cache_key = sql_dag_cache.compute_cache_key(build_context(), "1.0", jarvis_sdk_version="1.1.5")
+
+    assert sql_dag_cache.compute_cache_key(build_context("SELECT 2"), "1.0", jarvis_sdk_version="1.1.5") != cache_key
+    assert sql_dag_cache.compute_cache_key(build_context(), "1.1", jarvis_sdk_version="1.1.5") != cache_key
+    assert sql_dag_cache.compute_cache_key(build_context(), "1.0", jarvis_sdk_version="1.1.6") != cache_key
+
+
+def test_save_and_load_artifacts(cache_directory):
+
+    assert sql_dag_cache.load_artifacts("key") is None
+
+    sql_dag_cache.save_artifacts("key", {"dag": "dag source", "script": "script source"})
+
+    assert os.listdir(cache_directory) == ["key.json"]
+    assert sql_dag_cache.load_artifacts("key") == {"dag": "dag source", "script": "script source"}
+
+
+def test_load_artifacts_corrupted_entry(cache_directory):
+
+    os.makedirs(cache_directory)
+    with open(os.path.join(cache_directory, "key.json"), "w") as f:
+        f.write("{\"dag\": ")
+
+    assert sql_dag_cache.load_artifacts("key") is None
+
+
+def test_no_jarvis_home(monkeypatch):
+
+    monkeypatch.delenv("JARVIS_HOME", raising=False)
+
+    sql_dag_cache.save_artifacts("key", {"dag": "dag source"})
+
+    assert sql_dag_cache.load_artifacts("key") is None
+
+
+def test_evict_least_recently_used_entries(cache_directory):
+
+    for index, cache_key in enumerate(["k1", "k2", "k3", "k4"]):
+        sql_dag_cache.save_artifacts(cache_key, {"dag": cache_key})
+        os.utime(os.path.join(cache_directory, cache_key + ".json"), (1000 + index, 1000 + index))
+
+    # Loading an entry marks it as recently used : "k1" is kept, the two oldest others are evicted
+    #
+    sql_dag_cache.load_artifacts("k1")
+    sql_dag_cache.evict_entries(cache_directory, max_entries=2)
+
+    assert sorted(os.listdir(cache_directory)) == ["k1.json", "k4.json"]
+
+
+def test_evict_below_the_limit(cache_directory):
+
+    for cache_key in ["k1", "k2"]:
+        sql_dag_cache.save_artifacts(cache_key, {"dag": cache_key})
+
+    sql_dag_cache.evict_entries(cache_directory, max_entries=2)
+
+    assert sorted(os.listdir(cache_directory)) == ["k1.json", "k2.json"]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the parsing of the TTT task payloads."""
+
+from jarvis_sdk import sql_dag_generator
+
+
+def build_copy_payload(**kwargs):
+
+    payload = {"id": "archive",
+               "task_type": "copy_gbq_table",
+               "source_gcp_project_id": "source-project",
+               "source_bq_dataset": "source_dataset",
+               "source_bq_table": "orders",
+               "destination_bq_table": "orders_archive"}
+    payload.update(kwargs)
+
+    return payload
+
+
+def test_load_copy_task_snapshot():
+
+    task = sql_dag_generator.load_copy_bq_table_task(build_copy_payload(copy_mode="snapshot",
+                                                                        destination_bq_table_date_suffix=True,
+                                                                        destination_bq_table_date_suffix_format="%Y%m%d"),
+                                                     "project", "dataset")
+
+    assert task["copy_mode"] == "snapshot"
+    assert task["copies"] == [{"source_gcp_project_id": "source-project",
+                               "source_bq_dataset": "source_dataset",
+                               "source_bq_table": "orders",
+                               "destination_bq_table": "orders_archive"}]
+
+
+def test_load_copy_task_snapshot_without_date_suffix(capsys):
+
+    # Every run after the first one would keep the first snapshot
+    #
+    assert sql_dag_generator.load_copy_bq_table_task(build_copy_payload(copy_mode="snapshot"), "project", "dataset") is False
+    assert "The \"snapshot\" mode needs \"destination_bq_table_date_suffix\" : true" in capsys.readouterr().out
+
+    payload = build_copy_payload(copy_mode="snapshot", destination_bq_table_date_suffix=False, destination_bq_table_date_suffix_format="%Y%m%d")
+    assert sql_dag_generator.load_copy_bq_table_task(payload, "project", "dataset") is False
+
+
+def test_load_copy_task_clone_without_date_suffix():
+
+    assert sql_dag_generator.load_copy_bq_table_task(build_copy_payload(copy_mode="clone"), "project", "dataset")["copy_mode"] == "clone"
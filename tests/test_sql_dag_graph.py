@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the TTT dependency graph : parser, validation, waves and task selection."""
+
+import pytest
+
+from jarvis_sdk import sql_dag_graph
+
+
+@pytest.mark.parametrize("line, operands, operators", [
+    ("a >> b", [["a"], ["b"]], [">>"]),
+    ("a << b", [["a"], ["b"]], ["<<"]),
+    ("a >> b >> c", [["a"], ["b"], ["c"]], [">>", ">>"]),
+    ("a>>[b,c]>>d", [["a"], ["b", "c"], ["d"]], [">>", ">>"]),
+    ("[a, b] >> c << d", [["a", "b"], ["c"], ["d"]], [">>", "<<"]),
+    ("[a]", [["a"]], []),
+])
+def test_parse_dependency(line, operands, operators):
+
+    assert sql_dag_graph.parse_dependency(line) == (operands, operators, None)
+
+
+@pytest.mark.parametrize("line, error", [
+    ("", "empty expression"),
+    ("a >>", "a task ID or a list is expected at the end of the expression"),
+    ("a b", "\">>\" or \"<<\" expected, got \"b\""),
+    ("a -> b", "\">>\" or \"<<\" expected, got \"-\""),
+    ("[a, b", "missing \"]\""),
+    ("[] >> a", "unexpected \"]\" in list"),
+    (">> a", "unexpected \">>\""),
+])
+def test_parse_dependency_malformed(line, error):
+
+    assert sql_dag_graph.parse_dependency(line)[2] == error
+
+
+def test_build_task_graph():
+
+    graph = sql_dag_graph.build_task_graph(["t1 >> t2 >> [t31, t32] >> t4", "t4 << t0"], ["t0", "t1", "t2", "t31", "t32", "t4"])
+
+    assert graph["errors"] == []
+    assert graph["waves"] == [["t0", "t1"], ["t2"], ["t31", "t32"], ["t4"]]
+    assert graph["order"] == ["t0", "t1", "t2", "t31", "t32", "t4"]
+    assert sorted(sql_dag_graph.get_upstream_tasks(graph, "t4")) == ["t0", "t31", "t32"]
+    assert sorted(sql_dag_graph.get_downstream_tasks(graph, "t2")) == ["t31", "t32"]
+
+
+def test_build_task_graph_duplicated_edges():
+
+    graph = sql_dag_graph.build_task_graph(["a >> b", "b << a", "a >> b"], ["a", "b"])
+
+    assert graph["errors"] == []
+    assert sql_dag_graph.get_upstream_tasks(graph, "b") == ["a"]
+
+
+def test_build_task_graph_cycle():
+
+    graph = sql_dag_graph.build_task_graph(["a >> b >> c >> a", "d >> e", "c >> f"], ["a", "b", "c", "d", "e", "f"])
+
+    # The tasks of the cycle and the ones depending on it are never scheduled
+    #
+    assert graph["errors"] == ["dependency cycle detected in \"task_dependencies\", these tasks can never run : a, b, c, f."]
+    assert graph["order"] == ["d", "e"]
+
+
+def test_build_task_graph_self_dependency():
+
+    graph = sql_dag_graph.build_task_graph(["a >> a"], ["a"])
+
+    assert graph["errors"] == ["dependency cycle detected in \"task_dependencies\", these tasks can never run : a."]
+
+
+def test_build_task_graph_reports_every_error():
+
+    graph = sql_dag_graph.build_task_graph(["[a, b] >> [c, d]", "a >> x", "x >> b", "a >>"], ["a", "b", "c", "d", "a"])
+
+    assert graph["errors"] == [
+        "the task ID \"a\" is declared more than once in \"workflow\".",
+        "cannot parse \"[a, b] >> [c, d]\" in \"task_dependencies\" : Airflow does not support dependencies between two lists.",
+        "the task with ID \"x\" is present in \"task_dependencies\" but not in \"workflow\".",
+        "cannot parse \"a >>\" in \"task_dependencies\" : a task ID or a list is expected at the end of the expression."
+    ]
+
+
+@pytest.fixture
+def graph():
+
+    return sql_dag_graph.build_task_graph(["load_a >> load_b >> report", "load_b >> export"],
+                                          ["load_a", "load_b", "report", "export", "load_c"])
+
+
+@pytest.mark.parametrize("pattern, task_ids", [
+    ("load_b", ["load_b"]),
+    ("load_*", ["load_a", "load_b", "load_c"]),
+    ("*port", ["report", "export"]),
+    ("load_[ab]", ["load_a", "load_b"]),
+    ("load_?", ["load_a", "load_b", "load_c"]),
+    ("LOAD_*", []),
+    ("nothing", []),
+])
+def test_match_tasks(graph, pattern, task_ids):
+
+    assert sql_dag_graph.match_tasks(graph, pattern) == task_ids
+
+
+def test_walk_graph(graph):
+
+    assert sql_dag_graph.walk_graph(graph, ["load_b"], "downstream") == {"load_b", "report", "export"}
+    assert sql_dag_graph.walk_graph(graph, ["report"], "upstream") == {"report", "load_b", "load_a"}
+    assert sql_dag_graph.walk_graph(graph, ["load_b"], "downstream", include_start=False) == {"report", "export"}
+    assert sql_dag_graph.walk_graph(graph, ["load_a", "load_b"], "downstream", include_start=False) == {"load_b", "report", "export"}
+
+
+def test_sort_tasks(graph):
+
+    assert sql_dag_graph.sort_tasks(graph, ["export", "load_a", "load_c"]) == ["load_a", "load_c", "export"]
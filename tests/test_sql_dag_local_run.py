@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of TTT local runs : task selection and the workflow over one or several execution dates."""
+
+import json
+import os
+import threading
+
+import pytest
+
+from jarvis_sdk import sql_dag_generator
+from jarvis_sdk import sql_dag_graph
+from jarvis_sdk import sql_dag_runtime
+
+
+def build_context(task_dependencies, tasks):
+
+    # tasks : list of (task ID, task type)
+    #
+    return {
+        "dag_name": "my_dag",
+        "graph": sql_dag_graph.build_task_graph(task_dependencies, [task_id for task_id, _ in tasks]),
+        "tasks": [{"id": task_id, "task_type": task_type, "sql": "SELECT '" + task_id + "'"} for task_id, task_type in tasks]
+    }
+
+
+@pytest.fixture
+def selection_context():
+
+    # extract >> [clean_a, clean_b] >> report >> export, audit is independent
+    #
+    return build_context(["extract >> [clean_a, clean_b] >> report >> export"],
+                         [("extract", "sql"), ("clean_a", "sql"), ("clean_b", "sql"), ("report", "sql"), ("export", "copy_gbq_table"), ("audit", "sql")])
+
+
+@pytest.mark.parametrize("selectors, task_ids", [
+    ({}, ["extract", "audit", "clean_a", "clean_b", "report", "export"]),
+    ({"tasks_requested": ["report", "extract"]}, ["extract", "report"]),
+    ({"tasks_requested": ["clean_*"]}, ["clean_a", "clean_b"]),
+    ({"from_tasks": ["clean_a"]}, ["clean_a", "report", "export"]),
+    ({"to_tasks": ["report"]}, ["extract", "clean_a", "clean_b", "report"]),
+    ({"from_tasks": ["clean_a"], "to_tasks": ["report"]}, ["clean_a", "report"]),
+    ({"from_tasks": ["extract"], "to_tasks": ["clean_b"]}, ["extract", "clean_b"]),
+    ({"from_tasks": ["report"], "to_tasks": ["clean_a"]}, []),
+    ({"upstream_of": ["report"]}, ["extract", "clean_a", "clean_b"]),
+    ({"downstream_of": ["clean_*"]}, ["report", "export"]),
+    ({"tasks_requested": ["audit"], "from_tasks": ["report"]}, ["audit", "report", "export"]),
+])
+def test_select_local_tasks(selection_context, selectors, task_ids):
+
+    assert sql_dag_generator.select_local_tasks(selection_context, **selectors) == task_ids
+
+
+def test_select_local_tasks_unknown_task(selection_context, capsys):
+
+    assert sql_dag_generator.select_local_tasks(selection_context, from_tasks=["load_*"]) is None
+    assert "The task \"load_*\" that you've requested does not exist" in capsys.readouterr().out
+
+
+@pytest.fixture
+def executions(monkeypatch, tmp_path):
+
+    # Records the tasks executed by the local runs, instead of running them against BigQuery
+    #
+    monkeypatch.setenv("JARVIS_HOME", str(tmp_path))
+
+    executions = []
+    lock = threading.Lock()
+
+    def execute_task(task, ds=None, create_table=True):
+        with lock:
+            executions.append((ds, task["id"], create_table))
+        return "success"
+
+    monkeypatch.setattr(sql_dag_runtime, "execute_task", execute_task)
+
+    return executions
+
+
+def test_backfill_creates_the_tables_once(executions):
+
+    context = build_context(["create >> load"], [("create", "create_gbq_table"), ("load", "sql")])
+    dates = ["2020-01-01", "2020-01-02", "2020-01-03"]
+
+    assert sql_dag_generator.run_local_workflow(context, ["create", "load"], parallel=4, dates=dates) == 0
+
+    creations = [execution for execution in executions if execution[1] == "create"]
+
+    # The first date creates the table before any other date runs, the others only get their partition
+    #
+    assert executions[0] == ("2020-01-01", "create", True)
+    assert sorted(creations[1:]) == [("2020-01-02", "create", False), ("2020-01-03", "create", False)]
+    assert len(executions) == 6
+
+
+@pytest.fixture
+def configuration_file(tmp_path, monkeypatch):
+
+    # Two SQL tasks, the files are referenced relatively to the current directory
+    #
+    monkeypatch.chdir(tmp_path)
+
+    workflow = []
+    for task_id in ["load_a", "load_b"]:
+        with open(task_id + ".sql", "w") as f:
+            f.write("SELECT '{{ds}}' AS execution_date")
+        workflow.append({"id": task_id, "sql_file": task_id + ".sql", "sql_query_template": "ds", "table_name": task_id})
+
+    configuration = {"configuration_type": "table-to-table",
+                     "configuration_id": "my_dag",
+                     "environment": "DEV",
+                     "account": "000000",
+                     "start_date": "2020, 1, 1",
+                     "schedule_interval": "None",
+                     "short_description": "Local run test",
+                     "default_gcp_project_id": "project",
+                     "default_bq_dataset": "dataset",
+                     "default_write_disposition": "WRITE_TRUNCATE",
+                     "task_dependencies": ["load_a >> load_b"],
+                     "workflow": workflow}
+
+    with open("configuration.json", "w") as f:
+        json.dump(configuration, f)
+
+    return os.path.join(str(tmp_path), "configuration.json")
+
+
+def test_local_script_is_standalone(configuration_file):
+
+    # The local script is shipped to the API : it must run without jarvis_sdk
+    #
+    context = sql_dag_generator.load_configuration(configuration_file)
+    source = sql_dag_generator.build_python_script(context, run_locally=True)
+
+    assert "jarvis_sdk" not in source
+
+    namespace = {"__name__": "local_script"}
+    exec(compile(source, "local_script.py", "exec"), namespace)
+
+    executed = []
+    success, results = namespace["run_tasks"](namespace["_dag_tasks"], namespace["_task_upstream"], executed.append, parallel=2)
+
+    assert success is True
+    assert executed == ["load_a", "load_b"]
+
+
+def test_parse_local_run_arguments():
+
+    run_arguments = sql_dag_generator.parse_local_run_arguments(["run", "conf.json", "load_*", "--parallel", "4", "--max-bq-jobs", "2", "--backfill", "2020-01-30:2020-02-01"])
+
+    assert run_arguments.tasks == ["load_*"]
+    assert run_arguments.parallel == 4
+    assert run_arguments.max_bq_jobs == 2
+    assert run_arguments.backfill == ["2020-01-30", "2020-01-31", "2020-02-01"]
+
+
+@pytest.mark.parametrize("option, value", [
+    ("--parallel", "0"),
+    ("--parallel", "-2"),
+    ("--parallel", "two"),
+    ("--max-bq-jobs", "0"),
+    ("--max-bq-jobs", "-1"),
+])
+def test_parse_local_run_arguments_not_positive(option, value, capsys):
+
+    # A semaphore of 0 job slots would block the run forever
+    #
+    assert sql_dag_generator.parse_local_run_arguments(["run", "conf.json", option, value]) is None
+    assert "argument {}".format(option) in capsys.readouterr().err
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the TTT planner, with a fake BigQuery client answering the dry-runs."""
+
+import argparse
+import datetime
+import types
+
+import pytest
+from google.cloud import bigquery
+from google.cloud import exceptions
+from google.cloud.bigquery import SchemaField as Field
+
+from jarvis_sdk import sql_dag_bigquery
+from jarvis_sdk import sql_dag_generator
+from jarvis_sdk import sql_dag_graph
+from jarvis_sdk import sql_dag_planner
+
+
+class FakeBigQueryClient:
+
+    # Returns the bytes processed of each query, raises for the queries in "failures"
+    # tables : the existing tables, by table ID
+    #
+    def __init__(self, bytes_processed, failures=None, tables=None):
+
+        self.bytes_processed = bytes_processed
+        self.failures = failures or {}
+        self.tables = tables or {}
+        self.queries = []
+
+    def dataset(self, dataset_id):
+
+        return bigquery.DatasetReference("project", dataset_id)
+
+    def get_table(self, table_ref):
+
+        table_id = "{}.{}.{}".format(table_ref.project, table_ref.dataset_id, table_ref.table_id)
+        if table_id not in self.tables:
+            raise exceptions.NotFound(table_id)
+
+        return self.tables[table_id]
+
+    def query(self, sql_query, location=None, job_config=None):
+
+        assert job_config.dry_run is True
+        assert job_config.use_query_cache is False
+
+        self.queries.append(sql_query)
+
+        if sql_query in self.failures:
+            raise Exception(self.failures[sql_query])
+
+        return types.SimpleNamespace(total_bytes_processed=self.bytes_processed[sql_query])
+
+
+def build_context(task_dependencies, tasks, options=None):
+
+    # tasks : list of (task ID, task type, SQL)
+    # options : task parameters by task ID, i.e. {"a": {"atomic_truncate": True}}
+    #
+    options = options or {}
+
+    return {
+        "graph": sql_dag_graph.build_task_graph(task_dependencies, [task_id for task_id, _, _ in tasks]),
+        "tasks": [dict({"id": task_id,
+                        "task_type": task_type,
+                        "sql": sql,
+                        "sql_query_template": "ds",
+                        "gcp_project_id": "project-" + task_id,
+                        "bq_dataset": "dataset",
+                        "table_name": "table_" + task_id,
+                        "write_disposition": "WRITE_APPEND",
+                        "atomic_truncate": False,
+                        "partition_write": None}, **options.get(task_id, {})) for task_id, task_type, sql in tasks]
+    }
+
+
+def test_parse_bytes():
+
+    assert sql_dag_planner.parse_bytes("1000") == 1000
+    assert sql_dag_planner.parse_bytes("1000B") == 1000
+    assert sql_dag_planner.parse_bytes("500MB") == 500 * 1024 ** 2
+    assert sql_dag_planner.parse_bytes(" 1.5 TB ") == int(1.5 * 1024 ** 4)
+    assert sql_dag_planner.parse_bytes("2gb") == 2 * 1024 ** 3
+
+
+@pytest.mark.parametrize("value", ["", "MB", "12XB", "-1GB", "1,5GB"])
+def test_parse_bytes_invalid(value):
+
+    with pytest.raises(argparse.ArgumentTypeError):
+        sql_dag_planner.parse_bytes(value)
+
+
+def test_format_bytes():
+
+    assert sql_dag_planner.format_bytes(None) == "-"
+    assert sql_dag_planner.format_bytes(512) == "512 B"
+    assert sql_dag_planner.format_bytes(1536) == "1.5 KB"
+    assert sql_dag_planner.format_bytes(3 * 1024 ** 4) == "3.0 TB"
+
+
+def test_plan_workflow():
+
+    context = build_context(["a >> [b, c] >> d"],
+                            [("a", "sql", "a {{ds}}"), ("b", "sql", "b {{ds}}"), ("c", "sql", "c {{ds}}"), ("d", "sql", "d {{ds}}")])
+    client = FakeBigQueryClient({"a 2020-01-01": 10, "b 2020-01-01": 100, "c 2020-01-01": 1, "d 2020-01-01": 5})
+    projects = []
+
+    def get_client(gcp_project_id):
+        projects.append(gcp_project_id)
+        return client
+
+    plan = sql_dag_planner.plan_workflow(context, "2020-01-01", parallel=2, get_client=get_client)
+
+    # The execution date is rendered into the queries, each one is dry-run with the client of its project
+    #
+    assert sorted(client.queries) == ["a 2020-01-01", "b 2020-01-01", "c 2020-01-01", "d 2020-01-01"]
+    assert sorted(projects) == ["project-a", "project-b", "project-c", "project-d"]
+
+    assert plan["waves"] == [{"tasks": ["a"], "bytes": 10}, {"tasks": ["b", "c"], "bytes": 101}, {"tasks": ["d"], "bytes": 5}]
+    assert plan["total_bytes"] == 116
+    assert plan["critical_path"] == ["a", "b", "d"]
+    assert plan["critical_path_bytes"] == 115
+    assert plan["errors"] == 0
+
+
+def test_plan_workflow_critical_path_follows_the_heaviest_branch():
+
+    context = build_context(["a >> b >> d", "c >> d"],
+                            [("a", "sql", "a"), ("b", "sql", "b"), ("c", "sql", "c"), ("d", "sql", "d")])
+    client = FakeBigQueryClient({"a": 1, "b": 1, "c": 50, "d": 2})
+
+    plan = sql_dag_planner.plan_workflow(context, "2020-01-01", get_client=lambda gcp_project_id: client)
+
+    assert plan["critical_path"] == ["c", "d"]
+    assert plan["critical_path_bytes"] == 52
+
+
+def test_plan_workflow_other_tasks_are_not_dry_run():
+
+    context = build_context(["a >> copy"], [("a", "sql", "a"), ("copy", "copy_gbq_table", None)])
+    client = FakeBigQueryClient({"a": 7})
+
+    plan = sql_dag_planner.plan_workflow(context, "2020-01-01", get_client=lambda gcp_project_id: client)
+
+    assert client.queries == ["a"]
+    assert plan["tasks"]["copy"] == {"task_type": "copy_gbq_table", "bytes": 0, "approximate": False, "error": None}
+    assert plan["total_bytes"] == 7
+
+
+def test_plan_workflow_dry_run_error():
+
+    context = build_context(["a >> b"], [("a", "sql", "a"), ("b", "sql", "b")])
+    client = FakeBigQueryClient({"a": 10}, failures={"b": "Syntax error : unexpected keyword\ndetails"})
+
+    plan = sql_dag_planner.plan_workflow(context, "2020-01-01", get_client=lambda gcp_project_id: client)
+
+    assert plan["errors"] == 1
+    assert plan["tasks"]["b"] == {"task_type": "sql", "bytes": None, "approximate": False, "error": "Syntax error : unexpected keyword"}
+    assert plan["total_bytes"] == 10
+    assert plan["critical_path"] == ["a"]
+
+
+def test_plan_workflow_merge_statements():
+
+    # The MERGE statements executed by the tasks also scan their destination table
+    #
+    merged_table = bigquery.Table("project.dataset.table_merged", schema=[Field("id", "INTEGER"), Field("day", "DATE")])
+    merged_table.time_partitioning = bigquery.TimePartitioning(field="day")
+    atomic_table = bigquery.Table("project.dataset.table_atomic", schema=[Field("id", "INTEGER")])
+
+    context = build_context([], [("merged", "sql", "merged"), ("atomic", "sql", "atomic"), ("appended", "sql", "appended")],
+                            options={"merged": {"partition_write": {"mode": "merge", "merge_keys": ["id"]}},
+                                     "atomic": {"atomic_truncate": True, "write_disposition": "WRITE_TRUNCATE"},
+                                     "appended": {"atomic_truncate": True}})
+
+    sql_merged = sql_dag_bigquery.build_partition_merge_query(merged_table, "merged", ["id"], "2020-01-01")
+    sql_atomic = sql_dag_bigquery.build_atomic_truncate_query(atomic_table, "atomic")
+
+    client = FakeBigQueryClient({sql_merged: 30, sql_atomic: 20, "appended": 1},
+                                tables={"project.dataset.table_merged": merged_table, "project.dataset.table_atomic": atomic_table})
+
+    plan = sql_dag_planner.plan_workflow(context, "2020-01-01", get_client=lambda gcp_project_id: client)
+
+    assert sorted(client.queries) == sorted([sql_merged, sql_atomic, "appended"])
+    assert plan["total_bytes"] == 51
+    assert plan["errors"] == 0
+    assert not any(entry["approximate"] for entry in plan["tasks"].values())
+
+
+def test_plan_workflow_merge_into_a_missing_table(capsys):
+
+    # The table is created by an upstream task : only the query is dry-run
+    #
+    context = build_context([], [("missing_merge", "sql", "merged"), ("missing_atomic", "sql", "atomic")],
+                            options={"missing_merge": {"partition_write": {"mode": "merge", "merge_keys": ["id"]}},
+                                     "missing_atomic": {"atomic_truncate": True, "write_disposition": "WRITE_TRUNCATE"}})
+    client = FakeBigQueryClient({"merged": 30, "atomic": 20})
+
+    plan = sql_dag_planner.plan_workflow(context, "2020-01-01", get_client=lambda gcp_project_id: client)
+
+    # The first run of an atomic task is a plain query : its estimate is exact
+    #
+    assert plan["tasks"]["missing_merge"] == {"task_type": "sql", "bytes": 30, "approximate": True, "error": None}
+    assert plan["tasks"]["missing_atomic"] == {"task_type": "sql", "bytes": 20, "approximate": False, "error": None}
+
+    sql_dag_planner.print_plan(plan)
+    output = capsys.readouterr().out
+
+    assert "missing_merge   " in output
+    assert "30 B ~\n" in output
+    assert "~ : the destination table does not exist yet" in output
+
+
+def test_plan_workflow_empty():
+
+    plan = sql_dag_planner.plan_workflow(build_context([], []), "2020-01-01", get_client=lambda gcp_project_id: None)
+
+    assert plan["waves"] == []
+    assert plan["critical_path"] == []
+    assert plan["total_bytes"] == 0
+
+
+def test_print_plan(capsys):
+
+    context = build_context(["a >> b"], [("a", "sql", "a"), ("b", "sql", "b")])
+    client = FakeBigQueryClient({"a": 2048}, failures={"b": "Not found : table"})
+
+    plan = sql_dag_planner.plan_workflow(context, "2020-01-01", get_client=lambda gcp_project_id: client)
+    sql_dag_planner.print_plan(plan, max_bytes=1024)
+
+    output = capsys.readouterr().out
+
+    assert "Execution date : 2020-01-01" in output
+    assert "Total bytes processed : 2.0 KB" in output
+    assert "Estimated critical path (2.0 KB) : a\n" in output
+    assert "ERROR : dry-run failed for task \"b\" : Not found : table" in output
+    assert "ERROR : the workflow would process 2.0 KB, over the budget of 1.0 KB." in output
+
+
+def test_parse_plan_arguments():
+
+    plan_arguments = sql_dag_generator.parse_plan_arguments(["plan", "conf.json", "--ds", "2020-02-03", "--max-bytes", "1GB", "--parallel", "2"])
+
+    assert plan_arguments.configuration_file == "conf.json"
+    assert plan_arguments.ds == "2020-02-03"
+    assert plan_arguments.max_bytes == 1024 ** 3
+    assert plan_arguments.parallel == 2
+
+
+def test_parse_plan_arguments_default_ds_is_computed_at_call_time(monkeypatch):
+
+    class FakeDate(datetime.date):
+
+        @classmethod
+        def today(cls):
+            return cls(2021, 5, 6)
+
+    monkeypatch.setattr(sql_dag_generator, "datetime", types.SimpleNamespace(date=FakeDate, datetime=datetime.datetime))
+
+    assert sql_dag_generator.parse_plan_arguments(["plan", "conf.json"]).ds == "2021-05-06"
+
+
+def test_parse_plan_arguments_parallel_not_positive(capsys):
+
+    assert sql_dag_generator.parse_plan_arguments(["plan", "conf.json", "--parallel", "0"]) is None
+    assert "\"0\" must be 1 or more" in capsys.readouterr().err
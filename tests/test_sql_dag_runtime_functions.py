@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the runtime functions rendered into the generated DAG files and local scripts."""
+
+import base64
+import threading
+import time
+import types
+
+import pytest
+
+from jarvis_sdk import sql_dag_templates
+
+
+@pytest.fixture
+def runtime():
+
+    # The runtime functions, executed as in a generated file of the DAG "my_dag"
+    #
+    namespace = {"_dag_name": "my_dag"}
+    exec(sql_dag_templates.render("header.py.j2") + sql_dag_templates.render("runtime_functions.py.j2"), namespace)
+
+    return namespace
+
+
+def test_sql_snapshot_id_bytes_or_str(runtime):
+
+    # The deploy payload holds the queries as base64 bytes, they may be read back as str
+    #
+    sql_bytes = {"b": base64.b64encode(b"SELECT 2"), "a": base64.b64encode(b"SELECT 1")}
+    sql_str = {sql_id: str(encoded_query, "utf-8") for sql_id, encoded_query in sql_bytes.items()}
+
+    snapshot_id = runtime["get_sql_snapshot_id"](sql_bytes)
+
+    assert snapshot_id.startswith("my_dag_")
+    assert len(snapshot_id) == len("my_dag_") + 16
+    assert runtime["get_sql_snapshot_id"](sql_str) == snapshot_id
+
+
+def test_sql_snapshot_id_versions(runtime):
+
+    get_sql_snapshot_id = runtime["get_sql_snapshot_id"]
+    sql_queries = {"a": base64.b64encode(b"SELECT 1"), "b": base64.b64encode(b"SELECT 2")}
+
+    assert get_sql_snapshot_id(dict(reversed(list(sql_queries.items())))) == get_sql_snapshot_id(sql_queries)
+    assert get_sql_snapshot_id(dict(sql_queries, b=base64.b64encode(b"SELECT 3"))) != get_sql_snapshot_id(sql_queries)
+    assert get_sql_snapshot_id({"ab": b"c"}) != get_sql_snapshot_id({"a": b"bc"})
+    assert get_sql_snapshot_id({}) == get_sql_snapshot_id({})
+
+
+class FakeFirestoreClient:
+
+    # Records the task statuses merged into the gbq-to-gbq-tasks-status documents
+
+    def __init__(self, delay=0.0, failures=0):
+
+        self.documents = {}
+        self.writes = 0
+        self.delay = delay
+        self.failures = failures
+        self.lock = threading.Lock()
+
+    def collection(self, collection):
+
+        assert collection == "gbq-to-gbq-tasks-status"
+        return self
+
+    def document(self, doc_id):
+
+        return types.SimpleNamespace(set=lambda data, merge: self.set(doc_id, data, merge))
+
+    def set(self, doc_id, data, merge):
+
+        assert merge is True
+        time.sleep(self.delay)
+
+        with self.lock:
+            if self.failures > 0:
+                self.failures -= 1
+                raise Exception("unavailable")
+            self.writes += 1
+            self.documents.setdefault(doc_id, {}).update(data)
+
+
+def get_task_kwargs(task_id, dag_id="my_dag", run_id="run_1"):
+
+    return {"ti": types.SimpleNamespace(dag_id=dag_id, task_id=task_id), "run_id": run_id}
+
+
+def wait_for_writer(runtime, name):
+
+    # The writer thread clears its global once the queue is empty
+    #
+    for _ in range(0, 500):
+        if runtime[name] is None:
+            return
+        time.sleep(0.01)
+
+    raise AssertionError(name + " is still running")
+
+
+def test_task_status_flush(runtime):
+
+    client = FakeFirestoreClient()
+    runtime["get_firestore_client"] = lambda: client
+
+    runtime["set_task_status"]("success", flush=True, **get_task_kwargs("load"))
+
+    # Written before set_task_status returns, without a writer thread
+    #
+    assert client.documents == {"my_dag_run_1": {"load": "success"}}
+    assert runtime["_task_statuses_writer"] is None
+
+
+def test_task_statuses_written_in_the_background(runtime):
+
+    client = FakeFirestoreClient(delay=0.001)
+    runtime["get_firestore_client"] = lambda: client
+
+    # Statuses queued from several threads while the writer is running : none is left behind,
+    # even the ones queued while the writer is about to stop
+    #
+    def set_statuses(thread_index):
+        for index in range(0, 100):
+            runtime["set_task_status"]("running", **get_task_kwargs("task_{}_{}".format(thread_index, index)))
+
+    threads = [threading.Thread(target=set_statuses, args=(thread_index,)) for thread_index in range(0, 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    wait_for_writer(runtime, "_task_statuses_writer")
+
+    assert len(client.documents["my_dag_run_1"]) == 400
+    assert set(client.documents["my_dag_run_1"].values()) == {"running"}
+    assert runtime["_task_statuses"] == {}
+
+    # The statuses queued in the meantime are written together
+    #
+    assert client.writes < 400
+
+
+def test_task_status_final_status_wins(runtime):
+
+    client = FakeFirestoreClient(delay=0.01)
+    runtime["get_firestore_client"] = lambda: client
+
+    runtime["set_task_status"]("running", **get_task_kwargs("load"))
+    runtime["set_task_status"]("success", flush=True, **get_task_kwargs("load"))
+
+    assert client.documents == {"my_dag_run_1": {"load": "success"}}
+
+
+def test_task_status_write_failure(runtime, caplog):
+
+    client = FakeFirestoreClient(failures=1)
+    runtime["get_firestore_client"] = lambda: client
+
+    runtime["set_task_status"]("success", flush=True, **get_task_kwargs("load"))
+
+    assert client.documents == {}
+    assert "Cannot write the task statuses of my_dag_run_1 : unavailable" in caplog.text
+
+
+class FakeBigQueryClient:
+
+    # Records the log tables created and the rows streamed into them
+
+    def __init__(self, not_found=0):
+
+        from google.cloud import exceptions
+
+        self.created = []
+        self.rows = {}
+        self.not_found = not_found
+        self.not_found_error = exceptions.NotFound("table")
+        self.lock = threading.Lock()
+
+    def dataset(self, dataset_id):
+
+        return types.SimpleNamespace(table=lambda table_id: "project.{}.{}".format(dataset_id, table_id))
+
+    def create_table(self, table, exists_ok=False):
+
+        assert exists_ok is True
+        self.created.append(table.table_id)
+
+    def insert_rows_json(self, table_ref, rows, ignore_unknown_values=False):
+
+        with self.lock:
+            if self.not_found > 0:
+                self.not_found -= 1
+                raise self.not_found_error
+            self.rows.setdefault(table_ref, []).extend(rows)
+
+        return []
+
+
+def log_row(runtime, day, dag_run_id):
+
+    runtime["log_to_gbq"](day, "2020-01-02T00:00:00", dag_run_id, "my_dag", "DEV", "SELECT 1", "dataset", "table", 10, bytes_processed=100)
+
+
+def test_gbq_logs_streamed(runtime):
+
+    client = FakeBigQueryClient()
+    runtime["get_bigquery_client"] = lambda: client
+
+    for index in range(0, 50):
+        log_row(runtime, "20200102", "run_{}".format(index))
+    log_row(runtime, "20200103", "run_50")
+
+    runtime["flush_gbq_logs"]()
+
+    # One row per call, the daily tables are created once per process
+    #
+    assert len(client.rows["project.jarvis_plateform_logs.sql_to_gbq_20200102"]) == 50
+    assert len(client.rows["project.jarvis_plateform_logs.sql_to_gbq_20200103"]) == 1
+    assert sorted(client.created) == ["sql_to_gbq_20200102", "sql_to_gbq_20200103"]
+    assert runtime["_gbq_logs"] == {}
+
+    row = client.rows["project.jarvis_plateform_logs.sql_to_gbq_20200103"][0]
+    assert row["dag_run_id"] == "run_50"
+    assert row["num_rows_inserted"] == 10
+    assert row["bytes_processed"] == 100
+
+    log_row(runtime, "20200102", "run_51")
+    runtime["flush_gbq_logs"]()
+
+    assert len(client.rows["project.jarvis_plateform_logs.sql_to_gbq_20200102"]) == 51
+    assert len(client.created) == 2
+
+
+def test_gbq_logs_table_not_ready(runtime):
+
+    client = FakeBigQueryClient(not_found=2)
+    runtime["get_bigquery_client"] = lambda: client
+    runtime["time"] = types.SimpleNamespace(sleep=lambda seconds: None, time=time.time)
+
+    log_row(runtime, "20200102", "run_1")
+    runtime["flush_gbq_logs"]()
+
+    assert len(client.rows["project.jarvis_plateform_logs.sql_to_gbq_20200102"]) == 1
+
+
+def test_gbq_logs_write_failure(runtime, caplog):
+
+    client = FakeBigQueryClient(not_found=10)
+    runtime["get_bigquery_client"] = lambda: client
+    runtime["time"] = types.SimpleNamespace(sleep=lambda seconds: None, time=time.time)
+
+    log_row(runtime, "20200102", "run_1")
+    runtime["flush_gbq_logs"]()
+
+    # The callable is not failed by its logs
+    #
+    assert client.rows == {}
+    assert "Cannot write the logs into sql_to_gbq_20200102" in caplog.text
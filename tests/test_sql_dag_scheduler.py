@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the dependency aware scheduler of TTT local runs."""
+
+import threading
+import time
+
+from jarvis_sdk import sql_dag_scheduler
+
+
+# a >> [b, c] >> d
+#
+NODES = ["a", "b", "c", "d"]
+UPSTREAM = {"b": ["a"], "c": ["a"], "d": ["b", "c"]}
+
+
+class Recorder:
+
+    # Records the order of the executions and the number of tasks running at the same time
+
+    def __init__(self, failures=None, statuses=None, duration=0.0):
+
+        self.failures = failures or []
+        self.statuses = statuses or {}
+        self.duration = duration
+        self.executed = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, node):
+
+        with self.lock:
+            self.executed.append(node)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+        time.sleep(self.duration)
+
+        with self.lock:
+            self.running -= 1
+
+        if node in self.failures:
+            raise Exception("task " + node + " failed")
+
+        return self.statuses.get(node)
+
+
+def test_run_tasks_dependency_order():
+
+    recorder = Recorder()
+
+    success, results = sql_dag_scheduler.run_tasks(NODES, UPSTREAM, recorder, parallel=1)
+
+    assert success is True
+    assert recorder.executed == ["a", "b", "c", "d"]
+    assert {node: result["status"] for node, result in results.items()} == {"a": "success", "b": "success", "c": "success", "d": "success"}
+    assert all(result["end"] >= result["start"] for result in results.values())
+
+
+def test_run_tasks_in_parallel():
+
+    recorder = Recorder(duration=0.05)
+
+    success, results = sql_dag_scheduler.run_tasks(NODES, UPSTREAM, recorder, parallel=4)
+
+    # "b" and "c" run at the same time, "d" only starts once both are done
+    #
+    assert success is True
+    assert recorder.max_running == 2
+    assert results["d"]["start"] >= max(results["b"]["end"], results["c"]["end"])
+
+
+def test_run_tasks_parallel_limit():
+
+    recorder = Recorder(duration=0.05)
+    nodes = ["t{}".format(index) for index in range(0, 8)]
+
+    success, _ = sql_dag_scheduler.run_tasks(nodes, {}, recorder, parallel=3)
+
+    assert success is True
+    assert recorder.max_running == 3
+    assert sorted(recorder.executed) == nodes
+
+
+def test_run_tasks_failure_stops_the_launches():
+
+    recorder = Recorder(failures=["b"])
+
+    success, results = sql_dag_scheduler.run_tasks(NODES, UPSTREAM, recorder, parallel=1)
+
+    # "c" is never launched after the failure of "b", "d" waits for "b"
+    #
+    assert success is False
+    assert recorder.executed == ["a", "b"]
+    assert results["b"]["status"] == "failed"
+    assert str(results["b"]["error"]) == "task b failed"
+    assert results["c"] == {"status": "not run", "start": None, "end": None, "error": None}
+    assert results["d"]["status"] == "not run"
+
+
+def test_run_tasks_failure_awaits_the_running_tasks():
+
+    recorder = Recorder(failures=["b"], duration=0.05)
+
+    success, results = sql_dag_scheduler.run_tasks(NODES, UPSTREAM, recorder, parallel=2)
+
+    assert success is False
+    assert results["b"]["status"] == "failed"
+    assert results["c"]["status"] == "success"
+    assert results["d"]["status"] == "not run"
+
+
+def test_run_tasks_unselected_nodes_are_done():
+
+    recorder = Recorder()
+
+    success, results = sql_dag_scheduler.run_tasks(NODES, UPSTREAM, recorder, parallel=2, selected={"a", "d"})
+
+    # "b" and "c" release "d" without running, they have no result
+    #
+    assert success is True
+    assert recorder.executed == ["a", "d"]
+    assert sorted(results.keys()) == ["a", "d"]
+
+
+def test_run_tasks_status():
+
+    recorder = Recorder(statuses={"b": "skipped"})
+
+    _, results = sql_dag_scheduler.run_tasks(NODES, UPSTREAM, recorder)
+
+    assert results["b"]["status"] == "skipped"
+    assert results["c"]["status"] == "success"
+
+
+def test_run_tasks_thread_named_after_the_task():
+
+    names = {}
+
+    def execute_task(node):
+        names[node] = threading.current_thread().name
+
+    sql_dag_scheduler.run_tasks(NODES, UPSTREAM, execute_task, parallel=2, label=lambda node: "task_" + node)
+
+    assert names == {"a": "task_a", "b": "task_b", "c": "task_c", "d": "task_d"}
+
+
+def test_print_timing_table(capsys):
+
+    _, results = sql_dag_scheduler.run_tasks(NODES, UPSTREAM, Recorder(failures=["b"]))
+    sql_dag_scheduler.print_timing_table(NODES, results)
+
+    lines = capsys.readouterr().out.split("\n")
+
+    assert lines[1].split() == ["Task", "Status", "Start", "(s)", "Duration", "(s)"]
+    assert [line.split()[:2] for line in lines[3:7]] == [["a", "success"], ["b", "failed"], ["c", "not"], ["d", "not"]]
+    assert "ERROR in task \"b\" : task b failed" in lines
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the run state of TTT local runs : outdated tasks and resumable checkpoints."""
+
+import os
+import threading
+
+import pytest
+
+from jarvis_sdk import sql_dag_graph
+from jarvis_sdk import sql_dag_state
+
+
+@pytest.fixture
+def context():
+
+    # a >> b >> d, c >> d
+    #
+    return {
+        "graph": sql_dag_graph.build_task_graph(["a >> b >> d", "c >> d"], ["a", "b", "c", "d"]),
+        "tasks": [{"id": task_id, "task_type": "sql", "sql": "SELECT '" + task_id + "'", "short_description": ""} for task_id in ["a", "b", "c", "d"]]
+    }
+
+
+@pytest.fixture
+def store():
+
+    # In memory : the store is never written without a file
+    #
+    return {"file": None, "lock": threading.Lock(), "data": {"runs": {}}}
+
+
+def record_run(store, context, ds, task_ids, status="success"):
+
+    fingerprints = sql_dag_state.compute_fingerprints(context, ds)
+    for task_id in task_ids:
+        sql_dag_state.record_task_run(store, ds, task_id, fingerprints[task_id], status)
+
+
+def get_task(context, task_id):
+
+    return [task for task in context["tasks"] if task["id"] == task_id][0]
+
+
+def test_outdated_tasks_never_run(context, store):
+
+    fingerprints = sql_dag_state.compute_fingerprints(context, "2020-01-01")
+
+    assert sql_dag_state.get_outdated_tasks(context, store, "2020-01-01", fingerprints) == {"a", "b", "c", "d"}
+
+
+def test_outdated_tasks_up_to_date(context, store):
+
+    record_run(store, context, "2020-01-01", ["a", "b", "c", "d"])
+    fingerprints = sql_dag_state.compute_fingerprints(context, "2020-01-01")
+
+    assert sql_dag_state.get_outdated_tasks(context, store, "2020-01-01", fingerprints) == set()
+
+
+def test_outdated_tasks_per_execution_date(context, store):
+
+    record_run(store, context, "2020-01-01", ["a", "b", "c", "d"])
+    fingerprints = sql_dag_state.compute_fingerprints(context, "2020-01-02")
+
+    assert sql_dag_state.get_outdated_tasks(context, store, "2020-01-02", fingerprints) == {"a", "b", "c", "d"}
+
+
+def test_outdated_tasks_change_propagates_downstream(context, store):
+
+    record_run(store, context, "2020-01-01", ["a", "b", "c", "d"])
+
+    get_task(context, "b")["sql"] = "SELECT 'b fixed'"
+    fingerprints = sql_dag_state.compute_fingerprints(context, "2020-01-01")
+
+    assert sql_dag_state.get_outdated_tasks(context, store, "2020-01-01", fingerprints) == {"b", "d"}
+
+
+def test_outdated_tasks_ignored_keys(context, store):
+
+    record_run(store, context, "2020-01-01", ["a", "b", "c", "d"])
+
+    get_task(context, "a")["short_description"] = "Loads the A table"
+    fingerprints = sql_dag_state.compute_fingerprints(context, "2020-01-01")
+
+    assert sql_dag_state.get_outdated_tasks(context, store, "2020-01-01", fingerprints) == set()
+
+
+def test_outdated_tasks_upstream_not_run(context, store):
+
+    # "c" never succeeded : "d" runs again even if its own fingerprint is recorded
+    #
+    record_run(store, context, "2020-01-01", ["a", "b", "d"])
+    fingerprints = sql_dag_state.compute_fingerprints(context, "2020-01-01")
+
+    assert sql_dag_state.get_outdated_tasks(context, store, "2020-01-01", fingerprints) == {"c", "d"}
+
+
+def test_resumable_tasks(context, store):
+
+    sql_dag_state.start_checkpoint(store, {"2020-01-01": ["a", "b", "c", "d"], "2020-01-02": ["d", "c"]})
+    record_run(store, context, "2020-01-01", ["a", "c"])
+
+    fingerprints = {ds: sql_dag_state.compute_fingerprints(context, ds) for ds in ["2020-01-01", "2020-01-02"]}
+
+    assert sql_dag_state.get_resumable_tasks(context, store, fingerprints) == {"2020-01-01": ["b", "d"], "2020-01-02": ["c", "d"]}
+
+
+def test_resumable_tasks_fixed_task_runs_again(context, store):
+
+    sql_dag_state.start_checkpoint(store, {"2020-01-01": ["a", "b", "c", "d"]})
+    record_run(store, context, "2020-01-01", ["a", "b", "c"])
+
+    # "b" completed, but its fingerprint changed with the one of "a"
+    #
+    get_task(context, "a")["sql"] = "SELECT 'a fixed'"
+    fingerprints = {"2020-01-01": sql_dag_state.compute_fingerprints(context, "2020-01-01")}
+
+    assert sql_dag_state.get_resumable_tasks(context, store, fingerprints) == {"2020-01-01": ["a", "b", "d"]}
+
+
+def test_resumable_tasks_removed_from_the_workflow(context, store, capsys):
+
+    sql_dag_state.start_checkpoint(store, {"2020-01-01": ["a", "old", "d"]})
+    fingerprints = {"2020-01-01": sql_dag_state.compute_fingerprints(context, "2020-01-01")}
+
+    assert sql_dag_state.get_resumable_tasks(context, store, fingerprints) == {"2020-01-01": ["a", "d"]}
+    assert "The task \"old\" is no longer in the workflow. Skipping." in capsys.readouterr().out
+
+
+def test_run_state_is_stored_in_jarvis_home(context, tmp_path, monkeypatch):
+
+    monkeypatch.setenv("JARVIS_HOME", str(tmp_path))
+
+    store = sql_dag_state.load_run_state("my_dag")
+    sql_dag_state.start_checkpoint(store, {"2020-01-01": ["a", "b"]})
+    record_run(store, context, "2020-01-01", ["a"])
+    sql_dag_state.finish_checkpoint(store, "failed")
+
+    assert os.path.isfile(os.path.join(str(tmp_path), "ttt-runs", "my_dag.json"))
+
+    store = sql_dag_state.load_run_state("my_dag")
+
+    assert store["data"]["checkpoint"]["status"] == "failed"
+    assert store["data"]["checkpoint"]["dates"] == {"2020-01-01": {"tasks": ["a", "b"], "completed": ["a"]}}
+    assert store["data"]["runs"]["2020-01-01"]["a"]["status"] == "success"